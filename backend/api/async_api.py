@@ -0,0 +1,314 @@
+# Import required modules
+from contextlib import asynccontextmanager
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from api.cache import MemoryCache, get_result_cache, make_cache_key
+from api.chunking import extract_chunk_code, merge_parts
+from api.report import parse_report, report_fields
+from api.openai_api import (
+    CHUNK_INSTRUCTIONS, SYSTEM_PROMPT, build_messages, estimate_request_tokens, extract_optimized_code,
+    history_view_options, optimization_request_error, parse_history_paging, plan_optimization, serialize_history,
+    serialize_history_summary
+)
+from api.pagination import InvalidCursor, finish_page, newest_first_after
+from api.ratelimit import AsyncInFlightLimit, MemoryBuckets, RateLimited, get_rate_limiter
+from api.routing import InputTooLarge, NoRouteMatches
+from api.upstream import UpstreamUnavailable, create_upstream
+from api.usage import measure_usage, usage_record
+from user.identity import UserSnapshot, get_user_cache
+from user.models import CodeHistory, User
+import asyncio
+import functools
+import jwt
+import math
+import time
+
+# Async drivers used for each synchronous database URL scheme
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+def async_database_url(url):
+    """Translate a synchronous database URL to the matching asyncio driver"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS or url.drivername == ASYNC_DRIVERS[backend]:
+        return url
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+def error_response(message, status, retry_after=None, **fields):
+    """Build a JSON error response, adding Retry-After when the client should come back later"""
+    headers = {'Retry-After': str(math.ceil(retry_after))} if retry_after else None
+    return JSONResponse(dict({'message': message}, **fields), status_code=status, headers=headers)
+
+def rate_limited_response(error):
+    """Build a 429 response telling the client when to retry, like api.ratelimit.rate_limited_response"""
+    retry_after = max(math.ceil(error.retry_after), 1)
+    return JSONResponse({'message': str(error), 'retry_after': retry_after}, status_code=429, headers={'Retry-After': str(retry_after)})
+
+async def run_sync(function, *args):
+    """Run blocking code that needs the Flask app context (e.g. db.session) on a worker thread"""
+    flask_app = current_app._get_current_object()
+
+    def call():
+        with flask_app.app_context():
+            return function(*args)
+
+    return await run_in_threadpool(call)
+
+class FlaskContextMiddleware:
+    """Pushes a Flask app context for each request so config, caches and model events work as in the WSGI app"""
+
+    def __init__(self, app, flask_app):
+        self.app = app
+        self.flask_app = flask_app
+
+    async def __call__(self, scope, receive, send):
+        with self.flask_app.app_context():
+            await self.app(scope, receive, send)
+
+async def load_user_async(sessionmaker, identity):
+    """Resolve a JWT identity to a UserSnapshot through the shared user cache, or None if the user is gone"""
+    try:
+        user_id = int(identity)
+    except (TypeError, ValueError):
+        return None
+    cache = get_user_cache()
+    snapshot = cache.get(user_id)
+    if snapshot is None:
+        async with sessionmaker() as session:
+            user = await session.get(User, user_id)
+            if user is None:
+                return None
+            snapshot = UserSnapshot(user.id, user.username, user.created_at, user.tier)
+        cache.set(user_id, snapshot)
+    return snapshot
+
+def jwt_required(handler):
+    """Authenticate the request with an access token issued by the auth blueprint"""
+    @functools.wraps(handler)
+    async def wrapper(request):
+        config = current_app.config
+        header = request.headers.get(config.get('JWT_HEADER_NAME', 'Authorization'), '')
+        prefix = config.get('JWT_HEADER_TYPE', 'Bearer') + ' '
+        if not header.startswith(prefix):
+            return error_response('Missing Authorization Header', 401, error='Missing Authorization Header')
+        try:
+            claims = jwt.decode(
+                header[len(prefix):],
+                config['JWT_SECRET_KEY'],
+                algorithms=[config.get('JWT_ALGORITHM', 'HS256')],
+                leeway=config.get('JWT_DECODE_LEEWAY', 0)
+            )
+        except jwt.ExpiredSignatureError:
+            return error_response('The token has expired', 401, error='token_expired')
+        except jwt.InvalidTokenError as e:
+            return error_response('Invalid token', 401, error=str(e))
+        if claims.get('type') != 'access':
+            return error_response('Invalid token', 401, error='Only access tokens are allowed')
+
+        user = await load_user_async(request.app.state.sessionmaker, claims.get('sub'))
+        if user is None:
+            return error_response('User not found', 404)
+        return await handler(request, user)
+
+    return wrapper
+
+async def check_rate_limit(user_id, tokens):
+    """Charge a request to the rate limiter, off the event loop when the buckets live in the database"""
+    limiter = get_rate_limiter()
+    if isinstance(limiter.buckets, MemoryBuckets):
+        limiter.check(user_id, tokens=tokens)
+    else:
+        await run_sync(limiter.check, user_id, 1, tokens)
+
+async def cache_call(cache, method, *args):
+    """Use the result cache, off the event loop unless it is the in-process backend"""
+    if isinstance(cache.backend, MemoryCache):
+        return getattr(cache, method)(*args)
+    return await run_sync(getattr(cache, method), *args)
+
+async def read_json(request):
+    """Return the JSON request body, or None if it is missing or malformed"""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+async def optimize_piece(state, code, language, route, part):
+    """Optimize a snippet or one part of a file, returning the code, the report and the measured call (None if cached)"""
+    # Serve resubmitted snippets from the result cache
+    cache = get_result_cache()
+    prompt = SYSTEM_PROMPT + CHUNK_INSTRUCTIONS if part else SYSTEM_PROMPT
+    cache_key = make_cache_key(code, language, route.model, prompt)
+    cached = await cache_call(cache, 'get', cache_key)
+    if cached:
+        return cached['optimized_code'], cached['suggestions'], None
+
+    messages = build_messages(code, language, part)
+    async with state.in_flight:
+        started = time.perf_counter()
+        response = await state.upstream.create_completion(
+            model=route.model,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=route.max_tokens
+        )
+    optimization_response = response.choices[0].message.content
+    usage = measure_usage(response, started, SYSTEM_PROMPT + messages[1]['content'], optimization_response)
+    optimized_code = (extract_chunk_code if part else extract_optimized_code)(optimization_response, code)
+    await cache_call(cache, 'set', cache_key, {
+        'optimized_code': optimized_code,
+        'suggestions': optimization_response
+    })
+    return optimized_code, optimization_response, usage
+
+@jwt_required
+async def optimize_code(request, user):
+    """Optimize code using OpenAI's GPT model"""
+    data = await read_json(request)
+    # Validate request data
+    error = optimization_request_error(data)
+    if error:
+        return error_response(error, 400)
+    if not isinstance(data.get('chunked', False), (bool, type(None))):
+        return error_response('chunked must be true or false', 400)
+
+    state = request.app.state
+    code, language = data['code'], data['language']
+    try:
+        plan = plan_optimization(code, language, user.tier, data.get('chunked'))
+        await check_rate_limit(user.id, sum(estimate_request_tokens(route) for _, route in plan))
+
+        # Large files are split into parts that are optimized concurrently
+        part = len(plan) > 1
+        outcomes = await asyncio.gather(*(optimize_piece(state, chunk.code, language, route, part) for chunk, route in plan))
+        if part:
+            optimized_code, optimization_response = merge_parts(
+                [chunk for chunk, _ in plan], [(optimized, report) for optimized, report, _ in outcomes], language
+            )
+        else:
+            optimized_code, optimization_response, _ = outcomes[0]
+        calls = [call for _, _, call in outcomes]
+
+        # Save optimization history to database
+        async with state.sessionmaker() as session:
+            history = CodeHistory(
+                user_id=user.id,
+                language=language,
+                original_code=code,
+                optimized_code=optimized_code,
+                optimization_suggestions=optimization_response,
+                report=report_fields(parse_report(optimization_response)),
+                usage=[usage_record(user.id, language, route.model, call) for (_, route), call in zip(plan, calls)]
+            )
+            session.add(history)
+            await session.commit()
+
+        return JSONResponse({
+            'id': history.id,
+            'optimized_code': optimized_code,
+            'suggestions': optimization_response,
+            'cached': all(call is None for call in calls),
+            'chunks': len(plan)
+        })
+
+    except InputTooLarge as e:
+        return error_response(str(e), 413, input_tokens=e.input_tokens, max_input_tokens=e.max_input_tokens)
+    except NoRouteMatches as e:
+        return error_response(str(e), 400)
+    except RateLimited as e:
+        return rate_limited_response(e)
+    except UpstreamUnavailable as e:
+        return error_response(str(e), 503, retry_after=e.retry_after)
+    except Exception as e:
+        return error_response(str(e), 500)
+
+@jwt_required
+async def get_history(request, user):
+    """Get user's code optimization history"""
+    statement = select(CodeHistory).where(CodeHistory.user_id == user.id)
+
+    async with request.app.state.sessionmaker() as session:
+        # Without paging parameters keep returning the complete history as a plain list
+        if not request.query_params.keys() & {'limit', 'cursor', 'view'}:
+            statement = statement.options(*CodeHistory.body_options()).order_by(CodeHistory.created_at.desc())
+            histories = (await session.scalars(statement)).all()
+            return JSONResponse([serialize_history(history) for history in histories])
+
+        try:
+            view, limit = parse_history_paging(request.query_params)
+            statement = newest_first_after(statement.options(*history_view_options(view)), CodeHistory, request.query_params.get('cursor'), limit)
+        except (ValueError, InvalidCursor) as e:
+            return error_response(str(e), 400)
+
+        histories, next_cursor = finish_page((await session.scalars(statement)).all(), limit)
+        serialize = serialize_history_summary if view == 'summary' else serialize_history
+        return JSONResponse({'items': [serialize(history) for history in histories], 'next_cursor': next_cursor})
+
+@jwt_required
+async def get_history_entry(request, user):
+    """Get a single code optimization history entry with its full bodies"""
+    statement = (
+        select(CodeHistory)
+        .where(CodeHistory.id == request.path_params['history_id'], CodeHistory.user_id == user.id)
+        .options(*CodeHistory.body_options())
+    )
+    async with request.app.state.sessionmaker() as session:
+        history = (await session.scalars(statement)).first()
+        if not history:
+            return error_response('History not found', 404)
+        return JSONResponse(serialize_history(history))
+
+def create_asgi_app(config=None):
+    """Create the asyncio variant of the optimize and history API
+
+    Tokens issued by the Flask auth blueprint are accepted as-is; config is
+    passed to create_app, whose settings (secrets, caches, rate limits) are
+    shared with the WSGI application.
+    """
+    from app import create_app  # Imported here because app.py imports this package
+
+    flask_app = create_app(config)
+    settings = flask_app.config
+    url = async_database_url(settings.get('ASYNC_DATABASE_URL') or settings['SQLALCHEMY_DATABASE_URI'])
+    engine_options = {} if url.get_backend_name() == 'sqlite' else {
+        'pool_size': settings.get('SQLALCHEMY_POOL_SIZE', 10),
+        'pool_timeout': settings.get('SQLALCHEMY_POOL_TIMEOUT', 30),
+        'pool_recycle': settings.get('SQLALCHEMY_POOL_RECYCLE', 1800),
+    }
+    engine = create_async_engine(url, **engine_options)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await app.state.upstream.client.close()
+        await engine.dispose()
+
+    asgi_app = Starlette(
+        routes=[
+            Route('/optimize', optimize_code, methods=['POST']),
+            Route('/history', get_history, methods=['GET']),
+            Route('/history/{history_id:int}', get_history_entry, methods=['GET']),
+        ],
+        middleware=[Middleware(FlaskContextMiddleware, flask_app=flask_app)],
+        lifespan=lifespan
+    )
+    asgi_app.state.flask_app = flask_app
+    asgi_app.state.engine = engine
+    # Rows stay usable after commit so responses can be built without another query
+    asgi_app.state.sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+    asgi_app.state.upstream = create_upstream(settings, asynchronous=True)
+    asgi_app.state.in_flight = AsyncInFlightLimit(
+        settings.get('ASYNC_MAX_IN_FLIGHT', 1000),
+        wait=settings.get('UPSTREAM_IN_FLIGHT_WAIT', 10)
+    )
+    return asgi_app
@@ -0,0 +1,302 @@
+# Import required modules
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from user.models import CachedResult, db
+import hashlib
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Line comment markers for each supported language
+LINE_COMMENTS = {
+    'python': ('#',),
+    'javascript': ('//',),
+    'java': ('//',),
+    'cpp': ('//',),
+}
+
+# Languages whose block comments use the /* ... */ syntax
+BLOCK_COMMENT_LANGUAGES = {'javascript', 'java', 'cpp'}
+
+# String delimiters recognized by the normalizer
+STRING_QUOTES = {
+    'python': ('"""', "'''", '"', "'"),
+    'javascript': ('`', '"', "'"),
+    'java': ('"', "'"),
+    'cpp': ('"', "'"),
+}
+
+def _tokenize(code, language):
+    """Split code into (is_string, text) pieces with comments removed and string literals kept verbatim"""
+    line_markers = LINE_COMMENTS.get(language, ())
+    block_comments = language in BLOCK_COMMENT_LANGUAGES
+    quotes = STRING_QUOTES.get(language, ('"', "'"))
+    start = i = 0
+    n = len(code)
+    while i < n:
+        # Copy string literals verbatim, honoring backslash escapes
+        quote = next((q for q in quotes if code.startswith(q, i)), None)
+        if quote:
+            if start < i:
+                yield False, code[start:i]
+            end = i + len(quote)
+            while end < n and not code.startswith(quote, end):
+                end += 2 if code[end] == '\\' else 1
+            end = min(end + len(quote), n)
+            yield True, code[i:end]
+            start = i = end
+            continue
+        if block_comments and code.startswith('/*', i):
+            if start < i:
+                yield False, code[start:i]
+            end = code.find('*/', i + 2)
+            yield False, ' '
+            start = i = n if end == -1 else end + 2
+            continue
+        if any(code.startswith(marker, i) for marker in line_markers):
+            if start < i:
+                yield False, code[start:i]
+            end = code.find('\n', i)
+            start = i = n if end == -1 else end
+            continue
+        i += 1
+    if start < n:
+        yield False, code[start:]
+
+def normalize_code(code, language):
+    """Normalize code so that comment and whitespace-only edits share a cache key
+
+    Runs of whitespace outside string literals collapse to one space and blank
+    lines are dropped; Python keeps its indentation. String literals are kept
+    exactly as written, since changing them changes the program.
+    """
+    language = (language or '').lower()
+    keep_indent = language == 'python'  # Indentation is significant in Python
+    out = []
+    line_started = False  # Whether the current line has emitted anything
+    newline = False  # A line break is due before the next emitted text
+    space = False  # A space is due before the next emitted text
+    indent = []
+
+    def emit(text):
+        nonlocal line_started, newline, space
+        if not line_started:
+            if newline:
+                out.append('\n')
+            if keep_indent:
+                out.append(''.join(indent).replace('\t', '    '))
+            line_started, newline = True, False
+        elif space:
+            out.append(' ')
+        space = False
+        out.append(text)
+
+    for is_string, text in _tokenize(code, language):
+        if is_string:
+            emit(text)
+            continue
+        for char in text:
+            if char == '\n':
+                newline = newline or line_started
+                line_started, space = False, False
+                indent = []
+            elif char.isspace():
+                if line_started:
+                    space = True
+                else:
+                    indent.append(char)
+            else:
+                emit(char)
+    return ''.join(out)
+
+def make_cache_key(code, language, model, system_prompt):
+    """Build a content-addressed key from the normalized code and request settings"""
+    prompt_hash = hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()
+    material = '\x00'.join([
+        (language or '').lower(),
+        model,
+        prompt_hash,
+        normalize_code(code, language),
+    ])
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+class MemoryCache:
+    """In-process LRU cache with TTL and size-based eviction"""
+
+    def __init__(self, ttl=3600, max_entries=1024, max_bytes=32 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, size, value = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Store value under key, evicting least recently used entries as needed"""
+        size = len(json.dumps(value))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        """Remove a key and release its size from the byte budget"""
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+class SQLCache:
+    """Cache backend shared between processes through the application database"""
+
+    def __init__(self, ttl=3600, max_entries=10000, trim_every=100):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.trim_every = trim_every  # Writes between trims, so the rows are not counted on every write
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        entry = db.session.get(CachedResult, key)
+        if entry is None or entry.expires_at < datetime.now():
+            return None
+        return json.loads(entry.value)
+
+    def set(self, key, value):
+        """Store value under key, replacing any entry a concurrent writer stored first"""
+        now = datetime.now()
+        table = CachedResult.__table__
+        values = {
+            'key': key,
+            'value': json.dumps(value),
+            'created_at': now,
+            'expires_at': now + timedelta(seconds=self.ttl)
+        }
+        connection = db.session.connection()
+        dialect = connection.dialect.name
+        try:
+            if dialect in ('postgresql', 'sqlite'):
+                insert = (postgresql.insert if dialect == 'postgresql' else sqlite.insert)(table).values(**values)
+                connection.execute(insert.on_conflict_do_update(
+                    index_elements=[table.c.key],
+                    set_={name: insert.excluded[name] for name in ('value', 'created_at', 'expires_at')}
+                ))
+            else:
+                # Portable fallback for databases without INSERT ... ON CONFLICT
+                if not connection.execute(update(table).where(table.c.key == key).values(**values)).rowcount:
+                    connection.execute(table.insert().values(**values))
+            with self._lock:
+                self._writes += 1
+                trim = self._writes % self.trim_every == 0
+            if trim:
+                self.trim(now)
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            raise
+
+    def trim(self, now=None):
+        """Delete expired rows and the oldest rows beyond max_entries"""
+        now = now or datetime.now()
+        CachedResult.query.filter(CachedResult.expires_at < now).delete(synchronize_session=False)
+        excess = CachedResult.query.count() - self.max_entries
+        if excess > 0:
+            oldest = db.session.query(CachedResult.key).order_by(CachedResult.created_at).limit(excess)
+            CachedResult.query.filter(CachedResult.key.in_(oldest.scalar_subquery())).delete(synchronize_session=False)
+
+    def clear(self):
+        """Drop every cached entry"""
+        CachedResult.query.delete()
+        db.session.commit()
+
+class ResultCache:
+    """Optimization result cache that counts hits and misses around a backend"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Look up key in the backend and record the outcome"""
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Store a result in the backend; a failed write is logged, not raised, as the result is already paid for"""
+        try:
+            self.backend.set(key, value)
+        except Exception:
+            logger.exception('Could not write result cache entry %s', key)
+
+    def stats(self):
+        """Return hit/miss counters for monitoring"""
+        total = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+def create_backend(config):
+    """Create the cache backend selected by RESULT_CACHE_BACKEND"""
+    name = config.get('RESULT_CACHE_BACKEND', 'memory')
+    ttl = config.get('RESULT_CACHE_TTL', 3600)
+    if name == 'memory':
+        return MemoryCache(
+            ttl=ttl,
+            max_entries=config.get('RESULT_CACHE_MAX_ENTRIES', 1024),
+            max_bytes=config.get('RESULT_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+        )
+    if name == 'sql':
+        return SQLCache(
+            ttl=ttl,
+            max_entries=config.get('RESULT_CACHE_MAX_ENTRIES', 1024),
+            trim_every=config.get('RESULT_CACHE_TRIM_EVERY', 100)
+        )
+    raise ValueError(f'Unknown result cache backend: {name}')
+
+def get_result_cache():
+    """Return the result cache for the current application, creating it on first use"""
+    cache = current_app.extensions.get('result_cache')
+    if cache is None:
+        cache = ResultCache(create_backend(current_app.config))
+        current_app.extensions['result_cache'] = cache
+    return cache
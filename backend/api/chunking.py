@@ -0,0 +1,184 @@
+# Import required modules
+from collections import namedtuple
+from api.report import SECTION_TITLES, code_or_original, parse_report
+import ast
+import re
+
+# Contiguous slice of a source file optimized by its own model call; line numbers are 1-based and inclusive
+Chunk = namedtuple('Chunk', ['code', 'first_line', 'last_line'])
+
+# Languages split with a brace-aware tokenizer
+BRACE_LANGUAGES = {'javascript', 'java', 'cpp'}
+
+# Lines that continue the statement closed on the previous line, e.g. '} else {'
+CONTINUATION = re.compile(r'\s*(else\b|catch\b|finally\b|while\b|[).,:?])')
+
+# Declarations whose block holds members that may be optimized separately (function bodies never are)
+CONTAINER = re.compile(r'\b(class|struct|interface|enum|namespace|record)\b')
+# Units without any code of their own, e.g. the closing brace of a split class
+TRIVIAL = re.compile(r'[\s{}();]*')
+
+def split_lines(code):
+    """Split code into lines that keep their newline characters"""
+    return re.findall(r'[^\n]*\n|[^\n]+$', code)
+
+def statement_start(node, lines, floor):
+    """Return the first line of a statement, including its decorators and the comments directly above it"""
+    line = min([node.lineno] + [decorator.lineno for decorator in getattr(node, 'decorator_list', [])]) - 1
+    while line - 1 >= floor and lines[line - 1].lstrip().startswith('#'):
+        line -= 1
+    return line
+
+def python_units(nodes, lines, lo, hi):
+    """Split lines lo..hi into one unit per statement; classes can be split further at their members"""
+    starts = []
+    floor = lo
+    for node in nodes:
+        starts.append(max(statement_start(node, lines, floor), lo))
+        floor = node.end_lineno
+    units = []
+    for index, node in enumerate(nodes):
+        start = lo if index == 0 else starts[index]
+        end = starts[index + 1] if index + 1 < len(nodes) else hi
+        children = None
+        if isinstance(node, ast.ClassDef) and len(node.body) > 1:
+            children = lambda node=node, start=start, end=end: python_units(node.body, lines, start, end)
+        units.append((start, end, children))
+    return units
+
+def scan_braces(code):
+    """Return the brace depth at the end of every line and its last character outside comments and strings"""
+    depth = 0
+    state = None  # None, 'line' or 'block' comment, or the quote character of an open string
+    last = ''
+    info = []
+    index = 0
+    while index < len(code):
+        char = code[index]
+        if char == '\n':
+            info.append((depth, last))
+            last = ''
+            # Only block comments and template literals span lines
+            if state not in ('block', '`'):
+                state = None
+        elif state == 'line':
+            pass
+        elif state == 'block':
+            if code.startswith('*/', index):
+                state = None
+                index += 1
+        elif state is not None:
+            if char == '\\' and code[index + 1:index + 2] not in ('', '\n'):
+                index += 1
+            elif char == state:
+                state = None
+                last = char
+        elif code.startswith('//', index):
+            state = 'line'
+        elif code.startswith('/*', index):
+            state = 'block'
+            index += 1
+        elif char in '"\'`':
+            state = char
+            last = char
+        else:
+            if char == '{':
+                depth += 1
+            elif char == '}':
+                depth = max(depth - 1, 0)
+            if not char.isspace():
+                last = char
+        index += 1
+    if code and not code.endswith('\n'):
+        info.append((depth, last))
+    return info
+
+def brace_units(info, lines, lo, hi, depth):
+    """Split lines lo..hi after every statement or block that closes at the given brace depth"""
+    cuts = [
+        line + 1 for line in range(lo, hi - 1)
+        if info[line][0] == depth and info[line][1] in ('}', ';') and not CONTINUATION.match(lines[line + 1])
+    ]
+    bounds = [lo] + cuts + [hi]
+    units = []
+    for start, end in zip(bounds, bounds[1:]):
+        header = ''.join(lines[start:end]).split('{', 1)[0]
+        children = None
+        if CONTAINER.search(header):
+            children = lambda start=start, end=end: brace_units(info, lines, start, end, depth + 1)
+        units.append((start, end, children))
+    return units
+
+def pack_units(units, lines, max_tokens, count):
+    """Group consecutive units into line ranges of at most max_tokens, splitting oversized units when possible"""
+    ranges = []
+    start = end = None
+    size = 0
+    pending = list(reversed(units))
+    while pending:
+        unit_start, unit_end, children = pending.pop()
+        text = ''.join(lines[unit_start:unit_end])
+        tokens = count(text)
+        if tokens > max_tokens and children is not None:
+            parts = children()
+            if len(parts) > 1:
+                pending.extend(reversed(parts))
+                continue
+        # Closing braces stay with the code before them even when that overflows the chunk
+        if start is not None and size + tokens > max_tokens and not TRIVIAL.fullmatch(text):
+            ranges.append((start, end))
+            start, size = None, 0
+        if start is None:
+            start = unit_start
+        end = unit_end
+        size += tokens
+    if start is not None:
+        ranges.append((start, end))
+    return ranges
+
+def split_source(code, language, max_tokens, count):
+    """Split source code at function and class boundaries into chunks of about max_tokens
+
+    Python is split with its own parser and JavaScript, Java and C++ with a
+    brace-aware tokenizer; other languages and unparsable Python come back
+    as a single chunk. Joining the chunks gives back the original code.
+    """
+    lines = split_lines(code)
+    if language == 'python':
+        try:
+            units = python_units(ast.parse(code).body, lines, 0, len(lines))
+        except (SyntaxError, ValueError):
+            units = []
+    elif language in BRACE_LANGUAGES:
+        units = brace_units(scan_braces(code), lines, 0, len(lines), 0)
+    else:
+        units = []
+    ranges = pack_units(units, lines, max_tokens, count) if units else [(0, len(lines))]
+    return [Chunk(''.join(lines[start:end]), start + 1, end) for start, end in ranges]
+
+def extract_chunk_code(optimization_response, original_code):
+    """Extract the optimized code of a chunk, keeping its indentation, falling back to the original code"""
+    return code_or_original(parse_report(optimization_response), original_code).strip('\n').rstrip()
+
+def split_sections(report):
+    """Map the numbered sections of a report to their bodies; unstructured reports count as section 1"""
+    return parse_report(report).sections
+
+def merge_parts(chunks, results, language):
+    """Stitch the optimized chunks into one file and merge their reports section by section
+
+    results holds one (optimized_code, report) pair per chunk; returns the
+    optimized file and the merged report.
+    """
+    optimized_code = '\n\n'.join(code for code, _ in results)
+    parsed = [split_sections(report) for _, report in results]
+    blocks = []
+    for number, title in SECTION_TITLES.items():
+        blocks.append(f'{number}. {title}')
+        if number == 4:
+            blocks.append(f'```{language}\n{optimized_code}\n```')
+            continue
+        for chunk, sections in zip(chunks, parsed):
+            if sections.get(number):
+                blocks.append(f'**Lines {chunk.first_line}-{chunk.last_line}**\n{sections[number]}')
+    return optimized_code, '\n\n'.join(blocks) + '\n'
@@ -0,0 +1,241 @@
+# Import required modules
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import Blueprint, current_app, request, jsonify
+from flask_jwt_extended import jwt_required, get_current_user, get_jwt_identity
+from user.models import OptimizationJob, db
+from user.maintenance import start_periodic_task
+from api.openai_api import estimate_request_tokens, optimization_request_error, plan_optimization, run_optimization
+from api.ratelimit import RateLimited, get_rate_limiter, rate_limited_response
+from api.routing import InputTooLarge, NoRouteMatches, input_too_large_response
+import threading
+import uuid
+
+# Create job blueprint
+jobs_bp = Blueprint('jobs', __name__)
+
+class QueueFull(Exception):
+    """Raised when a job backend cannot accept more work"""
+
+def execute_job(job_id):
+    """Run a queued job to completion and record its outcome"""
+    # Claim the job atomically so that only one worker runs it
+    claimed = OptimizationJob.query.filter_by(id=job_id, status='queued').update(
+        {'status': 'running', 'updated_at': datetime.now()}, synchronize_session=False
+    )
+    db.session.commit()
+    if not claimed:
+        return
+
+    job = db.session.get(OptimizationJob, job_id)
+    try:
+        history, cached = run_optimization(job.user_id, job.code, job.language)
+        job.status = 'succeeded'
+        job.history_id = history.id
+        job.cached = cached
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(OptimizationJob, job_id)
+        job.status = 'failed'
+        job.error = str(e)
+    db.session.commit()
+
+class InlineJobBackend:
+    """Runs each job synchronously in the submitting request"""
+
+    pending = frozenset()  # Jobs never wait in this backend
+
+    def __init__(self, app):
+        self.app = app
+
+    def submit(self, job_id):
+        """Run the job immediately and return a completed future"""
+        future = Future()
+        execute_job(job_id)
+        future.set_result(job_id)
+        return future
+
+class LocalJobBackend:
+    """Runs jobs on a bounded pool of background threads inside this process"""
+
+    def __init__(self, app, max_workers=4, max_pending=100):
+        self.app = app
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='optimize-job')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.pending = set()  # Ids of the jobs queued or running in this process
+        self._lock = threading.Lock()
+
+    def submit(self, job_id):
+        """Queue the job for a worker thread, raising QueueFull when the backlog is full"""
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull()
+        with self._lock:
+            self.pending.add(job_id)
+        future = self.executor.submit(self._run, job_id)
+        future.add_done_callback(lambda _: self._finish(job_id))
+        return future
+
+    def _finish(self, job_id):
+        with self._lock:
+            self.pending.discard(job_id)
+        self._slots.release()
+
+    def _run(self, job_id):
+        """Execute the job inside an application context"""
+        with self.app.app_context():
+            try:
+                execute_job(job_id)
+            finally:
+                db.session.remove()
+        return job_id
+
+JOB_BACKENDS = {
+    'inline': InlineJobBackend,
+    'local': LocalJobBackend,
+}
+
+def create_job_backend(app):
+    """Create the job backend selected by JOB_BACKEND"""
+    name = app.config.get('JOB_BACKEND', 'local')
+    if name not in JOB_BACKENDS:
+        raise ValueError(f'Unknown job backend: {name}')
+    if name == 'local':
+        return LocalJobBackend(
+            app,
+            max_workers=app.config.get('JOB_WORKERS', 4),
+            max_pending=app.config.get('JOB_MAX_PENDING', 100)
+        )
+    return JOB_BACKENDS[name](app)
+
+def recover_jobs(backend):
+    """Requeue jobs that no worker holds, e.g. left by a previous process, returning the number submitted
+
+    Jobs that do not fit in the backend's queue stay queued and are picked up
+    by the next recovery.
+    """
+    stale_before = datetime.now() - timedelta(seconds=current_app.config.get('JOB_STALE_AFTER', 600))
+    OptimizationJob.query.filter(
+        OptimizationJob.status == 'running',
+        OptimizationJob.updated_at < stale_before
+    ).update({'status': 'queued'}, synchronize_session=False)
+    db.session.commit()
+
+    submitted = 0
+    pending = db.session.query(OptimizationJob.id).filter_by(status='queued').order_by(OptimizationJob.created_at)
+    for (job_id,) in pending.all():
+        if job_id in backend.pending:
+            continue
+        try:
+            backend.submit(job_id)
+        except QueueFull:
+            break
+        submitted += 1
+    return submitted
+
+def get_job_backend():
+    """Return the job backend for the current application, recovering pending jobs on first use"""
+    backend = current_app.extensions.get('job_backend')
+    if backend is None:
+        backend = create_job_backend(current_app._get_current_object())
+        current_app.extensions['job_backend'] = backend
+        recover_jobs(backend)
+    return backend
+
+def resume_jobs():
+    """Requeue the jobs no worker holds, creating the job backend if this process has none yet"""
+    backend = current_app.extensions.get('job_backend')
+    if backend is None:
+        get_job_backend()
+    else:
+        recover_jobs(backend)
+
+def resume_job(job_id):
+    """Submit a queued job again unless this process already holds it; the claim in execute_job drops duplicates"""
+    backend = get_job_backend()
+    if job_id not in backend.pending:
+        try:
+            backend.submit(job_id)
+        except QueueFull:
+            pass
+
+def start_job_recovery(app):
+    """Requeue jobs left behind by restarts or a full queue every JOB_RECOVERY_INTERVAL seconds, when enabled"""
+    interval = app.config.get('JOB_RECOVERY_INTERVAL', 30)
+    if interval > 0 and app.config.get('JOB_BACKEND', 'local') == 'local':
+        return start_periodic_task(app, 'job-recovery', interval, resume_jobs)
+
+def serialize_job(job):
+    """Convert a job into its JSON representation"""
+    result = {
+        'id': job.id,
+        'status': job.status,
+        'created_at': job.created_at.isoformat(),
+        'updated_at': job.updated_at.isoformat()
+    }
+    if job.status == 'succeeded' and job.history:
+        result['result'] = {
+            'id': job.history.id,
+            'optimized_code': job.history.optimized_code,
+            'suggestions': job.history.optimization_suggestions,
+            'cached': job.cached
+        }
+    elif job.status == 'failed':
+        result['error'] = job.error
+    return result
+
+@jobs_bp.route('/optimize/jobs', methods=['POST'])
+@jwt_required()
+def create_job():
+    """Queue code for optimization and return the job ID"""
+    data = request.get_json()
+    # Validate request data
+    error = optimization_request_error(data)
+    if error:
+        return jsonify({'message': error}), 400
+
+    user_id = int(get_jwt_identity())
+    try:
+        plan = plan_optimization(data['code'], data['language'], get_current_user().tier)
+        get_rate_limiter().check(user_id, tokens=sum(estimate_request_tokens(route) for _, route in plan))
+    except InputTooLarge as e:
+        return input_too_large_response(e)
+    except NoRouteMatches as e:
+        return jsonify({'message': str(e)}), 400
+    except RateLimited as e:
+        return rate_limited_response(e)
+    backend = get_job_backend()
+
+    job = OptimizationJob(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        code=data['code'],
+        language=data['language']
+    )
+    job.save()
+
+    try:
+        backend.submit(job.id)
+    except QueueFull:
+        db.session.delete(job)
+        db.session.commit()
+        return jsonify({'message': 'Job queue is full, try again later'}), 503, {'Retry-After': '5'}
+
+    db.session.refresh(job)
+    return jsonify(serialize_job(job)), 202
+
+@jobs_bp.route('/optimize/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """Get the status or result of an optimization job"""
+    user_id = int(get_jwt_identity())
+    job = OptimizationJob.query.filter_by(id=job_id, user_id=user_id).first()
+
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+
+    if job.status == 'queued':
+        # Resume a job no worker holds, e.g. one queued before a restart or turned away by a full queue
+        resume_job(job.id)
+        db.session.refresh(job)
+
+    return jsonify(serialize_job(job)), 200
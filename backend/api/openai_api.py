@@ -1,33 +1,30 @@
 # Import required modules
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from openai import OpenAI
-import os
-from user.models import CodeHistory, db
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from flask_jwt_extended import jwt_required, get_current_user, get_jwt_identity
+from concurrent.futures import ThreadPoolExecutor
+from user.models import CodeHistory, db, delete_history_entries, load_search_texts
+from user.search import SearchUnavailable, highlight, query_terms, search_history
+from user.identity import load_user
+from user.metrics import timed
+from api.cache import get_result_cache, make_cache_key
+from api.upstream import UpstreamUnavailable, get_upstream
+from api.ratelimit import RateLimited, get_rate_limiter, rate_limited_response
+from api.routing import InputTooLarge, NoRouteMatches, get_router, input_too_large_response
+from api.chunking import Chunk, extract_chunk_code, merge_parts, split_source
+from api.report import ReportParser, code_or_original, parse_report, report_fields
+from api.pagination import InvalidCursor, paginate_newest_first
+from api.usage import measure_usage, usage_record
+from sqlalchemy.orm import load_only
 from datetime import datetime
-import re
+import json
+import math
+import time
 
-# Create API blueprint and initialize OpenAI client
+# Create API blueprint
 api_bp = Blueprint('api', __name__)
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
 
-@api_bp.route('/optimize', methods=['POST'])
-@jwt_required()
-def optimize_code():
-    """Optimize code using OpenAI's GPT model"""
-    data = request.get_json()
-    # Validate request data
-    if not data or 'code' not in data or 'language' not in data:
-        return jsonify({'message': 'Missing code or language'}), 400
-        
-    user_id = int(get_jwt_identity())
-    
-    try:
-        # Call OpenAI API for code optimization
-        response = client.chat.completions.create(
-            model="gpt-4.1",
-            messages=[
-                {"role": "system", "content": '''You are a senior software engineer and code-quality specialist.
+# System prompt describing the structure of the optimization report
+SYSTEM_PROMPT = '''You are a senior software engineer and code-quality specialist.
 Receive arbitrary source code (Python, JavaScript, Java, or C++) and deliver a high-quality optimisation report plus an optimised version of the code.
 
 Follow the structure and rules below EXACTLY.
@@ -95,54 +92,697 @@ G. Token Budget Awareness
    – Keep the entire response (analysis + code + explanation) concise enough to fit within a 2 300-token budget.
 
 ────────────────────────  END OF PROMPT  ─────────────────────────
-'''} ,
-                {"role": "user", "content": f"""Please analyze and optimize this {data['language']} code:\n\n{data['code']}"""}
-            ],
+'''
+
+# Extra instructions for one part of a file that is optimized in parts
+CHUNK_INSTRUCTIONS = (
+    "This code is one part of a larger file; the parts are optimized separately and then concatenated. "
+    "Optimize only this part and return it with its original indentation and any unbalanced braces exactly as given."
+)
+
+def build_messages(code, language, part=False):
+    """Build the chat messages sent to the model for a code snippet or one part of a larger file"""
+    if part:
+        content = f"""{CHUNK_INSTRUCTIONS}\n\nPlease analyze and optimize this part of a {language} file:\n\n{code}"""
+    else:
+        content = f"""Please analyze and optimize this {language} code:\n\n{code}"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": content}
+    ]
+
+def extract_optimized_code(optimization_response, original_code, report=None):
+    """Extract the code block of the Optimised Code section, falling back to the original code"""
+    return code_or_original(report or parse_report(optimization_response), original_code).strip()
+
+def upstream_unavailable_response(error):
+    """Build a 503 response asking the client to retry once the model API recovers"""
+    headers = {'Retry-After': str(math.ceil(error.retry_after))} if error.retry_after else {}
+    return jsonify({'message': str(error)}), 503, headers
+
+def format_sse(event, payload):
+    """Format a payload as a Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+# Response headers of the Server-Sent Events stream
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'  # Stop reverse proxies from buffering the event stream
+}
+
+def optimization_request_error(data):
+    """Return why a request's code and language cannot be optimized, or None when they are usable"""
+    if not isinstance(data, dict) or 'code' not in data or 'language' not in data:
+        return 'Missing code or language'
+    if not isinstance(data['code'], str) or not isinstance(data['language'], str) or not data['code'] or not data['language']:
+        return 'code and language must be non-empty strings'
+    return None
+
+def estimate_request_tokens(route):
+    """Estimate the upstream tokens an optimization request may use"""
+    return route.prompt_tokens + route.max_tokens
+
+def route_request(code, language, tier):
+    """Pick the model and completion budget for code, raising InputTooLarge for oversized input"""
+    return get_router().route(code, language, tier)
+
+def plan_optimization(code, language, tier, chunked=None):
+    """Split code into the parts sent to the model, each with its (chunk, route)
+
+    Code above CHUNK_THRESHOLD_TOKENS is split at function and class
+    boundaries unless chunked is False; chunked=True splits code of any size.
+    """
+    router = get_router()
+    config = current_app.config
+    chunk_tokens = config.get('CHUNK_MAX_TOKENS', 1500)
+    if chunked is None:
+        chunked = router.count(code) > config.get('CHUNK_THRESHOLD_TOKENS', 3000)
+    chunks = split_source(code, language, chunk_tokens, router.count) if chunked else []
+    if len(chunks) <= 1:
+        return [(Chunk(code, 1, code.count('\n') + 1), router.route(code, language, tier))]
+    
+    max_parts = config.get('CHUNK_MAX_PARTS', 32)
+    if len(chunks) > max_parts:
+        raise InputTooLarge(
+            f'Code is too large to optimize ({len(chunks)} parts, limit {max_parts})',
+            router.count(code), max_parts * chunk_tokens
+        )
+    return [(chunk, router.route(chunk.code, language, tier)) for chunk in chunks]
+
+def call_model(code, language, route, upstream=None, in_flight=None, part=False):
+    """Send code to the model and return the optimized code, the full report and the measured usage"""
+    messages = build_messages(code, language, part)
+    # Call OpenAI API for code optimization, holding one of the in-flight upstream slots
+    with in_flight or get_rate_limiter().in_flight, timed('upstream'):
+        started = time.perf_counter()
+        response = (upstream or get_upstream()).create_completion(
+            model=route.model,
+            messages=messages,
             temperature=0.7,
-            max_tokens=2300
+            max_tokens=route.max_tokens
         )
+    
+    optimization_response = response.choices[0].message.content
+    usage = measure_usage(response, started, SYSTEM_PROMPT + messages[1]['content'], optimization_response)
+    
+    # Extract optimized code from the response
+    extract = extract_chunk_code if part else extract_optimized_code
+    with timed('extract'):
+        optimized_code = extract(optimization_response, code)
+    return optimized_code, optimization_response, usage
+
+def optimize_parts(user_id, language, plan):
+    """Optimize the parts of a file concurrently and stitch the results together
+
+    Returns the optimized file, the merged report, the usage rows of every
+    part and whether every part was served from the result cache.
+    """
+    cache = get_result_cache()
+    keys = [make_cache_key(chunk.code, language, route.model, SYSTEM_PROMPT + CHUNK_INSTRUCTIONS) for chunk, route in plan]
+    results = [None] * len(plan)
+    calls = [None] * len(plan)
+    
+    # Parts unchanged since an earlier submission come from the result cache
+    missing = []
+    for index, key in enumerate(keys):
+        cached = cache.get(key)
+        if cached:
+            results[index] = (cached['optimized_code'], cached['suggestions'])
+        else:
+            missing.append(index)
+    
+    if missing:
+        workers = min(current_app.config.get('CHUNK_CONCURRENCY', 8), len(missing))
+        upstream = get_upstream()
+        in_flight = get_rate_limiter().in_flight
+        errors = []
+        # The parts are sent from worker threads, which are outside the request, so the wait is timed here
+        with ThreadPoolExecutor(max_workers=workers) as executor, timed('upstream'):
+            futures = {
+                index: executor.submit(call_model, plan[index][0].code, language, plan[index][1], upstream, in_flight, True)
+                for index in missing
+            }
+            for index, future in futures.items():
+                try:
+                    optimized_code, optimization_response, calls[index] = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                results[index] = (optimized_code, optimization_response)
+                cache.set(keys[index], {'optimized_code': optimized_code, 'suggestions': optimization_response})
+        # Parts that did succeed stay cached, so a retry only pays for the failed ones
+        if errors:
+            raise errors[0]
+    
+    with timed('extract'):
+        optimized_code, optimization_response = merge_parts([chunk for chunk, _ in plan], results, language)
+    usage = [usage_record(user_id, language, route.model, call) for (_, route), call in zip(plan, calls)]
+    return optimized_code, optimization_response, usage, not missing
+
+def run_optimization(user_id, code, language, plan=None):
+    """Optimize code for a user, in parts when it is large, and save the result to their history"""
+    if plan is None:
+        user = load_user(user_id)
+        plan = plan_optimization(code, language, user.tier if user else 'standard')
+    
+    if len(plan) > 1:
+        optimized_code, optimization_response, usage, cached = optimize_parts(user_id, language, plan)
+    else:
+        route = plan[0][1]
+        # Serve resubmitted snippets from the result cache
+        cache = get_result_cache()
+        cache_key = make_cache_key(code, language, route.model, SYSTEM_PROMPT)
+        hit = cache.get(cache_key)
+        call = None
         
-        optimization_response = response.choices[0].message.content
+        if hit:
+            optimization_response = hit['suggestions']
+            optimized_code = hit['optimized_code']
+        else:
+            optimized_code, optimization_response, call = call_model(code, language, route)
+            cache.set(cache_key, {
+                'optimized_code': optimized_code,
+                'suggestions': optimization_response
+            })
+        usage = [usage_record(user_id, language, route.model, call)]
+        cached = hit is not None
+    
+    with timed('extract'):
+        report = report_fields(parse_report(optimization_response))
+    
+    # Save optimization history to database
+    history = CodeHistory(
+        user_id=user_id,
+        language=language,
+        original_code=code,
+        optimized_code=optimized_code,
+        optimization_suggestions=optimization_response,
+        report=report,
+        usage=usage
+    )
+    with timed('commit'):
+        history.save()
+    return history, cached
+
+@api_bp.route('/optimize', methods=['POST'])
+@jwt_required()
+def optimize_code():
+    """Optimize code using OpenAI's GPT model"""
+    with timed('parse'):
+        data = request.get_json()
+    # Validate request data
+    error = optimization_request_error(data)
+    if error:
+        return jsonify({'message': error}), 400
         
-        # Extract optimized code from the response
-        code_match = re.search(r'```(?:\w+)?\n([\s\S]*?)```', optimization_response)
-        optimized_code = code_match.group(1).strip() if code_match else data['code']
+    if not isinstance(data.get('chunked', False), (bool, type(None))):
+        return jsonify({'message': 'chunked must be true or false'}), 400
         
-        # Save optimization history to database
-        history = CodeHistory(
-            user_id=user_id,
-            language=data['language'],
-            original_code=data['code'],
-            optimized_code=optimized_code,
-            optimization_suggestions=optimization_response
-        )
-        history.save()
+    if not isinstance(data.get('reuse_similar', False), bool):
+        return jsonify({'message': 'reuse_similar must be true or false'}), 400
+        
+    user_id = int(get_jwt_identity())
+    
+    try:
+        plan = plan_optimization(data['code'], data['language'], get_current_user().tier, data.get('chunked'))
+        get_rate_limiter().check(user_id, tokens=sum(estimate_request_tokens(route) for _, route in plan))
+        
+        # Answer instantly with an earlier optimization of nearly the same code when the client allows it
+        if data.get('reuse_similar'):
+            response = reuse_similar_history(user_id, data['code'], data['language'], plan)
+            if response is not None:
+                return response
+        
+        history, cached = run_optimization(user_id, data['code'], data['language'], plan)
         
         return jsonify({
             'id': history.id,
-            'optimized_code': optimized_code,
-            'suggestions': optimization_response
+            'optimized_code': history.optimized_code,
+            'suggestions': history.optimization_suggestions,
+            'cached': cached,
+            'chunks': len(plan)
         }), 200
         
+    except InputTooLarge as e:
+        return input_too_large_response(e)
+    except NoRouteMatches as e:
+        return jsonify({'message': str(e)}), 400
+    except RateLimited as e:
+        return rate_limited_response(e)
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
-@api_bp.route('/history', methods=['GET'])
+def find_similar_history(user_id, code, language, threshold=None, limit=1):
+    """Return (entry, similarity) pairs of the user's earlier optimizations of near-duplicate code"""
+    config = current_app.config
+    return CodeHistory.find_similar(
+        user_id, language, code,
+        config.get('SIMILARITY_THRESHOLD', 0.8) if threshold is None else threshold,
+        limit, config.get('SIMILARITY_MAX_CANDIDATES', 200)
+    )
+
+def reuse_similar_history(user_id, code, language, plan):
+    """Build the /optimize response from the closest earlier optimization, or return None if there is none"""
+    matches = find_similar_history(user_id, code, language)
+    if not matches:
+        return None
+    history, similarity = matches[0]
+    # Reused results count as cache hits of the entry they came from
+    usage = usage_record(user_id, language, plan[0][1].model)
+    usage.history_id = history.id
+    db.session.add(usage)
+    db.session.commit()
+    return jsonify({
+        'id': history.id,
+        'optimized_code': history.optimized_code,
+        'suggestions': history.optimization_suggestions,
+        'cached': True,
+        'chunks': len(plan),
+        'similarity': similarity
+    }), 200
+
+def parse_similarity_args(data):
+    """Read the threshold and limit of a near-duplicate search, raising ValueError for bad values"""
+    threshold = data.get('threshold', current_app.config.get('SIMILARITY_THRESHOLD', 0.8))
+    if isinstance(threshold, bool) or not isinstance(threshold, (int, float)) or not 0 < threshold <= 1:
+        raise ValueError('threshold must be a number between 0 and 1')
+    limit = data.get('limit', 5)
+    if isinstance(limit, bool) or not isinstance(limit, int) or limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return threshold, min(limit, current_app.config.get('SIMILARITY_MAX_RESULTS', 20))
+
+@api_bp.route('/optimize/similar', methods=['POST'])
 @jwt_required()
-def get_history():
-    """Get user's code optimization history"""
+def find_similar_optimizations():
+    """Find earlier optimizations of code nearly identical to the submitted code, without calling the model"""
+    data = request.get_json()
+    # Validate request data
+    error = optimization_request_error(data)
+    if error:
+        return jsonify({'message': error}), 400
+    
+    try:
+        threshold, limit = parse_similarity_args(data)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    user_id = int(get_jwt_identity())
+    matches = find_similar_history(user_id, data['code'], data['language'], threshold, limit)
+    items = [dict(serialize_history_summary(history), similarity=similarity) for history, similarity in matches]
+    return jsonify({'items': items}), 200
+
+@api_bp.route('/optimize/batch', methods=['POST'])
+@jwt_required()
+def optimize_batch():
+    """Optimize several code snippets concurrently"""
+    data = request.get_json()
+    # Validate request data
+    if not data or not isinstance(data.get('items'), list) or not data['items']:
+        return jsonify({'message': 'Missing items'}), 400
+    
+    max_items = current_app.config.get('BATCH_MAX_ITEMS', 50)
+    if len(data['items']) > max_items:
+        return jsonify({'message': f'A batch may contain at most {max_items} items'}), 400
+        
     user_id = int(get_jwt_identity())
-    # Query history entries ordered by creation date (newest first)
-    histories = CodeHistory.query.filter_by(user_id=user_id).order_by(CodeHistory.created_at.desc()).all()
+    tier = get_current_user().tier
+    results = [None] * len(data['items'])
+    routes = {}
+    
+    # Route every snippet up front so oversized ones fail before anything is charged or sent
+    for index, item in enumerate(data['items']):
+        error = optimization_request_error(item)
+        if error:
+            results[index] = {'error': error}
+            continue
+        try:
+            routes[index] = route_request(item['code'], item['language'], tier)
+        except (InputTooLarge, NoRouteMatches) as e:
+            results[index] = {'error': str(e)}
+    
+    limiter = get_rate_limiter()
+    # Every snippet counts against the request budgets, including malformed ones and cache hits
+    try:
+        limiter.check(
+            user_id,
+            requests=len(data['items']),
+            tokens=sum(estimate_request_tokens(route) for route in routes.values())
+        )
+    except RateLimited as e:
+        return rate_limited_response(e)
+    
+    cache = get_result_cache()
+    keys = {}
+    pending = {}
     
-    return jsonify([{
+    # Resolve cache hits here and collect the distinct snippets that need the model
+    for index, route in routes.items():
+        item = data['items'][index]
+        key = make_cache_key(item['code'], item['language'], route.model, SYSTEM_PROMPT)
+        keys[index] = key
+        cached = cache.get(key)
+        if cached:
+            results[index] = dict(cached, cached=True)
+        elif key not in pending:
+            pending[key] = (item, route)
+    
+    # Fan the cache misses out to the model with bounded concurrency
+    outcomes = {}
+    calls = {}
+    if pending:
+        workers = min(current_app.config.get('BATCH_CONCURRENCY', 8), len(pending))
+        upstream = get_upstream()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                key: executor.submit(call_model, item['code'], item['language'], route, upstream, limiter.in_flight)
+                for key, (item, route) in pending.items()
+            }
+            for key, future in futures.items():
+                try:
+                    optimized_code, optimization_response, calls[key] = future.result()
+                    outcomes[key] = {
+                        'optimized_code': optimized_code,
+                        'suggestions': optimization_response
+                    }
+                    cache.set(key, outcomes[key])
+                except Exception as e:
+                    outcomes[key] = {'error': str(e)}
+    
+    # Save every successful result to the database in a single insert
+    histories = {}
+    for index, key in keys.items():
+        if results[index] is None:
+            outcome = outcomes[key]
+            results[index] = outcome if 'error' in outcome else dict(outcome, cached=False)
+        if 'error' not in results[index]:
+            item = data['items'][index]
+            histories[index] = CodeHistory(
+                user_id=user_id,
+                language=item['language'],
+                original_code=item['code'],
+                optimized_code=results[index]['optimized_code'],
+                optimization_suggestions=results[index]['suggestions'],
+                report=report_fields(parse_report(results[index]['suggestions'])),
+                # Repeats of a snippet within the batch reuse the first call and count as cache hits
+                usage=[usage_record(user_id, item['language'], routes[index].model, calls.pop(key, None))]
+            )
+    
+    try:
+        db.session.add_all(histories.values())
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 500
+    
+    for index, history in histories.items():
+        results[index]['id'] = history.id
+    
+    return jsonify({'results': results}), 200
+
+@api_bp.route('/optimize/stream', methods=['POST'])
+@jwt_required()
+def optimize_code_stream():
+    """Optimize code and relay the model output as Server-Sent Events"""
+    data = request.get_json()
+    # Validate request data
+    error = optimization_request_error(data)
+    if error:
+        return jsonify({'message': error}), 400
+        
+    if not isinstance(data.get('chunked', False), (bool, type(None))):
+        return jsonify({'message': 'chunked must be true or false'}), 400
+        
+    user_id = int(get_jwt_identity())
+    limiter = get_rate_limiter()
+    try:
+        plan = plan_optimization(data['code'], data['language'], get_current_user().tier, data.get('chunked'))
+        limiter.check(user_id, tokens=sum(estimate_request_tokens(route) for _, route in plan))
+    except InputTooLarge as e:
+        return input_too_large_response(e)
+    except NoRouteMatches as e:
+        return jsonify({'message': str(e)}), 400
+    except RateLimited as e:
+        return rate_limited_response(e)
+    
+    if len(plan) > 1:
+        # Parts are optimized concurrently, so the merged report is sent in one piece
+        return Response(stream_with_context(stream_parts(user_id, data['code'], data['language'], plan)), mimetype='text/event-stream', headers=SSE_HEADERS)
+    
+    route = plan[0][1]
+    cache = get_result_cache()
+    cache_key = make_cache_key(data['code'], data['language'], route.model, SYSTEM_PROMPT)
+    cached = cache.get(cache_key)
+    stream = None
+    
+    if not cached:
+        try:
+            # The in-flight slot is held until the stream has been fully relayed or abandoned
+            limiter.in_flight.acquire()
+        except RateLimited as e:
+            return rate_limited_response(e)
+        try:
+            # Open the upstream stream before responding so setup errors return a plain 500
+            messages = build_messages(data['code'], data['language'])
+            started = time.perf_counter()
+            stream = get_upstream().create_completion(
+                model=route.model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=route.max_tokens,
+                stream=True,
+                stream_options={'include_usage': True}  # Token counts arrive in a final chunk without choices
+            )
+        except UpstreamUnavailable as e:
+            limiter.in_flight.release()
+            return upstream_unavailable_response(e)
+        except Exception as e:
+            limiter.in_flight.release()
+            return jsonify({'message': str(e)}), 500
+    
+    def generate():
+        call = None  # Measured upstream call; stays None for cache hits
+        try:
+            if cached:
+                optimization_response = cached['suggestions']
+                optimized_code = cached['optimized_code']
+                report = parse_report(optimization_response)
+                yield format_sse('delta', {'content': optimization_response})
+            else:
+                parts = []
+                # Sections are split as the deltas arrive instead of rescanning the finished report
+                parser = ReportParser()
+                final_chunk = None
+                for chunk in stream:
+                    if getattr(chunk, 'usage', None):
+                        final_chunk = chunk
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        parts.append(delta)
+                        parser.feed(delta)
+                        yield format_sse('delta', {'content': delta})
+                
+                optimization_response = ''.join(parts)
+                call = measure_usage(final_chunk, started, SYSTEM_PROMPT + messages[1]['content'], optimization_response)
+                report = parser.close()
+                optimized_code = extract_optimized_code(optimization_response, data['code'], report)
+                cache.set(cache_key, {
+                    'optimized_code': optimized_code,
+                    'suggestions': optimization_response
+                })
+            
+            # Save optimization history once the full response is available
+            history = CodeHistory(
+                user_id=user_id,
+                language=data['language'],
+                original_code=data['code'],
+                optimized_code=optimized_code,
+                optimization_suggestions=optimization_response,
+                report=report_fields(report),
+                usage=[usage_record(user_id, data['language'], route.model, call)]
+            )
+            history.save()
+            
+            yield format_sse('done', {
+                'id': history.id,
+                'optimized_code': optimized_code,
+                'cached': cached is not None
+            })
+        except Exception as e:
+            db.session.rollback()
+            yield format_sse('error', {'message': str(e)})
+        finally:
+            # Runs on completion and when the client disconnects, releasing the upstream connection
+            if stream is not None:
+                stream.close()
+                limiter.in_flight.release()
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+def stream_parts(user_id, code, language, plan):
+    """Relay the result of a file optimized in parts as Server-Sent Events"""
+    try:
+        history, cached = run_optimization(user_id, code, language, plan)
+        yield format_sse('delta', {'content': history.optimization_suggestions})
+        yield format_sse('done', {
+            'id': history.id,
+            'optimized_code': history.optimized_code,
+            'cached': cached
+        })
+    except Exception as e:
+        db.session.rollback()
+        yield format_sse('error', {'message': str(e)})
+
+@api_bp.route('/optimize/cache/stats', methods=['GET'])
+@jwt_required()
+def cache_stats():
+    """Get hit/miss counters of the optimization result cache"""
+    return jsonify(get_result_cache().stats()), 200
+
+def serialize_history(history):
+    """Convert a history entry with its full bodies into its JSON representation"""
+    return {
         'id': history.id,
         'original_code': history.original_code,
         'optimized_code': history.optimized_code,
         'optimization_suggestions': history.optimization_suggestions,
+        'report': serialize_report(history),
         'language': history.language,
-        'created_at': history.created_at.isoformat()  # Send ISO format timestamp
-    } for history in histories]), 200
+        'created_at': history.created_at.isoformat(),  # Send ISO format timestamp
+        **serialize_summary(history)
+    }
+
+def serialize_report(history):
+    """Return the prose sections of a history entry's report, parsing entries saved before they were stored"""
+    report = history.report
+    if not any(report.values()) and history.optimization_suggestions:
+        report = report_fields(parse_report(history.optimization_suggestions))
+    return report
+
+def serialize_summary(history):
+    """Return the listing summary stored with a history entry (None values for entries not summarized yet)"""
+    return {name: getattr(history, name) for name in CodeHistory.SUMMARY_FIELDS}
+
+def serialize_history_summary(history):
+    """Convert a history entry loaded for the summary view into its JSON representation"""
+    return {
+        'id': history.id,
+        'language': history.language,
+        'created_at': history.created_at.isoformat(),
+        'preview': history.preview,
+        **serialize_summary(history)
+    }
+
+def parse_history_paging(args):
+    """Read the view and page size of a paginated history request, raising ValueError for bad values"""
+    view = args.get('view', 'summary')
+    if view not in ('summary', 'full'):
+        raise ValueError('view must be summary or full')
+    
+    default_limit = current_app.config.get('HISTORY_PAGE_SIZE', 20)
+    try:
+        limit = int(args.get('limit', default_limit))
+    except ValueError:
+        limit = default_limit  # Same as Flask's args.get(type=int) for unparsable values
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return view, min(limit, current_app.config.get('HISTORY_MAX_PAGE_SIZE', 100))
+
+def history_view_options(view):
+    """Loader options fetching exactly the columns a history view serializes"""
+    if view == 'summary':
+        # Read only the summary projection stored at write time, leaving the large text columns out of the query
+        summary = [getattr(CodeHistory, name) for name in CodeHistory.SUMMARY_FIELDS]
+        return [load_only(CodeHistory.id, CodeHistory.language, CodeHistory.created_at, CodeHistory.preview, *summary)]
+    return CodeHistory.body_options()
+
+@api_bp.route('/history', methods=['GET'])
+@jwt_required()
+def get_history():
+    """Get user's code optimization history"""
+    user_id = int(get_jwt_identity())
+    query = CodeHistory.query.filter_by(user_id=user_id)
+    
+    # Without paging parameters keep returning the complete history as a plain list
+    if not request.args.keys() & {'limit', 'cursor', 'view'}:
+        # Query history entries ordered by creation date (newest first)
+        with timed('query'):
+            histories = query.options(*CodeHistory.body_options()).order_by(CodeHistory.created_at.desc()).all()
+        with timed('serialize'):
+            items = [serialize_history(history) for history in histories]
+        return jsonify(items), 200
+    
+    try:
+        view, limit = parse_history_paging(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    query = query.options(*history_view_options(view))
+    
+    try:
+        with timed('query'):
+            histories, next_cursor = paginate_newest_first(query, CodeHistory, request.args.get('cursor'), limit)
+    except InvalidCursor as e:
+        return jsonify({'message': str(e)}), 400
+    
+    serialize = serialize_history_summary if view == 'summary' else serialize_history
+    with timed('serialize'):
+        items = [serialize(history) for history in histories]
+    
+    return jsonify({'items': items, 'next_cursor': next_cursor}), 200
+
+def serialize_search_result(row):
+    """Convert a full-text search row into its JSON representation"""
+    return {
+        'id': row.id,
+        'language': row.language,
+        'created_at': row.created_at.isoformat(),
+        'preview': row.preview,
+        'score': row.score,
+        'snippets': {
+            'code': highlight(row.code_snippet),
+            'suggestions': highlight(row.suggestions_snippet)
+        }
+    }
+
+@api_bp.route('/history/search', methods=['GET'])
+@jwt_required()
+def search_history_entries():
+    """Search the user's history for entries whose code or report contains every word of q, best matches first"""
+    terms = query_terms(request.args.get('q'))
+    if not terms:
+        return jsonify({'message': 'q must contain at least one word'}), 400
+    
+    try:
+        _, limit = parse_history_paging({'limit': request.args.get('limit', current_app.config.get('HISTORY_PAGE_SIZE', 20))})
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    offset = request.args.get('offset', 0, type=int)
+    if offset < 0:
+        return jsonify({'message': 'offset must not be negative'}), 400
+    
+    user_id = int(get_jwt_identity())
+    # Only the bodies of the returned page are read, to cut the snippets from
+    try:
+        rows = search_history(db.session.connection(), user_id, terms, limit, offset, load_search_texts)
+    except SearchUnavailable as e:
+        return jsonify({'message': str(e)}), 501
+    return jsonify({'items': [serialize_search_result(row) for row in rows]}), 200
+
+@api_bp.route('/history/<int:history_id>', methods=['GET'])
+@jwt_required()
+def get_history_entry(history_id):
+    """Get a single code optimization history entry with its full bodies"""
+    user_id = int(get_jwt_identity())
+    history = CodeHistory.query.filter_by(id=history_id, user_id=user_id).first()
+    
+    if not history:
+        return jsonify({'message': 'History not found'}), 404
+    
+    return jsonify(serialize_history(history)), 200
 
 @api_bp.route('/history/<int:history_id>', methods=['DELETE'])
 @jwt_required()
@@ -157,3 +797,50 @@ def delete_history(history_id):
     
     history.delete()
     return jsonify({'message': 'History deleted successfully'}), 200
+
+def parse_bulk_delete(data):
+    """Read the ids or the from/to created_at range of a bulk delete, returning the criteria selecting those entries"""
+    if not isinstance(data, dict) or not (data.keys() & {'ids', 'from', 'to'}):
+        raise ValueError('Provide ids or a from/to date range')
+    if 'ids' in data:
+        if data.keys() & {'from', 'to'}:
+            raise ValueError('Provide either ids or a date range, not both')
+        ids = data['ids']
+        if not isinstance(ids, list) or not ids or not all(isinstance(history_id, int) and not isinstance(history_id, bool) for history_id in ids):
+            raise ValueError('ids must be a non-empty list of integers')
+        max_ids = current_app.config.get('HISTORY_BULK_DELETE_MAX_IDS', 1000)
+        if len(ids) > max_ids:
+            raise ValueError(f'At most {max_ids} ids may be deleted at once')
+        return [CodeHistory.id.in_(set(ids))]
+    try:
+        start = datetime.fromisoformat(data['from']) if data.get('from') is not None else None
+        end = datetime.fromisoformat(data['to']) if data.get('to') is not None else None
+    except (TypeError, ValueError):
+        raise ValueError('from and to must be ISO 8601 dates or timestamps') from None
+    if start is not None and end is not None and start >= end:
+        raise ValueError('from must be before to')
+    criteria = []
+    if start is not None:
+        criteria.append(CodeHistory.created_at >= start)
+    if end is not None:
+        criteria.append(CodeHistory.created_at < end)
+    if not criteria:
+        raise ValueError('Provide ids or a from/to date range')
+    return criteria
+
+@api_bp.route('/history', methods=['DELETE'])
+@jwt_required()
+def delete_history_entries_in_bulk():
+    """Delete several of the user's history entries, by id or created in a date range, in one transaction"""
+    user_id = int(get_jwt_identity())
+    try:
+        with timed('parse'):
+            criteria = parse_bulk_delete(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    # Ids of other users' entries are ignored, like unknown ids
+    deleted = delete_history_entries(CodeHistory.user_id == user_id, *criteria)
+    with timed('commit'):
+        db.session.commit()
+    return jsonify({'deleted': deleted}), 200
@@ -0,0 +1,40 @@
+# Import required modules
+from datetime import datetime
+from sqlalchemy import tuple_
+import base64
+import json
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+def encode_cursor(created_at, row_id):
+    """Encode the (created_at, id) position of a row as an opaque cursor"""
+    raw = json.dumps([created_at.isoformat(), row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor('Invalid cursor') from e
+
+def newest_first_after(statement, model, cursor, limit):
+    """Restrict a query or select() to one page newest first, fetching one extra row to detect the next page"""
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        statement = statement.where(tuple_(model.created_at, model.id) < tuple_(created_at, row_id))
+    return statement.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+def finish_page(rows, limit):
+    """Trim the extra row fetched by newest_first_after and return the rows with the next cursor"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
+def paginate_newest_first(query, model, cursor, limit):
+    """Return one page of rows newest first and the cursor of the next page (None on the last page)"""
+    return finish_page(newest_first_after(query, model, cursor, limit).all(), limit)
@@ -0,0 +1,210 @@
+# Import required modules
+from flask import current_app, jsonify
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from user.models import RateLimitBucket, db
+import asyncio
+import math
+import threading
+import time
+
+# Rough characters-per-token ratio used to estimate request sizes without a tokenizer
+CHARS_PER_TOKEN = 4
+
+class RateLimited(Exception):
+    """Raised when a request exceeds a rate or concurrency limit"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after  # Seconds until the request would be allowed
+
+def estimate_tokens(text):
+    """Estimate the number of tokens in a piece of text"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def refill(tokens, updated_at, capacity, period, now):
+    """Return the level of a bucket after refilling it at capacity per period"""
+    return min(capacity, tokens + (now - updated_at) * capacity / period)
+
+def wait_time(level, capacity, cost, period):
+    """Seconds until a bucket at level can pay cost, or 0 if it can pay now"""
+    # Requests larger than the whole budget are charged the full bucket instead of never passing
+    cost = min(cost, capacity)
+    if level >= cost:
+        return 0
+    return (cost - level) * period / capacity
+
+class MemoryBuckets:
+    """Token buckets held in process memory"""
+
+    def __init__(self, period=60):
+        self.period = period
+        self._buckets = {}  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def consume(self, charges):
+        """Charge every (key, capacity, cost) at once, or none of them; returns the wait in seconds"""
+        with self._lock:
+            now = time.monotonic()
+            levels = {}
+            for key, capacity, cost in charges:
+                tokens, updated_at = self._buckets.get(key, (capacity, now))
+                levels[key] = refill(tokens, updated_at, capacity, self.period, now)
+            wait = max(wait_time(levels[key], capacity, cost, self.period) for key, capacity, cost in charges)
+            if wait:
+                return wait
+            for key, capacity, cost in charges:
+                self._buckets[key] = (levels[key] - min(cost, capacity), now)
+            return 0
+
+class SQLBuckets:
+    """Token buckets shared between processes through the application database"""
+
+    def __init__(self, period=60):
+        self.period = period
+
+    def consume(self, charges):
+        """Charge every (key, capacity, cost) at once, or none of them; returns the wait in seconds"""
+        table = RateLimitBucket.__table__
+        now = time.time()
+        capacities = {key: capacity for key, capacity, _ in charges}
+        session = db.session
+        try:
+            # Create missing buckets full, then lock them in key order so concurrent checks cannot deadlock
+            self._create_missing(session, table, capacities, now)
+            rows = session.execute(
+                select(table.c.key, table.c.tokens, table.c.updated_at)
+                .where(table.c.key.in_(capacities))
+                .order_by(table.c.key)
+                .with_for_update()
+            ).all()
+            levels = {row.key: refill(row.tokens, row.updated_at, capacities[row.key], self.period, now) for row in rows}
+            wait = max(wait_time(levels[key], capacity, cost, self.period) for key, capacity, cost in charges)
+            if not wait:
+                session.execute(
+                    update(table).where(table.c.key == bindparam('bucket')).values(tokens=bindparam('level'), updated_at=now),
+                    [{'bucket': key, 'level': levels[key] - min(cost, capacity)} for key, capacity, cost in charges]
+                )
+            session.commit()
+            return wait
+        except Exception:
+            session.rollback()
+            raise
+
+    def _create_missing(self, session, table, capacities, now):
+        values = [{'key': key, 'tokens': capacity, 'updated_at': now} for key, capacity in capacities.items()]
+        dialect = session.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            session.execute(insert(table).values(values).on_conflict_do_nothing(index_elements=[table.c.key]))
+        else:
+            # Portable fallback for databases without INSERT ... ON CONFLICT
+            existing = set(session.execute(select(table.c.key).where(table.c.key.in_(capacities))).scalars())
+            missing = [value for value in values if value['key'] not in existing]
+            if missing:
+                session.execute(table.insert(), missing)
+
+class InFlightLimit:
+    """Caps the number of upstream calls running at once in this process"""
+
+    def __init__(self, limit, wait=10.0):
+        self.wait = wait
+        self._semaphore = threading.BoundedSemaphore(limit) if limit else None
+
+    def acquire(self):
+        """Wait for a free slot, raising RateLimited if none frees up in time"""
+        if self._semaphore is not None and not self._semaphore.acquire(timeout=self.wait):
+            raise RateLimited('Too many optimizations in progress, try again later', retry_after=1)
+
+    def release(self):
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class AsyncInFlightLimit:
+    """Caps the number of upstream calls awaited at once on an event loop"""
+
+    def __init__(self, limit, wait=10.0):
+        self.wait = wait
+        self._semaphore = asyncio.Semaphore(limit) if limit else None
+
+    async def __aenter__(self):
+        if self._semaphore is not None:
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.wait)
+            except asyncio.TimeoutError:
+                raise RateLimited('Too many optimizations in progress, try again later', retry_after=1) from None
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+class RateLimiter:
+    """Per-user and global request and token budgets plus the upstream concurrency cap"""
+
+    def __init__(self, buckets, in_flight, user_requests=30, user_tokens=100000, global_requests=600, global_tokens=2000000, enabled=True):
+        self.buckets = buckets
+        self.in_flight = in_flight
+        self.user_requests = user_requests
+        self.user_tokens = user_tokens
+        self.global_requests = global_requests
+        self.global_tokens = global_tokens
+        self.enabled = enabled
+
+    def check(self, user_id, requests=1, tokens=0):
+        """Charge a request to the user's and the global budgets, raising RateLimited when either is spent"""
+        if not self.enabled:
+            return
+        charges = [
+            (f'user:{user_id}:requests', self.user_requests, requests),
+            (f'user:{user_id}:tokens', self.user_tokens, tokens),
+            ('global:requests', self.global_requests, requests),
+            ('global:tokens', self.global_tokens, tokens),
+        ]
+        # A budget of 0 disables that limit
+        charges = [charge for charge in charges if charge[1] > 0]
+        if not charges:
+            return
+        wait = self.buckets.consume(charges)
+        if wait:
+            raise RateLimited('Rate limit exceeded, try again later', retry_after=wait)
+
+BUCKET_BACKENDS = {
+    'memory': MemoryBuckets,
+    'sql': SQLBuckets,
+}
+
+def create_rate_limiter(config):
+    """Create the rate limiter configured by the RATE_LIMIT_* settings"""
+    name = config.get('RATE_LIMIT_BACKEND', 'memory')
+    if name not in BUCKET_BACKENDS:
+        raise ValueError(f'Unknown rate limit backend: {name}')
+    return RateLimiter(
+        BUCKET_BACKENDS[name](period=config.get('RATE_LIMIT_PERIOD', 60)),
+        InFlightLimit(config.get('UPSTREAM_MAX_IN_FLIGHT', 16), wait=config.get('UPSTREAM_IN_FLIGHT_WAIT', 10)),
+        user_requests=config.get('RATE_LIMIT_USER_REQUESTS', 30),
+        user_tokens=config.get('RATE_LIMIT_USER_TOKENS', 100000),
+        global_requests=config.get('RATE_LIMIT_GLOBAL_REQUESTS', 600),
+        global_tokens=config.get('RATE_LIMIT_GLOBAL_TOKENS', 2000000),
+        enabled=config.get('RATE_LIMIT_ENABLED', True)
+    )
+
+def get_rate_limiter():
+    """Return the rate limiter for the current application, creating it on first use"""
+    limiter = current_app.extensions.get('rate_limiter')
+    if limiter is None:
+        limiter = create_rate_limiter(current_app.config)
+        current_app.extensions['rate_limiter'] = limiter
+    return limiter
+
+def rate_limited_response(error):
+    """Build a 429 response telling the client when to retry"""
+    retry_after = max(math.ceil(error.retry_after), 1)
+    return jsonify({'message': str(error), 'retry_after': retry_after}), 429, {'Retry-After': str(retry_after)}
@@ -0,0 +1,147 @@
+# Import required modules
+from collections import namedtuple
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Numbered report sections defined by the system prompt
+SECTION_TITLES = {
+    1: 'Code Analysis',
+    2: 'Optimisation Suggestions',
+    3: 'Changes Made',
+    4: 'Optimised Code',
+    5: 'Detailed Explanation of Optimised Code',
+}
+
+# Structured fields the prose sections are stored in; section 4 is stored as the optimized code
+SECTION_FIELDS = {
+    1: 'analysis',
+    2: 'suggestions',
+    3: 'changes',
+    5: 'explanation',
+}
+
+# Section holding the optimized code block
+CODE_SECTION = 4
+
+# Heading of a numbered report section, e.g. '1. Code Analysis' or '## 4. Optimised Code'
+SECTION_HEADING = re.compile(r'[#*\s]*([1-5])\.\s+\**\s*(?:Code Analysis|Optimi[sz]|Changes Made|Detailed Explanation)', re.IGNORECASE)
+
+# Opening or closing line of a fenced code block, e.g. '```python' or '~~~'
+FENCE = re.compile(r'\s*(`{3,}|~{3,})(.*)')
+
+# Parsed report: the body of every section found and the optimized code block (None when missing or unterminated)
+Report = namedtuple('Report', ['sections', 'code', 'structured'])
+
+class ReportParser:
+    """Split an optimization report into its numbered sections in a single pass
+
+    Text can be fed in arbitrary pieces as it streams in; every character is
+    examined once, so parsing is linear in the length of the report. Headings
+    only count outside code blocks and must come in increasing order, so a
+    snippet or a numbered list inside a section cannot start a new one. The
+    optimized code is the first code block of section 4; reports without any
+    section headings fall back to their first code block.
+    """
+
+    def __init__(self):
+        self.partial = []  # Pieces of the line that has not been terminated yet
+        self.section = 0  # Section being read, 0 before the first heading
+        self.bodies = {0: []}  # Lines of every section seen so far
+        self.fence = None  # Opening marker of the code block being read, e.g. '```'
+        self.code_lines = None  # Lines of the code block being captured as the optimized code
+        self.code = None  # Optimized code block once it has been closed
+        self.fallback = None  # First complete code block anywhere, for unstructured reports
+
+    def feed(self, text):
+        """Consume the next piece of the report"""
+        start = 0
+        newline = text.find('\n')
+        while newline != -1:
+            if self.partial:
+                self.partial.append(text[start:newline])
+                line = ''.join(self.partial)
+                self.partial = []
+            else:
+                line = text[start:newline]
+            self.process_line(line)
+            start = newline + 1
+            newline = text.find('\n', start)
+        if start < len(text):
+            self.partial.append(text[start:])
+
+    def process_line(self, line):
+        """Route one complete line to the current section, opening or closing code blocks and sections"""
+        stripped = line.lstrip()
+        if self.fence is not None:
+            if stripped.startswith(self.fence[0]) and self.is_closing_fence(stripped):
+                self.close_fence()
+            elif self.code_lines is not None:
+                self.code_lines.append(line)
+        elif stripped[:1] in ('`', '~'):
+            match = FENCE.match(line)
+            if match and not (match.group(1)[0] == '`' and '`' in match.group(2)):
+                self.open_fence(match.group(1))
+        elif stripped[:1] in ('#', '*') or stripped[:1].isdigit():
+            heading = SECTION_HEADING.match(line)
+            if heading and int(heading.group(1)) > self.section:
+                self.section = int(heading.group(1))
+                self.bodies[self.section] = []
+                return
+        self.bodies[self.section].append(line)
+
+    def is_closing_fence(self, stripped):
+        """Check whether a line inside a code block ends it"""
+        marker = stripped.rstrip()
+        return len(marker) >= len(self.fence) and marker.count(self.fence[0]) == len(marker)
+
+    def open_fence(self, marker):
+        """Start a code block, capturing it when it may hold the optimized code"""
+        self.fence = marker
+        wanted = self.section == CODE_SECTION and self.code is None
+        unstructured = self.section == 0 and self.fallback is None
+        self.code_lines = [] if wanted or unstructured else None
+
+    def close_fence(self):
+        """End the current code block, keeping its contents if they were being captured"""
+        if self.code_lines is not None:
+            block = '\n'.join(self.code_lines)
+            if self.section == CODE_SECTION:
+                self.code = block
+            else:
+                self.fallback = block
+        self.fence = None
+        self.code_lines = None
+
+    def close(self):
+        """Finish parsing and return the Report; an unterminated code block is discarded"""
+        if self.partial:
+            self.process_line(''.join(self.partial))
+            self.partial = []
+        structured = len(self.bodies) > 1
+        if structured:
+            sections = {number: '\n'.join(lines).strip() for number, lines in self.bodies.items() if number}
+            code = self.code
+        else:
+            # Unstructured reports count as a single analysis section
+            sections = {1: '\n'.join(self.bodies[0]).strip()}
+            code = self.fallback
+        return Report(sections, code, structured)
+
+def parse_report(text):
+    """Parse a complete optimization report"""
+    parser = ReportParser()
+    parser.feed(text)
+    return parser.close()
+
+def report_fields(report):
+    """Map the prose sections of a parsed report to the CodeHistory.report fields they are stored in"""
+    return {field: report.sections.get(number) or None for number, field in SECTION_FIELDS.items()}
+
+def code_or_original(report, original_code):
+    """Return the optimized code of a parsed report, logging and keeping the original code when there is none"""
+    if report.code is not None:
+        return report.code
+    logger.warning('Optimization report has no complete Optimised Code block; keeping the original code')
+    return original_code
@@ -0,0 +1,121 @@
+# Import required modules
+from collections import namedtuple
+from flask import current_app, jsonify
+from api.ratelimit import estimate_tokens
+import functools
+
+# Model, completion budget and prompt size chosen for one optimization request
+Route = namedtuple('Route', ['model', 'max_tokens', 'prompt_tokens'])
+
+# Context window assumed for models missing from MODEL_CONTEXT_WINDOWS
+DEFAULT_CONTEXT_WINDOW = 128000
+
+class InputTooLarge(Exception):
+    """Raised when code is too large to optimize in a single model call"""
+
+    def __init__(self, message, input_tokens, max_input_tokens):
+        super().__init__(message)
+        self.input_tokens = input_tokens  # Estimated tokens of the submitted code
+        self.max_input_tokens = max_input_tokens  # Largest accepted size in tokens
+
+class NoRouteMatches(ValueError):
+    """Raised when no MODEL_ROUTES rule accepts a request, e.g. a language no rule lists"""
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(name):
+    """Return a tiktoken encoding, or None when tiktoken or its data files are unavailable"""
+    try:
+        import tiktoken  # Optional; imported on first use to keep startup fast
+        return tiktoken.get_encoding(name)
+    except Exception:
+        return None
+
+def count_tokens(text, encoding_name='o200k_base'):
+    """Count the tokens of text locally, estimating from its length when no tokenizer is installed"""
+    encoding = get_encoding(encoding_name)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+class ModelRouter:
+    """Chooses the model and completion budget of a request from ordered routing rules
+
+    Each rule is a mapping with a model and a max_tokens cap, optionally
+    restricted by languages, tiers and max_input_tokens; the first matching
+    rule wins. The completion budget leaves room for the report plus a
+    rewritten copy of the code, up to the rule's cap.
+    """
+
+    def __init__(self, rules, system_prompt, context_windows=None, report_tokens=1000, max_input_tokens=12000, encoding='o200k_base'):
+        self.rules = rules
+        self.context_windows = context_windows or {}
+        self.report_tokens = report_tokens
+        self.max_input_tokens = max_input_tokens
+        self.encoding = encoding
+        self.system_prompt_tokens = count_tokens(system_prompt, encoding)
+
+    def count(self, text):
+        """Count the tokens of text with the router's tokenizer"""
+        return count_tokens(text, self.encoding)
+
+    def route(self, code, language, tier='standard'):
+        """Pick the route for a request, raising InputTooLarge before anything is sent upstream"""
+        code_tokens = self.count(code)
+        if self.max_input_tokens and code_tokens > self.max_input_tokens:
+            raise InputTooLarge(
+                f'Code is too large to optimize ({code_tokens} tokens, limit {self.max_input_tokens})',
+                code_tokens, self.max_input_tokens
+            )
+
+        rule = self.match(code_tokens, language, tier)
+        model = rule['model']
+        max_tokens = min(rule['max_tokens'], self.report_tokens + 2 * code_tokens)
+        prompt_tokens = self.system_prompt_tokens + code_tokens
+        context_window = self.context_windows.get(model, DEFAULT_CONTEXT_WINDOW)
+        if prompt_tokens + max_tokens > context_window:
+            raise InputTooLarge(
+                f'Code is too large for the context window of {model}',
+                code_tokens, max(context_window - max_tokens - self.system_prompt_tokens, 0)
+            )
+        return Route(model, max_tokens, prompt_tokens)
+
+    def match(self, code_tokens, language, tier):
+        """Return the first rule matching the request"""
+        for rule in self.rules:
+            if 'languages' in rule and language not in rule['languages']:
+                continue
+            if 'tiers' in rule and tier not in rule['tiers']:
+                continue
+            if 'max_input_tokens' in rule and code_tokens > rule['max_input_tokens']:
+                continue
+            return rule
+        raise NoRouteMatches('No model route matches the request; add a catch-all rule to MODEL_ROUTES')
+
+def create_router(config):
+    """Create the model router configured by the MODEL_* and ROUTING_* settings"""
+    from api.openai_api import SYSTEM_PROMPT  # Imported here because openai_api imports this module
+
+    return ModelRouter(
+        config['MODEL_ROUTES'],
+        SYSTEM_PROMPT,
+        context_windows=config.get('MODEL_CONTEXT_WINDOWS'),
+        report_tokens=config.get('ROUTING_REPORT_TOKENS', 1000),
+        max_input_tokens=config.get('ROUTING_MAX_INPUT_TOKENS', 12000),
+        encoding=config.get('ROUTING_TOKENIZER', 'o200k_base')
+    )
+
+def get_router():
+    """Return the model router for the current application, creating it on first use"""
+    router = current_app.extensions.get('model_router')
+    if router is None:
+        router = create_router(current_app.config)
+        current_app.extensions['model_router'] = router
+    return router
+
+def input_too_large_response(error):
+    """Build a 413 response telling the client how much code a request may contain"""
+    return jsonify({
+        'message': str(error),
+        'input_tokens': error.input_tokens,
+        'max_input_tokens': error.max_input_tokens
+    }), 413
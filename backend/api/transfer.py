@@ -0,0 +1,217 @@
+# Import required modules
+from datetime import datetime
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from user.models import CodeHistory, db
+from api.report import parse_report, report_fields
+import csv
+import gzip
+import io
+import json
+import zlib
+
+# Create history export and import blueprint
+transfer_bp = Blueprint('transfer', __name__)
+
+# Columns of an exported history record, in CSV column order
+EXPORT_FIELDS = ('id', 'language', 'created_at', 'original_code', 'optimized_code', 'optimization_suggestions') + CodeHistory.SUMMARY_FIELDS
+
+# Characters of output collected before each write to the client
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Invalid records described in an import response; later ones are only counted
+IMPORT_MAX_ERRORS = 100
+
+def export_record(history):
+    """Convert a history entry into an export record"""
+    record = {name: getattr(history, name) for name in EXPORT_FIELDS}
+    record['created_at'] = history.created_at.isoformat() if history.created_at else None
+    return record
+
+def export_records(user_id, batch_size):
+    """Yield the export records of a user's history, oldest first, fetching batch_size entries at a time"""
+    query = (
+        CodeHistory.query
+        .filter_by(user_id=user_id)
+        .options(*CodeHistory.body_options())
+        .order_by(CodeHistory.id)
+        .yield_per(batch_size)
+    )
+    for history in query:
+        yield export_record(history)
+
+def ndjson_lines(records):
+    """Format records as newline-delimited JSON"""
+    for record in records:
+        yield json.dumps(record) + '\n'
+
+def csv_lines(records):
+    """Format records as CSV rows after a header row"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+def buffered(pieces, size=EXPORT_CHUNK_SIZE):
+    """Join small text pieces into chunks of about size characters so each write carries many rows"""
+    chunk, length = [], 0
+    for piece in pieces:
+        chunk.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(chunk)
+            chunk, length = [], 0
+    if chunk:
+        yield ''.join(chunk)
+
+def gzip_chunks(chunks):
+    """Compress text chunks into one gzip stream as they are produced"""
+    compressor = zlib.compressobj(wbits=31)  # 31 selects the gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+@transfer_bp.route('/history/export', methods=['GET'])
+@jwt_required()
+def export_history():
+    """Stream the user's whole history as NDJSON (format=ndjson, the default) or gzip-compressed CSV (format=csv)"""
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'message': 'format must be ndjson or csv'}), 400
+
+    user_id = int(get_jwt_identity())
+    # Rows are read through a server-side cursor and written as they arrive, so memory stays flat however long the history
+    records = export_records(user_id, current_app.config.get('HISTORY_EXPORT_BATCH_SIZE', 500))
+    if export_format == 'ndjson':
+        body, mimetype, filename = buffered(ndjson_lines(records)), 'application/x-ndjson', 'history.ndjson'
+    else:
+        body, mimetype, filename = gzip_chunks(buffered(csv_lines(records))), 'application/gzip', 'history.csv.gz'
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+def upload_lines(stream, compressed):
+    """Yield the lines of an uploaded file as it is read, decompressing it on the fly when compressed"""
+    if isinstance(stream, io.RawIOBase):
+        stream = io.BufferedReader(stream)
+    if compressed:
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    # Splitting on the newline byte before decoding is safe because it never occurs inside a UTF-8 sequence
+    for line in iter(stream.readline, b''):
+        yield line.decode('utf-8')
+
+def ndjson_records(lines):
+    """Yield (line number, record) pairs of NDJSON lines, skipping blank lines"""
+    for number, line in enumerate(lines, 1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, None
+
+def csv_records(lines):
+    """Yield (row number, record) pairs of CSV rows after the header row, with empty cells as None"""
+    reader = csv.DictReader(lines)
+    for number, row in enumerate(reader, 2):
+        yield number, {name: value if value != '' else None for name, value in row.items()}
+
+def import_entry(record, user_id):
+    """Build a history entry from an exported record, raising ValueError when it is invalid
+
+    Ids and summary fields in the record are ignored; the entry gets a new id
+    and its summary is computed again when it is written.
+    """
+    if not isinstance(record, dict):
+        raise ValueError('Record must be a JSON object')
+    language = record.get('language')
+    if not isinstance(language, str) or not language or len(language) > 50:
+        raise ValueError('language must be a non-empty string of at most 50 characters')
+    if not isinstance(record.get('original_code'), str) or not record['original_code']:
+        raise ValueError('original_code must be a non-empty string')
+    for name in ('optimized_code', 'optimization_suggestions'):
+        if not isinstance(record.get(name), (str, type(None))):
+            raise ValueError(f'{name} must be a string')
+    suggestions = record.get('optimization_suggestions')
+    history = CodeHistory(
+        user_id=user_id,
+        language=language,
+        original_code=record['original_code'],
+        optimized_code=record.get('optimized_code'),
+        optimization_suggestions=suggestions,
+        report=report_fields(parse_report(suggestions)) if suggestions else {}
+    )
+    # Entries without a timestamp are dated at the time of the import
+    if record.get('created_at') is not None:
+        try:
+            history.created_at = datetime.fromisoformat(record['created_at'])
+        except (TypeError, ValueError):
+            raise ValueError('created_at must be an ISO 8601 timestamp') from None
+    return history
+
+@transfer_bp.route('/history/import', methods=['POST'])
+@jwt_required()
+def import_history():
+    """Add the records of an NDJSON or CSV file, as produced by the export, to the user's history
+
+    The format follows the Content-Type (text/csv or application/x-ndjson);
+    application/gzip bodies are read as the gzip-compressed CSV export, and
+    Content-Encoding: gzip decompresses either format. The file is read as a
+    stream and committed in batches, so entries of earlier batches stay
+    imported if a later part of the file cannot be read. Invalid records are
+    skipped and reported.
+    """
+    compressed = request.mimetype == 'application/gzip' or request.content_encoding == 'gzip'
+    if request.mimetype in ('text/csv', 'application/gzip'):
+        # The csv module rejects fields over 131072 characters by default, which large entries exceed; the limit is
+        # process-wide, so every CSV import sets the same configured value
+        csv.field_size_limit(current_app.config.get('HISTORY_IMPORT_MAX_FIELD_CHARS', 16 * 1024 * 1024))
+        parse = csv_records
+    elif request.mimetype == 'application/x-ndjson':
+        parse = ndjson_records
+    else:
+        return jsonify({'message': 'Content-Type must be application/x-ndjson, text/csv or application/gzip'}), 415
+
+    config = current_app.config
+    batch_size = config.get('HISTORY_IMPORT_BATCH_SIZE', 500)
+    max_rows = config.get('HISTORY_IMPORT_MAX_ROWS', 100000)
+    user_id = int(get_jwt_identity())
+    imported, skipped, errors, batch = 0, 0, [], []
+
+    def flush():
+        nonlocal imported, batch
+        if batch:
+            db.session.add_all(batch)
+            db.session.commit()
+            imported += len(batch)
+            batch = []
+
+    try:
+        for number, record in parse(upload_lines(request.stream, compressed)):
+            try:
+                batch.append(import_entry(record, user_id))
+            except ValueError as e:
+                skipped += 1
+                if len(errors) < IMPORT_MAX_ERRORS:
+                    errors.append({'line': number, 'message': str(e)})
+                continue
+            if imported + len(batch) > max_rows:
+                batch.pop()
+                flush()
+                return jsonify({
+                    'message': f'At most {max_rows} entries may be imported at once',
+                    'imported': imported, 'skipped': skipped, 'errors': errors
+                }), 413
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+    except (OSError, EOFError, UnicodeDecodeError, csv.Error) as e:
+        # Corrupt compressed data, text that is not UTF-8 or malformed CSV
+        db.session.rollback()
+        return jsonify({'message': f'Could not read the file: {e}', 'imported': imported, 'skipped': skipped, 'errors': errors}), 400
+
+    return jsonify({'imported': imported, 'skipped': skipped, 'errors': errors}), 200
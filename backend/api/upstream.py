@@ -0,0 +1,225 @@
+# Import required modules
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from flask import current_app
+from user.metrics import get_metrics
+import asyncio
+import random
+import threading
+import time
+
+class UpstreamUnavailable(Exception):
+    """Raised when the model API cannot serve a request right now"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after  # Seconds the caller should wait before retrying
+
+class CircuitBreaker:
+    """Fails fast after repeated upstream failures until a cool-down period has passed"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """Current state: 'closed', 'open' or 'half-open'"""
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def before_call(self):
+        """Raise UpstreamUnavailable while the circuit is open"""
+        with self._lock:
+            if self._state() == 'open':
+                remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+                raise UpstreamUnavailable('Upstream model API is unavailable', retry_after=max(remaining, 1))
+            if self._state() == 'half-open':
+                # Let a single trial request through; the circuit stays open for everyone else
+                self.opened_at = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+def parse_retry_after(response):
+    """Return the delay requested by a Retry-After (or retry-after-ms) header, in seconds"""
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get('retry-after-ms'):
+        try:
+            return float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0)
+    except (TypeError, ValueError):
+        return None
+
+class UpstreamClient:
+    """Chat completion client with deadlines, jittered retries and a circuit breaker"""
+
+    def __init__(self, client, breaker=None, max_retries=3, backoff_base=0.5, backoff_max=8.0, deadline=90.0, metrics=None):
+        self.client = client
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.metrics = metrics  # MetricsRegistry recording the latency of every attempt, if any
+
+    def backoff(self, attempt):
+        """Full-jitter exponential backoff delay for a retry attempt"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def create_completion(self, deadline=None, **kwargs):
+        """Call chat.completions.create, retrying 429, 5xx and connection errors until the deadline"""
+        expires = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            remaining = self._start_attempt(expires)
+            started = time.monotonic()
+            try:
+                result = self.client.with_options(timeout=remaining).chat.completions.create(**kwargs)
+            except Exception as e:
+                self._observe(kwargs, started, 'error')
+                attempt += 1
+                time.sleep(self._retry_delay(e, attempt, expires))
+            else:
+                self._observe(kwargs, started, 'ok')
+                self.breaker.record_success()
+                return result
+
+    def _observe(self, kwargs, started, outcome):
+        """Record the latency of one attempt"""
+        if self.metrics is not None:
+            self.metrics.upstream_duration.observe(time.monotonic() - started, (kwargs.get('model', ''), outcome))
+
+    def _start_attempt(self, expires):
+        """Check the breaker and the deadline before an attempt, returning the time left"""
+        self.breaker.before_call()
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            raise UpstreamUnavailable('Upstream model API deadline exceeded')
+        return remaining
+
+    def _retry_delay(self, error, attempt, expires):
+        """Record a failed attempt and return how long to wait before the next one
+
+        Must be called from the except block handling error; errors that are not
+        worth retrying are re-raised, and UpstreamUnavailable is raised once the
+        retries or the deadline are used up.
+        """
+        import openai  # Already loaded by the client that raised; kept out of app startup
+        if isinstance(error, openai.RateLimitError):
+            # Rate limiting shows the upstream is reachable, so it never trips the breaker and closes a half-open one
+            self.breaker.record_success()
+            delay = parse_retry_after(error.response)
+        elif isinstance(error, (openai.APIConnectionError, openai.InternalServerError)):
+            self.breaker.record_failure()
+            delay = parse_retry_after(getattr(error, 'response', None))
+        elif isinstance(error, openai.APIStatusError) and error.status_code >= 500:
+            self.breaker.record_failure()
+            delay = parse_retry_after(error.response)
+        elif isinstance(error, openai.APIStatusError):
+            # The upstream answered, so a half-open circuit closes even though this request is rejected
+            self.breaker.record_success()
+            raise
+        else:
+            raise
+        if delay is None:
+            delay = self.backoff(attempt - 1)
+        if attempt > self.max_retries or time.monotonic() + delay >= expires:
+            raise UpstreamUnavailable(f'Upstream model API error: {error}', retry_after=delay) from error
+        return delay
+
+class AsyncUpstreamClient(UpstreamClient):
+    """UpstreamClient for an AsyncOpenAI client, waiting between retries without blocking the event loop"""
+
+    async def create_completion(self, deadline=None, **kwargs):
+        """Call chat.completions.create, retrying 429, 5xx and connection errors until the deadline"""
+        expires = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            remaining = self._start_attempt(expires)
+            started = time.monotonic()
+            try:
+                result = await self.client.with_options(timeout=remaining).chat.completions.create(**kwargs)
+            except Exception as e:
+                self._observe(kwargs, started, 'error')
+                attempt += 1
+                await asyncio.sleep(self._retry_delay(e, attempt, expires))
+            else:
+                self._observe(kwargs, started, 'ok')
+                self.breaker.record_success()
+                return result
+
+def create_upstream(config, asynchronous=False, metrics=None):
+    """Build an UpstreamClient with a pooled HTTP client sized from the application config
+
+    With asynchronous=True the client wraps AsyncOpenAI for use on an event loop.
+    Attempt latencies are recorded in metrics when a MetricsRegistry is given.
+    """
+    # The openai package takes a large share of import time, so it is loaded on the first model call
+    import openai
+
+    pool_size = config.get('UPSTREAM_POOL_SIZE', 16)
+    # openai re-exports its httpx Limits defaults, which avoids depending on a specific httpx package
+    limits = type(openai.DEFAULT_CONNECTION_LIMITS)(max_connections=pool_size, max_keepalive_connections=pool_size)
+    timeout = openai.Timeout(config.get('UPSTREAM_TIMEOUT', 60), connect=config.get('UPSTREAM_CONNECT_TIMEOUT', 5))
+    if asynchronous:
+        client_class, http_client = openai.AsyncOpenAI, openai.DefaultAsyncHttpxClient(limits=limits, timeout=timeout)
+    else:
+        client_class, http_client = openai.OpenAI, openai.DefaultHttpxClient(limits=limits, timeout=timeout)
+    client = client_class(
+        api_key=config.get('OPENAI_API_KEY'),
+        base_url=config.get('OPENAI_BASE_URL'),
+        http_client=http_client,
+        max_retries=0  # Retries are handled by UpstreamClient
+    )
+    breaker = CircuitBreaker(
+        failure_threshold=config.get('UPSTREAM_BREAKER_THRESHOLD', 5),
+        reset_timeout=config.get('UPSTREAM_BREAKER_RESET', 30)
+    )
+    return (AsyncUpstreamClient if asynchronous else UpstreamClient)(
+        client,
+        breaker=breaker,
+        max_retries=config.get('UPSTREAM_MAX_RETRIES', 3),
+        backoff_base=config.get('UPSTREAM_BACKOFF_BASE', 0.5),
+        backoff_max=config.get('UPSTREAM_BACKOFF_MAX', 8),
+        deadline=config.get('UPSTREAM_DEADLINE', 90),
+        metrics=metrics
+    )
+
+def get_upstream():
+    """Return the upstream client for the current application, creating it on first use"""
+    upstream = current_app.extensions.get('upstream')
+    if upstream is None:
+        upstream = create_upstream(current_app.config, metrics=get_metrics())
+        current_app.extensions['upstream'] = upstream
+    return upstream
@@ -0,0 +1,81 @@
+# Import required modules
+from datetime import date, timedelta
+from flask import Blueprint, current_app, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from user.models import OptimizationUsage, UsageRollup
+from api.ratelimit import estimate_tokens
+import time
+
+# Create usage blueprint
+usage_bp = Blueprint('usage', __name__)
+
+def measure_usage(response, started, prompt='', completion=''):
+    """Read the token counts of a completion and the milliseconds since started (a time.perf_counter() value)
+
+    Counts the upstream did not report (e.g. a proxy dropping stream usage)
+    are estimated from the prompt and completion text instead.
+    """
+    usage = getattr(response, 'usage', None)
+    return {
+        'prompt_tokens': getattr(usage, 'prompt_tokens', None) or estimate_tokens(prompt),
+        'completion_tokens': getattr(usage, 'completion_tokens', None) or estimate_tokens(completion),
+        'latency_ms': round((time.perf_counter() - started) * 1000)
+    }
+
+def usage_record(user_id, language, model, call=None):
+    """Build the usage row of an optimization; call is the measured upstream call, or None for a cache hit"""
+    return OptimizationUsage(user_id=user_id, language=language, model=model, cached=call is None, **(call or {}))
+
+def serialize_rollup(rollup):
+    """Convert a daily usage rollup into its JSON representation"""
+    upstream_calls = rollup.requests - rollup.cached_requests
+    return {
+        'day': rollup.day.isoformat(),
+        'model': rollup.model,
+        'language': rollup.language,
+        'requests': rollup.requests,
+        'cached_requests': rollup.cached_requests,
+        'prompt_tokens': rollup.prompt_tokens,
+        'completion_tokens': rollup.completion_tokens,
+        'total_tokens': rollup.prompt_tokens + rollup.completion_tokens,
+        'avg_latency_ms': round(rollup.latency_ms / upstream_calls) if upstream_calls else None
+    }
+
+def parse_day_range(args):
+    """Read the from/to dates of a usage request, raising ValueError for bad values"""
+    try:
+        end = date.fromisoformat(args['to']) if 'to' in args else date.today()
+        start = date.fromisoformat(args['from']) if 'from' in args else end - timedelta(days=current_app.config.get('USAGE_DEFAULT_DAYS', 30) - 1)
+    except ValueError:
+        raise ValueError('from and to must be dates in YYYY-MM-DD format') from None
+    if start > end:
+        raise ValueError('from must not be after to')
+    if (end - start).days >= current_app.config.get('USAGE_MAX_DAYS', 366):
+        raise ValueError(f"A usage report may cover at most {current_app.config.get('USAGE_MAX_DAYS', 366)} days")
+    return start, end
+
+@usage_bp.route('/usage', methods=['GET'])
+@jwt_required()
+def get_usage():
+    """Get the user's daily token usage by model and language"""
+    user_id = int(get_jwt_identity())
+    try:
+        start, end = parse_day_range(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    rollups = UsageRollup.query.filter(
+        UsageRollup.user_id == user_id,
+        UsageRollup.day.between(start, end)
+    ).order_by(UsageRollup.day, UsageRollup.model, UsageRollup.language).all()
+
+    totals = {name: sum(getattr(rollup, name) for rollup in rollups) for name in UsageRollup.ROLLUP_FIELDS}
+    totals.pop('latency_ms')
+    totals['total_tokens'] = totals['prompt_tokens'] + totals['completion_tokens']
+
+    return jsonify({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'items': [serialize_rollup(rollup) for rollup in rollups],
+        'totals': totals
+    }), 200
@@ -1,34 +1,40 @@
 # Import necessary libraries and modules
 from dotenv import load_dotenv
 load_dotenv()  # Load environment variables
-from flask import Flask, jsonify
+from collections.abc import Mapping
+from flask import Flask, current_app, jsonify
+from flask.cli import with_appcontext
 from flask_cors import CORS  # For handling cross-origin requests
-from user.models import db, bcrypt  # Database models and bcrypt
+from user.models import db, CodeBlob, CodeHistory, CodeSignature, CodeSignatureBand, clear_search_index, index_unindexed_history, purge_history, summarize_unsummarized_history  # Database models
+from user.search import include_search_index  # Full-text index objects kept out of autogenerate
+from user.blobs import move_inline_bodies, sweep_orphan_blobs  # Deduplicated code blob store
+from user.maintenance import start_periodic_task  # Background maintenance threads
+from user.metrics import checkpoint, init_metrics  # Request timings, SQL statistics and /metrics
+from user.profiler import init_profiler  # Opt-in sampling profiler of slow requests
+from user.compression import backfill_compression  # Compression of stored history bodies
 from user.user import auth_bp  # User authentication blueprint
-from api.openai_api import api_bp  # OpenAI API blueprint
+from user.identity import load_user  # Cached JWT identity to user resolution
+from api.openai_api import api_bp, serialize_report  # OpenAI API blueprint
+from api.jobs import jobs_bp  # Background optimization job blueprint
+from api.usage import usage_bp  # Token usage reporting blueprint
+from api.transfer import transfer_bp  # History export and import blueprint
 from config import Config  # Application configuration
 import os
+import click
 from flask_jwt_extended import JWTManager  # JWT authentication management
-from sqlalchemy_utils import database_exists, create_database
 from sqlalchemy import inspect
+from flask_migrate import Migrate, stamp, upgrade  # Database schema migrations
 
-# Create Flask application instance
-app = Flask(__name__)
-app.config.from_object(Config)  # Load configuration
+# Extensions are created once and bound to each application by create_app
+cors = CORS()
+jwt = JWTManager()
+migrate = Migrate()
 
-# Initialize extensions
-bcrypt.init_app(app)  # Initialize bcrypt first
-db.init_app(app)  # Then initialize database
+# Revision holding the schema that existed before migrations were introduced
+BASELINE_REVISION = '0001'
 
-# JWT configuration
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'dev-jwt-secret')  # JWT secret key
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = 3600  # Token validity period (1 hour)
-app.config['JWT_TOKEN_LOCATION'] = ['headers']  # Token location
-app.config['JWT_HEADER_NAME'] = 'Authorization'  # Token header name
-app.config['JWT_HEADER_TYPE'] = 'Bearer'  # Token type
-
-# Configure CORS
-CORS(app, resources={
+# Cross-origin access for the frontend
+CORS_RESOURCES = {
     r"/*": {
         "origins": [
             "http://localhost:3000",
@@ -38,46 +44,180 @@ CORS(app, resources={
         "allow_headers": ["Content-Type", "Authorization"],
         "supports_credentials": True
     }
-})
-
-def check_table_exists(table_name):
-    """Check if a table exists in the database"""
-    inspector = inspect(db.engine)
-    return table_name in inspector.get_table_names()
-
-# Initialize database tables if they don't exist
-def setup_database():
-    """Set up the database and create tables if they don't exist"""
-    with app.app_context():
-        try:
-            # Create database if it doesn't exist
-            if not database_exists(app.config['SQLALCHEMY_DATABASE_URI']):
-                create_database(app.config['SQLALCHEMY_DATABASE_URI'])
-                print("Database created successfully!")
-                # Create all tables for new database
-                db.create_all()
-                print("Database tables created successfully!")
-            else:
-                # Check if required tables exist
-                required_tables = ['users', 'code_history']
-                missing_tables = [table for table in required_tables if not check_table_exists(table)]
-                
-                if missing_tables:
-                    print(f"Creating missing tables: {', '.join(missing_tables)}")
-                    db.create_all()
-                    print("Missing tables created successfully!")
-                else:
-                    print("All required tables already exist!")
-                    
-        except Exception as e:
-            print(f"Error setting up database: {str(e)}")
-            raise
-
-# Set up database on startup
-setup_database()
-
-# Initialize JWT manager
-jwt = JWTManager(app)
+}
+
+def create_app(config=None):
+    """Create and configure an application instance
+
+    config may be a configuration object used instead of Config, or a mapping
+    of settings applied on top of Config. Nothing here touches the database;
+    use 'flask --app app check-db' or 'init-db' to verify or set up the schema.
+    """
+    app = Flask(__name__)
+    app.config.from_object(Config)  # Load configuration
+
+    # JWT configuration
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'dev-jwt-secret')  # JWT secret key
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = 3600  # Token validity period (1 hour)
+    app.config['JWT_TOKEN_LOCATION'] = ['headers']  # Token location
+    app.config['JWT_HEADER_NAME'] = 'Authorization'  # Token header name
+    app.config['JWT_HEADER_TYPE'] = 'Bearer'  # Token type
+
+    if isinstance(config, Mapping):
+        app.config.update(config)
+    elif config is not None:
+        app.config.from_object(config)
+
+    # Initialize extensions
+    db.init_app(app)  # Initialize database
+    jwt.init_app(app)  # Initialize JWT manager
+    cors.init_app(app, resources=CORS_RESOURCES)  # Configure CORS
+    # Set up versioned database migrations (see migrations/versions)
+    migrate.init_app(app, db, directory=os.path.join(app.config['BACKEND_DIR'], 'migrations'), include_name=include_search_index)
+
+    # Register blueprints
+    app.register_blueprint(auth_bp)  # Register user authentication blueprint
+    app.register_blueprint(api_bp)  # Register API blueprint
+    app.register_blueprint(jobs_bp)  # Register background job blueprint
+    app.register_blueprint(usage_bp)  # Register token usage blueprint
+    app.register_blueprint(transfer_bp)  # Register history export and import blueprint
+
+    # Register maintenance commands
+    for command in (init_db, check_db, compress_history, dedup_history, sweep_blobs_command, index_history, summarize_history, purge_history_command):
+        app.cli.add_command(command)
+
+    # Health check route
+    app.add_url_rule('/', 'health_check', health_check)
+
+    # Instrument requests and expose their metrics (and the slowest request profiles when enabled)
+    init_metrics(app)
+    init_profiler(app)
+
+    # Sweep orphaned blobs in the background when an interval is configured
+    if app.config['BLOB_SWEEP_INTERVAL'] > 0:
+        start_periodic_task(app, 'blob-sweeper', app.config['BLOB_SWEEP_INTERVAL'], sweep_blobs)
+
+    # Enforce history retention in the background when an interval and a limit are configured
+    if app.config['HISTORY_PURGE_INTERVAL'] > 0 and (app.config['HISTORY_MAX_ROWS'] > 0 or app.config['HISTORY_MAX_AGE_DAYS'] > 0):
+        start_periodic_task(app, 'history-purger', app.config['HISTORY_PURGE_INTERVAL'], purge_expired_history)
+
+    return app
+
+def health_check():
+    return "OK", 200
+
+@click.command('init-db')
+@with_appcontext
+def init_db():
+    """Create the database if needed and apply all pending migrations"""
+    # Imported here because only this command and check-db need it
+    from sqlalchemy_utils import database_exists, create_database
+
+    if not database_exists(current_app.config['SQLALCHEMY_DATABASE_URI']):
+        create_database(current_app.config['SQLALCHEMY_DATABASE_URI'])
+        print("Database created successfully!")
+
+    # Databases created by the old setup_database() have the baseline tables but no version
+    tables = inspect(db.engine).get_table_names()
+    if 'users' in tables and 'alembic_version' not in tables:
+        stamp(revision=BASELINE_REVISION)
+        print(f"Existing database stamped at revision {BASELINE_REVISION}")
+
+    upgrade()
+    print("Database schema is up to date!")
+
+@click.command('check-db')
+@with_appcontext
+def check_db():
+    """Check that the database exists and has every migration applied, without changing it"""
+    from sqlalchemy_utils import database_exists
+    from alembic.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    if not database_exists(current_app.config['SQLALCHEMY_DATABASE_URI']):
+        raise click.ClickException("Database does not exist; run 'flask --app app init-db'")
+
+    script = ScriptDirectory.from_config(current_app.extensions['migrate'].migrate.get_config())
+    with db.engine.connect() as connection:
+        current = set(MigrationContext.configure(connection).get_current_heads())
+    heads = set(script.get_heads())
+    if current != heads:
+        raise click.ClickException(
+            f"Database is at revision {', '.join(sorted(current)) or 'none'} but the latest is {', '.join(sorted(heads))}; "
+            "run 'flask --app app db upgrade'"
+        )
+    print("Database schema is up to date!")
+
+@click.command('compress-history')
+@click.option('--batch-size', default=500, show_default=True, help='Rows rewritten per transaction')
+@with_appcontext
+def compress_history(batch_size):
+    """Re-encode stored history bodies with the HISTORY_COMPRESSION codec"""
+    codec = current_app.config['HISTORY_COMPRESSION']
+    rewritten = backfill_compression(db.session, CodeHistory.__table__, list(CodeHistory.BODY_FIELDS), batch_size=batch_size)
+    print(f"Re-encoded {rewritten} history rows with codec '{codec}'")
+    rewritten = backfill_compression(db.session, CodeBlob.__table__, ['content'], batch_size=batch_size)
+    print(f"Re-encoded {rewritten} code blobs with codec '{codec}'")
+
+@click.command('dedup-history')
+@click.option('--batch-size', default=500, show_default=True, help='Rows moved per transaction')
+@with_appcontext
+def dedup_history(batch_size):
+    """Move history bodies stored inline by older versions into the shared blob store"""
+    moved = move_inline_bodies(db.session, CodeHistory.__table__, CodeBlob.__table__, CodeHistory.BODY_FIELDS, batch_size=batch_size)
+    print(f"Moved {moved} history rows into the blob store")
+
+@click.command('index-history')
+@click.option('--batch-size', default=500, show_default=True, help='Rows indexed per transaction')
+@click.option('--rebuild', is_flag=True, help='Drop the index first, e.g. after changing its signature settings')
+@with_appcontext
+def index_history(batch_size, rebuild):
+    """Add history entries missing from the near-duplicate and full-text search indexes"""
+    if rebuild:
+        CodeSignatureBand.query.delete()
+        CodeSignature.query.delete()
+        clear_search_index()
+        db.session.commit()
+    print(f"Indexed {index_unindexed_history(batch_size)} history entries for near-duplicate and full-text search")
+
+@click.command('summarize-history')
+@click.option('--batch-size', default=500, show_default=True, help='Rows summarized per transaction')
+@with_appcontext
+def summarize_history(batch_size):
+    """Compute the listing summary of history entries written before it was stored"""
+    # Entries older than the stored report sections have their analysis parsed from the full report
+    summarized = summarize_unsummarized_history(batch_size, analysis_of=lambda entry: serialize_report(entry)['analysis'])
+    print(f"Summarized {summarized} history entries")
+
+def sweep_blobs():
+    """Delete code blobs that no history entry references any more"""
+    history = CodeHistory.__table__
+    return sweep_orphan_blobs(
+        db.session,
+        CodeBlob.__table__,
+        [history.c[name + '_sha'] for name in CodeHistory.BODY_FIELDS],
+        grace_seconds=current_app.config['BLOB_SWEEP_GRACE']
+    )
+
+@click.command('sweep-blobs')
+@with_appcontext
+def sweep_blobs_command():
+    """Delete orphaned code blobs once"""
+    print(f"Removed {sweep_blobs()} orphaned code blobs")
+
+def purge_expired_history():
+    """Delete history entries beyond the configured retention limits"""
+    return purge_history(
+        max_rows=current_app.config['HISTORY_MAX_ROWS'],
+        max_age_days=current_app.config['HISTORY_MAX_AGE_DAYS'],
+        batch_size=current_app.config['HISTORY_PURGE_BATCH_SIZE']
+    )
+
+@click.command('purge-history')
+@with_appcontext
+def purge_history_command():
+    """Delete history entries beyond HISTORY_MAX_ROWS per user or older than HISTORY_MAX_AGE_DAYS once"""
+    print(f"Purged {purge_expired_history()} history entries")
 
 # Token expiration callback function
 @jwt.expired_token_loader
@@ -103,6 +243,19 @@ def unauthorized_callback(error):
         'error': str(error)
     }), 401
 
+# Resolve the token identity to the current user through the user cache
+@jwt.user_lookup_loader
+def user_lookup_callback(jwt_header, jwt_payload):
+    user = load_user(jwt_payload['sub'])
+    # Token decoding and the user lookup are the last steps before the view runs
+    checkpoint('auth')
+    return user
+
+# Callback function for tokens whose user no longer exists
+@jwt.user_lookup_error_loader
+def user_lookup_error_callback(jwt_header, jwt_payload):
+    return jsonify({'message': 'User not found'}), 404
+
 # Token refresh required callback function
 @jwt.needs_fresh_token_loader
 def token_not_fresh_callback(jwt_header, jwt_payload):
@@ -111,19 +264,14 @@ def token_not_fresh_callback(jwt_header, jwt_payload):
         'error': 'fresh_token_required'
     }), 401
 
-# Register blueprints
-app.register_blueprint(auth_bp)  # Register user authentication blueprint
-app.register_blueprint(api_bp)  # Register API blueprint
-
-# Health check route
-@app.route("/")
-def health_check():
-    return "OK", 200
+def __getattr__(name):
+    """Build the default application on first access of app.app (flask --app app, tests)"""
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Main program entry point
+# Development server entry point; use wsgi.py with gunicorn in production
 if __name__ == '__main__':
-    app.run(debug=True)  # Start application in debug mode
-
-
-
-
+    create_app().run(debug=os.getenv('FLASK_DEBUG') == '1')
@@ -0,0 +1,8 @@
+# Asyncio entry point for the optimize and history API, served by an ASGI server:
+#
+#     uvicorn asgi:app --workers 4
+#
+# Routes not served here (auth, jobs, streaming, batch) stay on the WSGI app in wsgi.py.
+from api.async_api import create_asgi_app
+
+app = create_asgi_app()
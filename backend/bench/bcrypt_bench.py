@@ -0,0 +1,51 @@
+"""Measure bcrypt login throughput at several cost settings
+
+Run from the backend directory:
+
+    python -m bench.bcrypt_bench --costs 10 11 12 13 --seconds 5
+
+Each cost is measured with one hashing process per core, the same way
+PasswordHasher checks passwords, and reported as logins per second per core.
+"""
+# Import required modules
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from user.passwords import hash_password, verify_password
+import argparse
+import multiprocessing
+import os
+import time
+
+def measure(executor, workers, hashed, seconds):
+    """Run password checks on every worker for the given time, returning the number completed"""
+    deadline = time.monotonic() + seconds
+    pending = {executor.submit(verify_password, 'benchmark-password', hashed) for _ in range(workers * 2)}
+    completed = 0
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            assert future.result()
+            completed += 1
+            if time.monotonic() < deadline:
+                pending.add(executor.submit(verify_password, 'benchmark-password', hashed))
+    return completed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--costs', type=int, nargs='+', default=[10, 11, 12, 13], help='bcrypt cost factors to measure')
+    parser.add_argument('--seconds', type=float, default=5.0, help='Measurement time per cost')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Hashing processes (defaults to one per core)')
+    args = parser.parse_args()
+
+    print(f'{"cost":>4}  {"ms/login":>9}  {"logins/s":>9}  {"logins/s/core":>13}')
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        for cost in args.costs:
+            hashed = hash_password('benchmark-password', cost)
+            measure(executor, args.workers, hashed, 0)  # Warm up the worker processes
+            start = time.monotonic()
+            completed = measure(executor, args.workers, hashed, args.seconds)
+            elapsed = time.monotonic() - start
+            rate = completed / elapsed
+            print(f'{cost:>4}  {1000 * args.workers / rate:>9.1f}  {rate:>9.1f}  {rate / args.workers:>13.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+# Import required modules
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import argparse
+import json
+import random
+import threading
+import time
+
+# Report returned when no scripted response is queued
+DEFAULT_CONTENT = "1. Code Analysis\n\n4. Optimised Code\n```python\npass\n```\n"
+
+class FakeOpenAIServer:
+    """Local OpenAI-compatible chat completions server for tests and benchmarks
+
+    Responses are taken from a queue of scripted ``(status, headers, body)``
+    tuples; once the queue is empty every request succeeds with ``content``,
+    except for a random error_rate share answered with error_status. Every
+    response waits latency seconds (plus up to jitter more) before the first
+    token, and with tokens_per_second set the tokens of ``content`` take as
+    long to generate as they would upstream.
+    """
+
+    def __init__(self, content=DEFAULT_CONTENT, latency=0.0, jitter=0.0, tokens_per_second=None,
+                 error_rate=0.0, error_status=500, seed=None, port=0):
+        self.content = content
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = []
+        self.scripted = []
+        self.errors = 0  # Injected errors returned so far
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """Base URL to pass to the OpenAI client"""
+        host, port = self._server.server_address
+        return f'http://{host}:{port}/v1'
+
+    def script(self, status, body=None, headers=None):
+        """Queue a response for the next unanswered request"""
+        with self._lock:
+            self.scripted.append((status, headers or {}, body if body is not None else {'error': {'message': 'scripted'}}))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-openai', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _next_response(self, payload):
+        """Pick the scripted or injected error response for a request, or build a successful completion"""
+        with self._lock:
+            self.requests.append(payload)
+            if self.scripted:
+                return self.scripted.pop(0)
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors += 1
+                # Rate limit errors tell the client when to retry, like the real API
+                headers = {'Retry-After': '1'} if self.error_status == 429 else {}
+                return self.error_status, headers, {'error': {'message': 'injected', 'type': 'server_error'}}
+        return 200, {}, None
+
+    def first_token_delay(self):
+        """Seconds to wait before answering, including the random jitter"""
+        with self._lock:
+            jitter = self._random.uniform(0, self.jitter) if self.jitter else 0.0
+        return self.latency + jitter
+
+    def token_delay(self):
+        """Seconds taken to generate each streamed token"""
+        return 1 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def completion_tokens(self):
+        """Number of tokens in the content, counted as the streamed chunks"""
+        return len(self.content.split(' '))
+
+    def completion(self, payload):
+        """Build a chat completion body for a request payload"""
+        return {
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': payload.get('model', 'fake'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': self.content},
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': 10, 'completion_tokens': 10, 'total_tokens': 20}
+        }
+
+    def chunks(self, payload):
+        """Split the completion content into streamed chunk bodies"""
+        words = self.content.split(' ')
+        for index, word in enumerate(words):
+            text = word if index == len(words) - 1 else word + ' '
+            yield {
+                'id': 'chatcmpl-fake',
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': payload.get('model', 'fake'),
+                'choices': [{'index': 0, 'delta': {'content': text}, 'finish_reason': None}]
+            }
+        if (payload.get('stream_options') or {}).get('include_usage'):
+            yield {
+                'id': 'chatcmpl-fake',
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': payload.get('model', 'fake'),
+                'choices': [],
+                'usage': {'prompt_tokens': 10, 'completion_tokens': len(words), 'total_tokens': 10 + len(words)}
+            }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                status, headers, body = server._next_response(payload)
+                delay = server.first_token_delay()
+                if status == 200 and body is None and payload.get('stream'):
+                    time.sleep(delay)
+                    self._stream(payload)
+                    return
+                if status == 200 and body is None:
+                    # A complete response arrives once every token has been generated
+                    delay += server.token_delay() * server.completion_tokens()
+                if delay:
+                    time.sleep(delay)
+                data = json.dumps(body if body is not None else server.completion(payload)).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, payload):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                token_delay = server.token_delay()
+                for chunk in server.chunks(payload):
+                    if token_delay and chunk['choices']:
+                        time.sleep(token_delay)
+                    self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+                    self.wfile.flush()
+                self.wfile.write(b'data: [DONE]\n\n')
+                self.close_connection = True
+
+        return Handler
+
+class StubClient:
+    """In-process stand-in for openai.OpenAI that hands requests to a completions object"""
+
+    def __init__(self, completions):
+        self.chat = SimpleNamespace(completions=completions)
+
+    def with_options(self, **options):
+        return self
+
+class AsyncStubClient(StubClient):
+    """In-process stand-in for openai.AsyncOpenAI; the completions object's create must be a coroutine"""
+
+def main():
+    """Serve fake completions until interrupted, e.g. as OPENAI_BASE_URL for a locally started backend"""
+    parser = argparse.ArgumentParser(description='Run a local OpenAI-compatible chat completions server')
+    parser.add_argument('--port', type=int, default=8001, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds before the first token')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random extra seconds added to the latency')
+    parser.add_argument('--tokens-per-second', type=float, default=None, help='Generation speed (unlimited by default)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with an error')
+    parser.add_argument('--error-status', type=int, default=500, help='Status of injected errors, e.g. 429 or 500')
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(
+        latency=args.latency, jitter=args.jitter, tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate, error_status=args.error_status, port=args.port
+    )
+    print(f'Serving fake completions at {server.base_url}')
+    with server:
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == '__main__':
+    main()
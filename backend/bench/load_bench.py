@@ -0,0 +1,288 @@
+"""Measure API latency, throughput and database queries under concurrent load
+
+Run from the backend directory:
+
+    python -m bench.load_bench --concurrency 20 --iterations 10 --latency 0.5 --tokens-per-second 200
+
+The app is served from this process by a threaded HTTP server, backed by a
+fresh SQLite file (or --database-url) and pointed at a local FakeOpenAIServer
+with the given latency, token rate and injected error rate. Every virtual
+user registers, logs in and then repeatedly optimizes new code, lists its
+history and deletes the new entry. The report gives p50/p95/p99 latency,
+throughput and SQL statements per request for every endpoint.
+
+Save a run with --save-baseline baseline.json and compare later runs with
+--baseline baseline.json: the exit status is 1 when an endpoint's p95
+latency, throughput or queries per request are worse than the baseline by
+more than --tolerance. --target runs the same load against an already
+running backend, which needs its own OPENAI_BASE_URL pointing at
+'python -m bench.fake_openai'; query counts are then not available.
+"""
+# Import required modules
+from concurrent.futures import ThreadPoolExecutor
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from werkzeug.serving import make_server
+from bench.fake_openai import FakeOpenAIServer
+import argparse
+import http.client
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+
+# Endpoints driven by every virtual user, in the order they are reported
+ENDPOINTS = ['register', 'login', 'optimize', 'history', 'delete']
+
+# Header naming the endpoint of a request, so the server can attribute its queries
+ENDPOINT_HEADER = 'X-Bench-Endpoint'
+
+PASSWORD = 'load-test-password'
+
+def percentile(values, share):
+    """Return the nearest-rank percentile of a list of values"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+class Recorder:
+    """Thread-safe collection of request latencies and statuses by endpoint"""
+
+    def __init__(self):
+        self.latencies = {name: [] for name in ENDPOINTS}
+        self.errors = {name: 0 for name in ENDPOINTS}
+        self.queries = {name: [] for name in ENDPOINTS}  # SQL statements of every request, filled by the in-process server
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def record_queries(self, endpoint, count):
+        with self._lock:
+            self.queries[endpoint].append(count)
+
+class Client:
+    """Minimal JSON client keeping one connection to the backend per virtual user"""
+
+    def __init__(self, base_url, recorder, timeout=120):
+        url = urllib.parse.urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(url.netloc, timeout=timeout)
+        self.prefix = url.path.rstrip('/')
+        self.recorder = recorder
+        self.token = None
+
+    def request(self, endpoint, method, path, payload=None):
+        """Send a request, record its latency and return (status, decoded body)"""
+        headers = {ENDPOINT_HEADER: endpoint}
+        body = None
+        if payload is not None:
+            body = json.dumps(payload)
+            headers['Content-Type'] = 'application/json'
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        start = time.perf_counter()
+        try:
+            self.connection.request(method, self.prefix + path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            # A dropped connection counts as a failed request; the next request reconnects
+            self.connection.close()
+            self.recorder.record(endpoint, time.perf_counter() - start, False)
+            return None, None
+        self.recorder.record(endpoint, time.perf_counter() - start, status < 400)
+        try:
+            return status, json.loads(data)
+        except ValueError:
+            return status, None
+
+def run_user(base_url, recorder, run_id, index, iterations, page_size):
+    """Register and log in one virtual user, then optimize, list and delete history entries"""
+    client = Client(base_url, recorder)
+    # Usernames are limited to 20 characters
+    credentials = {'username': f'ld{run_id}{index}'[:20], 'password': PASSWORD}
+    client.request('register', 'POST', '/register', credentials)
+    status, body = client.request('login', 'POST', '/login', credentials)
+    if status != 200:
+        return
+    client.token = body['access_token']
+    for iteration in range(iterations):
+        # Fresh code on every iteration, so the result cache and near-duplicate reuse do not answer it
+        code = f'def user_{index}_step_{iteration}(values):\n    return [value * {iteration} for value in values]\n'
+        status, body = client.request('optimize', 'POST', '/optimize', {'code': code, 'language': 'python'})
+        client.request('history', 'GET', f'/history?view=summary&limit={page_size}')
+        if status == 200:
+            client.request('delete', 'DELETE', f'/history/{body["id"]}')
+
+def count_queries(app, recorder):
+    """Count the SQL statements every request runs and record them under its endpoint header"""
+    from user.models import db
+
+    def before_cursor_execute(*args):
+        if has_request_context():
+            g.bench_queries = g.get('bench_queries', 0) + 1
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    @app.after_request
+    def record_queries(response):
+        endpoint = request.headers.get(ENDPOINT_HEADER)
+        if endpoint in recorder.queries:
+            recorder.record_queries(endpoint, g.get('bench_queries', 0))
+        return response
+
+def start_backend(args, fake, recorder, workdir):
+    """Serve a new application instance on a local port, returning the HTTP server"""
+    from app import create_app
+    from user.models import db
+
+    config = {
+        'SQLALCHEMY_DATABASE_URI': args.database_url or f'sqlite:///{os.path.join(workdir, "load.db")}',
+        'OPENAI_API_KEY': 'unused',
+        'OPENAI_BASE_URL': fake.base_url,
+        'RATE_LIMIT_ENABLED': args.rate_limit,
+    }
+    if args.bcrypt_rounds:
+        config['BCRYPT_LOG_ROUNDS'] = args.bcrypt_rounds
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+    count_queries(app, recorder)
+    # One log line per request would drown the report
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='load-bench-backend', daemon=True).start()
+    return server
+
+def summarize(recorder, duration):
+    """Build the result of a run: latency percentiles in ms, requests per second and queries per request"""
+    endpoints = {}
+    for name in ENDPOINTS:
+        latencies = recorder.latencies[name]
+        if not latencies:
+            continue
+        queries = recorder.queries[name]
+        endpoints[name] = {
+            'requests': len(latencies),
+            'errors': recorder.errors[name],
+            'p50': percentile(latencies, 0.50) * 1000,
+            'p95': percentile(latencies, 0.95) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+            'throughput': len(latencies) / duration,
+            'queries': sum(queries) / len(queries) if queries else None,
+        }
+    total = sum(endpoint['requests'] for endpoint in endpoints.values())
+    return {'duration': duration, 'throughput': total / duration, 'endpoints': endpoints}
+
+def compare(result, baseline, tolerance):
+    """List the endpoints that are slower, handle less traffic or run more queries than in the baseline"""
+    regressions = []
+    for name, current in result['endpoints'].items():
+        previous = baseline['endpoints'].get(name)
+        if previous is None:
+            continue
+        if current['p95'] > previous['p95'] * (1 + tolerance):
+            regressions.append(f'{name}: p95 {current["p95"]:.1f} ms, baseline {previous["p95"]:.1f} ms')
+        if current['throughput'] < previous['throughput'] * (1 - tolerance):
+            regressions.append(f'{name}: {current["throughput"]:.1f} req/s, baseline {previous["throughput"]:.1f} req/s')
+        if current['queries'] is not None and previous['queries'] is not None and current['queries'] > previous['queries'] * (1 + tolerance):
+            regressions.append(f'{name}: {current["queries"]:.1f} queries/request, baseline {previous["queries"]:.1f}')
+    return regressions
+
+def run(args):
+    """Run the load test described by the parsed arguments and return its summary"""
+    recorder = Recorder()
+    fake = FakeOpenAIServer(
+        latency=args.latency, jitter=args.jitter, tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate, error_status=args.error_status, seed=args.seed
+    )
+    with fake, tempfile.TemporaryDirectory() as workdir:
+        server = None
+        if args.target:
+            base_url = args.target
+        else:
+            server = start_backend(args, fake, recorder, workdir)
+            base_url = f'http://127.0.0.1:{server.server_port}'
+        run_id = uuid.uuid4().hex[:8]
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                futures = [
+                    executor.submit(run_user, base_url, recorder, run_id, index, args.iterations, args.page_size)
+                    for index in range(args.concurrency)
+                ]
+                for future in futures:
+                    future.result()
+            duration = time.perf_counter() - start
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+        result = summarize(recorder, duration)
+        # A --target backend calls the model API it was configured with, not this fake server
+        result['upstream'] = None if args.target else {'requests': len(fake.requests), 'injected_errors': fake.errors}
+    result['settings'] = {
+        name: getattr(args, name)
+        for name in ('concurrency', 'iterations', 'latency', 'jitter', 'tokens_per_second', 'error_rate', 'database_url', 'target')
+    }
+    return result
+
+def print_report(result):
+    print(f'{"endpoint":<9}  {"requests":>8}  {"errors":>6}  {"p50 ms":>8}  {"p95 ms":>8}  {"p99 ms":>8}  {"req/s":>7}  {"queries":>7}')
+    for name, endpoint in result['endpoints'].items():
+        queries = '-' if endpoint['queries'] is None else f'{endpoint["queries"]:.1f}'
+        print(
+            f'{name:<9}  {endpoint["requests"]:>8}  {endpoint["errors"]:>6}  {endpoint["p50"]:>8.1f}  {endpoint["p95"]:>8.1f}  '
+            f'{endpoint["p99"]:>8.1f}  {endpoint["throughput"]:>7.1f}  {queries:>7}'
+        )
+    print(f'{result["throughput"]:.1f} requests/s over {result["duration"]:.1f} s')
+    if result['upstream']:
+        print(f'{result["upstream"]["requests"]} model calls, {result["upstream"]["injected_errors"]} injected errors')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=10, help='Virtual users sending requests at the same time')
+    parser.add_argument('--iterations', type=int, default=10, help='Optimize, history and delete rounds per user')
+    parser.add_argument('--page-size', type=int, default=20, help='History entries listed per request')
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds the fake model takes before the first token')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random extra seconds added to the latency')
+    parser.add_argument('--tokens-per-second', type=float, default=None, help='Generation speed of the fake model (unlimited by default)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of model calls answered with an error')
+    parser.add_argument('--error-status', type=int, default=500, help='Status of injected errors, e.g. 429 or 500')
+    parser.add_argument('--seed', type=int, default=None, help='Seed of the injected latency jitter and errors')
+    parser.add_argument('--database-url', default=None, help='Database of the in-process backend (a fresh SQLite file by default)')
+    parser.add_argument('--bcrypt-rounds', type=int, default=None, help='bcrypt cost of the in-process backend (the configured cost by default)')
+    parser.add_argument('--rate-limit', action='store_true', help='Keep the optimization rate limits enabled')
+    parser.add_argument('--target', default=None, help='Base URL of a running backend to test instead of an in-process one')
+    parser.add_argument('--baseline', default=None, help='JSON results of an earlier run to compare against')
+    parser.add_argument('--save-baseline', default=None, help='Write the results as JSON for later comparisons')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression against the baseline')
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump(result, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(result, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+        print(f'No regressions beyond {args.tolerance:.0%} of the baseline')
+
+if __name__ == '__main__':
+    main()
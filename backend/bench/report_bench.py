@@ -0,0 +1,66 @@
+"""Measure the throughput of the optimization report parser on large responses
+
+Run from the backend directory:
+
+    python -m bench.report_bench --sizes 0.1 1 10 --delta-chars 16
+
+Every size is parsed as one complete text and again as a stream of deltas of
+--delta-chars characters, like the chunks relayed by /optimize/stream. Time
+per megabyte should stay flat as the reports grow, since parsing is linear.
+"""
+# Import required modules
+import argparse
+import time
+from api.report import ReportParser, parse_report
+
+def build_report(megabytes):
+    """Build a structured report of about the given size with long prose sections and a long code block"""
+    paragraph = '- The loop recomputes `len(items)`; hoist it out ```inline``` and use 1. enumerate\n'
+    snippet = '```python\nfor i in range(len(items)):\n    total += items[i]\n```\n'
+    code = 'def function_{0}(items):\n    return sum(item * {0} for item in items)\n\n'
+    target = int(megabytes * 1024 * 1024)
+    share = target // 5
+    sections = [
+        '1. Code Analysis\n' + (paragraph * 4 + snippet) * (share // (len(paragraph) * 4 + len(snippet)) + 1),
+        '2. Optimisation Suggestions\n' + paragraph * (share // len(paragraph) + 1),
+        '3. Changes Made\n' + paragraph * (share // len(paragraph) + 1),
+        '4. Optimised Code\n```python\n' + ''.join(code.format(i) for i in range(share // len(code.format(0)) + 1)) + '```\n',
+        '5. Detailed Explanation of Optimised Code\n' + paragraph * (share // len(paragraph) + 1),
+    ]
+    return '\n'.join(sections)
+
+def parse_streamed(report, delta_chars):
+    """Parse a report fed as consecutive deltas"""
+    parser = ReportParser()
+    for start in range(0, len(report), delta_chars):
+        parser.feed(report[start:start + delta_chars])
+    return parser.close()
+
+def measure(function, *args, runs=3):
+    """Return the fastest of several timed runs in seconds"""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=float, nargs='+', default=[0.1, 1, 10], help='Report sizes in megabytes')
+    parser.add_argument('--delta-chars', type=int, default=16, help='Characters per streamed delta')
+    parser.add_argument('--runs', type=int, default=3, help='Timed runs per measurement; the fastest is reported')
+    args = parser.parse_args()
+
+    print(f'{"size MB":>8}  {"whole MB/s":>10}  {"stream MB/s":>11}  {"ms/MB":>7}')
+    for size in args.sizes:
+        report = build_report(size)
+        megabytes = len(report) / (1024 * 1024)
+        whole = measure(parse_report, report, runs=args.runs)
+        streamed = measure(parse_streamed, report, args.delta_chars, runs=args.runs)
+        assert parse_report(report).code is not None
+        print(f'{megabytes:>8.2f}  {megabytes / whole:>10.1f}  {megabytes / streamed:>11.1f}  {whole * 1000 / megabytes:>7.1f}')
+
+if __name__ == '__main__':
+    main()
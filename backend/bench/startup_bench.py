@@ -0,0 +1,67 @@
+"""Measure the cold-start cost of one application worker
+
+Run from the backend directory:
+
+    python -m bench.startup_bench --runs 10
+
+Every run starts a fresh interpreter, like a new gunicorn worker, and times
+importing the app module, create_app() and the first request. The report
+also lists heavy modules that were loaded during startup.
+"""
+# Import required modules
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules that should stay unloaded until a request actually needs them
+LAZY_MODULES = ['openai', 'sqlalchemy_utils']
+
+# Program run in each fresh interpreter
+WORKER = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+application.test_client().get('/')
+served = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'create_app': created - imported,
+    'first_request': served - created,
+    'loaded': [name for name in %r if name in sys.modules],
+}))
+''' % (LAZY_MODULES,)
+
+def run_worker(env):
+    """Start a fresh interpreter and return its startup timings"""
+    backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    result = subprocess.run([sys.executable, '-c', WORKER], cwd=backend_dir, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='Fresh interpreters to start')
+    args = parser.parse_args()
+
+    # Startup must not need a reachable database or a real API key
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+    env.setdefault('OPENAI_API_KEY', 'unused')
+
+    runs = [run_worker(env) for _ in range(args.runs)]
+    print(f'{"phase":<14}  {"median ms":>9}  {"max ms":>8}')
+    for phase in ('import', 'create_app', 'first_request'):
+        values = [run[phase] * 1000 for run in runs]
+        print(f'{phase:<14}  {statistics.median(values):>9.1f}  {max(values):>8.1f}')
+    total = [sum(run[phase] for phase in ('import', 'create_app', 'first_request')) * 1000 for run in runs]
+    print(f'{"total":<14}  {statistics.median(total):>9.1f}  {max(total):>8.1f}')
+    loaded = sorted({name for run in runs for name in run['loaded']})
+    print(f'Heavy modules loaded at startup: {", ".join(loaded) or "none"}')
+
+if __name__ == '__main__':
+    main()
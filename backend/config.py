@@ -1,5 +1,6 @@
 # Import required modules
 import os
+import json
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -26,3 +27,123 @@ class Config:
     # JWT Configuration
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "dev-jwt-secret")
     JWT_ACCESS_TOKEN_EXPIRES = 7200  # Token expiration to 2 hours
+
+    # Password hashing (stored hashes with a different cost are rehashed on the next login)
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))  # bcrypt cost factor; each step doubles the work
+    BCRYPT_WORKERS = int(os.getenv('BCRYPT_WORKERS', 2))  # Hashing processes per app process (0 hashes on the request thread)
+    BCRYPT_MAX_PENDING = int(os.getenv('BCRYPT_MAX_PENDING', 64))  # Hashes queued for the pool before requests get 503
+    BCRYPT_QUEUE_WAIT = float(os.getenv('BCRYPT_QUEUE_WAIT', 5))  # Seconds to wait for a queue slot
+
+    # Cache of the users behind JWT identities (changes in another process show up after the TTL)
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 30))  # Seconds a cached user stays valid
+    USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', 10000))
+
+    # OpenAI API client (OPENAI_BASE_URL points the client at a proxy or a local fake server)
+    OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+    OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')
+
+    # Upstream model API resilience
+    UPSTREAM_TIMEOUT = float(os.getenv('UPSTREAM_TIMEOUT', 60))  # Seconds allowed for a single request
+    UPSTREAM_CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', 5))
+    UPSTREAM_DEADLINE = float(os.getenv('UPSTREAM_DEADLINE', 90))  # Total seconds across all retries of one call
+    UPSTREAM_MAX_RETRIES = int(os.getenv('UPSTREAM_MAX_RETRIES', 3))
+    UPSTREAM_BACKOFF_BASE = float(os.getenv('UPSTREAM_BACKOFF_BASE', 0.5))  # Seconds, doubled on each retry with full jitter
+    UPSTREAM_BACKOFF_MAX = float(os.getenv('UPSTREAM_BACKOFF_MAX', 8))
+    UPSTREAM_POOL_SIZE = int(os.getenv('UPSTREAM_POOL_SIZE', 16))  # Pooled connections; keep at or above JOB_WORKERS + BATCH_CONCURRENCY
+    UPSTREAM_BREAKER_THRESHOLD = int(os.getenv('UPSTREAM_BREAKER_THRESHOLD', 5))  # Consecutive failures that open the circuit
+    UPSTREAM_BREAKER_RESET = float(os.getenv('UPSTREAM_BREAKER_RESET', 30))  # Seconds before a trial request is let through
+
+    # Model routing: the first rule whose languages, tiers and max_input_tokens (code size) match picks the
+    # model and the max_tokens cap; MODEL_ROUTES may be overridden with the same list as JSON
+    MODEL_ROUTES = json.loads(os.getenv('MODEL_ROUTES', 'null')) or [
+        {'max_input_tokens': 400, 'model': 'gpt-4.1-mini', 'max_tokens': 1500},
+        {'max_input_tokens': 2000, 'model': 'gpt-4.1', 'max_tokens': 2300},
+        {'model': 'gpt-4.1', 'max_tokens': 16000},
+    ]
+    MODEL_CONTEXT_WINDOWS = {'gpt-4.1': 1047576, 'gpt-4.1-mini': 1047576, 'gpt-4.1-nano': 1047576}  # Prompt plus completion tokens per model
+    ROUTING_TOKENIZER = os.getenv('ROUTING_TOKENIZER', 'o200k_base')  # tiktoken encoding used to size requests (estimated without tiktoken)
+    ROUTING_REPORT_TOKENS = int(os.getenv('ROUTING_REPORT_TOKENS', 1000))  # Completion budget for the report on top of twice the code size
+    ROUTING_MAX_INPUT_TOKENS = int(os.getenv('ROUTING_MAX_INPUT_TOKENS', 12000))  # Larger code is rejected before calling the model (0 disables)
+
+    # Optimization of large files in parts split at function and class boundaries, sent to the model concurrently
+    CHUNK_THRESHOLD_TOKENS = int(os.getenv('CHUNK_THRESHOLD_TOKENS', 3000))  # Larger code is split unless the request sets chunked
+    CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', 1500))  # Target size of each part
+    CHUNK_MAX_PARTS = int(os.getenv('CHUNK_MAX_PARTS', 32))  # Files needing more parts are rejected with 413
+    CHUNK_CONCURRENCY = int(os.getenv('CHUNK_CONCURRENCY', 8))  # Concurrent upstream calls per file
+
+    # Near-duplicate search over each user's history (POST /optimize/similar and reuse_similar on /optimize)
+    SIMILARITY_THRESHOLD = float(os.getenv('SIMILARITY_THRESHOLD', 0.8))  # Estimated Jaccard similarity of token shingles
+    SIMILARITY_MAX_CANDIDATES = int(os.getenv('SIMILARITY_MAX_CANDIDATES', 200))  # Bucket matches compared per lookup
+    SIMILARITY_MAX_RESULTS = int(os.getenv('SIMILARITY_MAX_RESULTS', 20))  # Largest limit a lookup may ask for
+
+    # Rate limiting of optimization requests ('memory' buckets per process, 'sql' to share them through the database)
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+    RATE_LIMIT_PERIOD = float(os.getenv('RATE_LIMIT_PERIOD', 60))  # Seconds over which each budget refills
+    RATE_LIMIT_USER_REQUESTS = int(os.getenv('RATE_LIMIT_USER_REQUESTS', 30))  # Requests per user per period (0 disables)
+    RATE_LIMIT_USER_TOKENS = int(os.getenv('RATE_LIMIT_USER_TOKENS', 100000))  # Estimated tokens per user per period
+    RATE_LIMIT_GLOBAL_REQUESTS = int(os.getenv('RATE_LIMIT_GLOBAL_REQUESTS', 600))  # Requests across all users per period
+    RATE_LIMIT_GLOBAL_TOKENS = int(os.getenv('RATE_LIMIT_GLOBAL_TOKENS', 2000000))  # Estimated tokens across all users per period
+    UPSTREAM_MAX_IN_FLIGHT = int(os.getenv('UPSTREAM_MAX_IN_FLIGHT', 16))  # Concurrent upstream calls per process (0 disables)
+    UPSTREAM_IN_FLIGHT_WAIT = float(os.getenv('UPSTREAM_IN_FLIGHT_WAIT', 10))  # Seconds to wait for a free slot before answering 429
+
+    # Asyncio (ASGI) variant of the optimize and history API
+    ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL')  # Defaults to DATABASE_URL with the asyncpg or aiosqlite driver
+    ASYNC_MAX_IN_FLIGHT = int(os.getenv('ASYNC_MAX_IN_FLIGHT', 1000))  # Concurrent upstream calls per ASGI process
+
+    # Optimization result cache ('memory' for a per-process LRU, 'sql' to share through the database)
+    RESULT_CACHE_BACKEND = os.getenv('RESULT_CACHE_BACKEND', 'memory')
+    RESULT_CACHE_TTL = int(os.getenv('RESULT_CACHE_TTL', 24 * 3600))  # Seconds before a cached result expires
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', 1024))
+    RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    RESULT_CACHE_TRIM_EVERY = int(os.getenv('RESULT_CACHE_TRIM_EVERY', 100))  # Writes between trims of the sql backend
+
+    # Background optimization jobs ('local' runs a thread pool in each process, 'inline' runs jobs in the request)
+    JOB_BACKEND = os.getenv('JOB_BACKEND', 'local')
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))  # Concurrent upstream calls per process
+    JOB_MAX_PENDING = int(os.getenv('JOB_MAX_PENDING', 100))  # Jobs a process accepts before returning 503
+    JOB_STALE_AFTER = int(os.getenv('JOB_STALE_AFTER', 600))  # Seconds before a running job is considered abandoned
+    JOB_RECOVERY_INTERVAL = int(os.getenv('JOB_RECOVERY_INTERVAL', 30))  # Seconds between requeues of jobs no worker holds in each wsgi.py worker (0 disables)
+
+    # Batch optimization limits
+    BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 50))  # Snippets accepted in one batch request
+    BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 8))  # Concurrent upstream calls per batch
+
+    # Token usage reports (GET /usage)
+    USAGE_DEFAULT_DAYS = int(os.getenv('USAGE_DEFAULT_DAYS', 30))  # Days reported when no from date is given
+    USAGE_MAX_DAYS = int(os.getenv('USAGE_MAX_DAYS', 366))  # Longest range a single report may cover
+
+    # History listing pagination
+    HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', 20))  # Default page size when paginating
+    HISTORY_MAX_PAGE_SIZE = int(os.getenv('HISTORY_MAX_PAGE_SIZE', 100))
+    HISTORY_PREVIEW_CHARS = int(os.getenv('HISTORY_PREVIEW_CHARS', 120))  # Length of the code preview in summary listings
+    HISTORY_BULK_DELETE_MAX_IDS = int(os.getenv('HISTORY_BULK_DELETE_MAX_IDS', 1000))  # Ids accepted by one DELETE /history
+
+    # History export and import (GET /history/export, POST /history/import)
+    HISTORY_EXPORT_BATCH_SIZE = int(os.getenv('HISTORY_EXPORT_BATCH_SIZE', 500))  # Entries fetched from the database cursor at a time
+    HISTORY_IMPORT_BATCH_SIZE = int(os.getenv('HISTORY_IMPORT_BATCH_SIZE', 500))  # Entries inserted per transaction
+    HISTORY_IMPORT_MAX_ROWS = int(os.getenv('HISTORY_IMPORT_MAX_ROWS', 100000))  # Entries accepted from one file
+    HISTORY_IMPORT_MAX_FIELD_CHARS = int(os.getenv('HISTORY_IMPORT_MAX_FIELD_CHARS', 16 * 1024 * 1024))  # Characters accepted in one CSV field
+
+    # History retention enforced for each user (0 disables a limit) by a background purge deleting in batches
+    HISTORY_MAX_ROWS = int(os.getenv('HISTORY_MAX_ROWS', 0))  # Newest entries kept per user
+    HISTORY_MAX_AGE_DAYS = int(os.getenv('HISTORY_MAX_AGE_DAYS', 0))  # Days an entry is kept
+    HISTORY_PURGE_INTERVAL = int(os.getenv('HISTORY_PURGE_INTERVAL', 0))  # Seconds between purges (0 disables; use 'flask purge-history' from cron instead)
+    HISTORY_PURGE_BATCH_SIZE = int(os.getenv('HISTORY_PURGE_BATCH_SIZE', 500))  # Entries deleted per transaction
+
+    # Compression of stored history bodies ('none', 'zlib' or 'zstd', which needs the zstandard package)
+    HISTORY_COMPRESSION = os.getenv('HISTORY_COMPRESSION', 'none')
+
+    # Request instrumentation: phase timings in Server-Timing headers and Prometheus metrics of each process at /metrics
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+    # Opt-in sampling profiler keeping collapsed stacks of the slowest requests at /metrics/profiles
+    PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'false').lower() == 'true'
+    PROFILER_INTERVAL = float(os.getenv('PROFILER_INTERVAL', 0.005))  # Seconds between stack samples
+    PROFILER_MIN_DURATION = float(os.getenv('PROFILER_MIN_DURATION', 0.5))  # Seconds a request must take to be kept
+    PROFILER_MAX_PROFILES = int(os.getenv('PROFILER_MAX_PROFILES', 20))  # Slowest requests kept per process
+    PROFILER_TOKEN = os.getenv('PROFILER_TOKEN', '')  # Bearer token required to read /metrics/profiles (unset refuses every request)
+
+    # Orphaned code blob sweeping (interval 0 disables the background sweeper; use 'flask sweep-blobs' from cron instead)
+    BLOB_SWEEP_INTERVAL = int(os.getenv('BLOB_SWEEP_INTERVAL', 0))  # Seconds between sweeps
+    BLOB_SWEEP_GRACE = int(os.getenv('BLOB_SWEEP_GRACE', 3600))  # Seconds an unreferenced blob is kept before deletion
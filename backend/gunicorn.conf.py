@@ -0,0 +1,20 @@
+# Gunicorn settings for 'gunicorn -c gunicorn.conf.py wsgi:app'
+import multiprocessing
+import os
+
+# Address to listen on
+bind = os.getenv('BIND', '0.0.0.0:5000')
+
+# Worker processes; each holds its own caches, rate limit buckets and in-flight cap
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+# Threaded workers, since requests mostly wait on the model API and streamed responses hold a thread
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', 8))
+
+# Must exceed UPSTREAM_DEADLINE so slow model calls are not killed mid-request
+timeout = int(os.getenv('WEB_TIMEOUT', 120))
+graceful_timeout = 30
+
+# Build the app in each worker rather than in the master, so no connections or threads are shared across fork
+preload_app = False
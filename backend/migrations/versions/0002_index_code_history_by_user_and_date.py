@@ -0,0 +1,33 @@
+"""index code history by user and date
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 11:51:58.488505
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Build the index outside a transaction so PostgreSQL can create it without blocking writes
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_code_history_user_id_created_at_id',
+            'code_history',
+            ['user_id', sa.literal_column('created_at DESC'), 'id'],
+            unique=False,
+            postgresql_concurrently=True
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_code_history_user_id_created_at_id', table_name='code_history', postgresql_concurrently=True)
@@ -0,0 +1,55 @@
+"""add deduplicated code blob store
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 11:56:37.355262
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+BODY_FIELDS = ('original_code', 'optimized_code', 'optimization_suggestions')
+
+
+def upgrade():
+    op.create_table('code_blobs',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('sha256')
+    )
+    with op.batch_alter_table('code_history', schema=None) as batch_op:
+        for name in BODY_FIELDS:
+            batch_op.add_column(sa.Column(f'{name}_sha', sa.String(length=64), nullable=True))
+            # Rows written from now on keep their bodies in code_blobs
+            batch_op.alter_column(name, existing_type=sa.TEXT(), nullable=True)
+            batch_op.create_index(batch_op.f(f'ix_code_history_{name}_sha'), [f'{name}_sha'], unique=False)
+            batch_op.create_foreign_key(f'fk_code_history_{name}_sha', 'code_blobs', [f'{name}_sha'], ['sha256'])
+
+
+def downgrade():
+    # Copy blob bodies back inline; both columns use the same stored encoding
+    for name in BODY_FIELDS:
+        op.execute(
+            f"UPDATE code_history SET {name} = "
+            f"(SELECT content FROM code_blobs WHERE code_blobs.sha256 = code_history.{name}_sha) "
+            f"WHERE {name}_sha IS NOT NULL"
+        )
+    with op.batch_alter_table('code_history', schema=None) as batch_op:
+        for name in BODY_FIELDS:
+            batch_op.drop_constraint(f'fk_code_history_{name}_sha', type_='foreignkey')
+            batch_op.drop_index(batch_op.f(f'ix_code_history_{name}_sha'))
+            batch_op.alter_column(name, existing_type=sa.TEXT(), nullable=False)
+            batch_op.drop_column(f'{name}_sha')
+
+    op.drop_table('code_blobs')
@@ -0,0 +1,116 @@
+"""store history bodies as binary
+
+Revision ID: 0015
+Revises: 0014
+Create Date: 2026-10-18 15:21:09.513402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import base64
+
+
+# revision identifiers, used by Alembic.
+revision = '0015'
+down_revision = '0014'
+branch_labels = None
+depends_on = None
+
+
+# Columns holding CompressedText values, keyed by table, with the primary key used to batch the rewrite
+COLUMNS = {
+    'code_blobs': ('sha256', ['content']),
+    'code_history': ('id', [
+        'original_code', 'optimized_code', 'optimization_suggestions',
+        'report_analysis', 'report_suggestions', 'report_changes', 'report_explanation',
+    ]),
+}
+NOT_NULL = {('code_blobs', 'content')}
+
+# Text prefixes of the previous encoding, and the header byte of the binary one for each
+CODEC_PREFIXES = {'zlib:': b'\x01', 'zstd:': b'\x02'}
+RAW_PREFIX = 'raw:'
+PLAIN_HEADER = b'\x00'
+
+BATCH_SIZE = 500
+
+
+def text_to_binary(value):
+    """Convert a value of the base64 text encoding to the binary one, without decompressing it"""
+    text = bytes(value).decode('utf-8')
+    for prefix, header in CODEC_PREFIXES.items():
+        if text.startswith(prefix):
+            return header + base64.b64decode(text[len(prefix):])
+    if text.startswith(RAW_PREFIX):
+        text = text[len(RAW_PREFIX):]
+    return PLAIN_HEADER + text.encode('utf-8')
+
+
+def binary_to_text(value):
+    """Convert a value of the binary encoding back to the base64 text one, as UTF-8 bytes"""
+    value = bytes(value)
+    header, payload = value[:1], value[1:]
+    for prefix, codec_header in CODEC_PREFIXES.items():
+        if header == codec_header:
+            return (prefix + base64.b64encode(payload).decode('ascii')).encode('utf-8')
+    text = payload.decode('utf-8')
+    if text.startswith((*CODEC_PREFIXES, RAW_PREFIX)):
+        text = RAW_PREFIX + text
+    return text.encode('utf-8')
+
+
+def rewrite(table_name, convert):
+    """Apply convert to every stored value of a table in primary key order, one batch per statement"""
+    pk_name, names = COLUMNS[table_name]
+    table = sa.table(table_name, sa.column(pk_name), *[sa.column(name, sa.LargeBinary) for name in names])
+    pk = table.c[pk_name]
+    statement = table.update().where(pk == sa.bindparam('row_id')).values({name: sa.bindparam(name) for name in names})
+    connection = op.get_bind()
+    last_key = None
+    while True:
+        query = sa.select(pk, *[table.c[name] for name in names]).order_by(pk).limit(BATCH_SIZE)
+        if last_key is not None:
+            query = query.where(pk > last_key)
+        rows = connection.execute(query).all()
+        if not rows:
+            return
+        updates = []
+        for row in rows:
+            # SQLite keeps a value's storage class across the type change, so text may still come back as str
+            params = {
+                name: None if value is None else convert(value.encode('utf-8') if isinstance(value, str) else value)
+                for name, value in zip(names, row[1:])
+            }
+            params['row_id'] = row[0]
+            updates.append(params)
+        connection.execute(statement, updates)
+        last_key = rows[-1][0]
+
+
+def upgrade():
+    # Keep the zlib and zstd output as raw bytes instead of base64, which made it a third larger
+    for table_name, (_, names) in COLUMNS.items():
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            for name in names:
+                batch_op.alter_column(
+                    name,
+                    existing_type=sa.Text(),
+                    type_=sa.LargeBinary(),
+                    existing_nullable=(table_name, name) not in NOT_NULL,
+                    postgresql_using=f"convert_to({name}, 'UTF8')"
+                )
+        rewrite(table_name, text_to_binary)
+
+
+def downgrade():
+    for table_name, (_, names) in COLUMNS.items():
+        rewrite(table_name, binary_to_text)
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            for name in names:
+                batch_op.alter_column(
+                    name,
+                    existing_type=sa.LargeBinary(),
+                    type_=sa.Text(),
+                    existing_nullable=(table_name, name) not in NOT_NULL,
+                    postgresql_using=f"convert_from({name}, 'UTF8')"
+                )
@@ -4,13 +4,14 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 import pytest
 from user.models import User, db
-from app import app
+from app import create_app
 import json
 
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
 @pytest.fixture
 def client():
     app.config['TESTING'] = True
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
     app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'  # Match the default value from app.py
     with app.test_client() as client:
         with app.app_context():
@@ -1,13 +1,14 @@
 import pytest
-from user.models import User, CodeHistory, db, bcrypt
-from app import app
+from user.models import User, CodeHistory, db
+from app import create_app
 import json
 from datetime import timedelta
 
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
 @pytest.fixture
 def client():
     app.config['TESTING'] = True
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
     app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
     app.config['JWT_TOKEN_LOCATION'] = ['headers']
@@ -15,8 +16,6 @@ def client():
     app.config['JWT_HEADER_TYPE'] = 'Bearer'
     with app.test_client() as client:
         with app.app_context():
-            # Initialize bcrypt with the app
-            bcrypt.init_app(app)
             # Create all database tables
             db.create_all()
             yield client
@@ -3,7 +3,14 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import pytest
-from app import app
+from sqlalchemy import inspect, text
+from user.models import db
+from app import create_app
+import subprocess
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 
 @pytest.fixture
 def client():
@@ -14,3 +21,47 @@ def test_health_endpoint(client):
     res = client.get("/")
     assert res.status_code in [200, 404]
 
+
+def test_factory_does_not_touch_the_database():
+    # The database directory does not exist, so any connection attempt would fail
+    test_app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:////nonexistent/dir/app.db', 'TESTING': True})
+    assert test_app.test_client().get('/').status_code == 200
+
+def test_factory_keeps_heavy_modules_unloaded():
+    code = "import sys, app; app.create_app(); print('openai' in sys.modules, 'sqlalchemy_utils' in sys.modules)"
+    env = dict(os.environ, DATABASE_URL='sqlite:///:memory:', OPENAI_API_KEY='x')
+    result = subprocess.run([sys.executable, '-c', code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ['False', 'False']
+
+def test_check_db_reports_pending_migrations(tmp_path):
+    test_app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "app.db"}'})
+    runner = test_app.test_cli_runner()
+    with test_app.app_context():
+        db.session.execute(text('CREATE TABLE placeholder (id INTEGER)'))  # Creates the database file
+        db.session.commit()
+    result = runner.invoke(args=['check-db'])
+    assert result.exit_code == 1
+    assert 'db upgrade' in result.output
+
+    assert runner.invoke(args=['init-db']).exit_code == 0
+    result = runner.invoke(args=['check-db'])
+    assert result.exit_code == 0
+    assert 'up to date' in result.output
+
+def test_init_db_upgrades_a_database_from_before_migrations(tmp_path):
+    test_app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "app.db"}'})
+    with test_app.app_context():
+        # The schema setup_database() used to create
+        db.session.execute(text('CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, '
+                                'password VARCHAR(255) NOT NULL, created_at DATETIME)'))
+        db.session.execute(text('CREATE TABLE code_history (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id), '
+                                'original_code TEXT NOT NULL, optimized_code TEXT NOT NULL, optimization_suggestions TEXT NOT NULL, '
+                                'language VARCHAR(50) NOT NULL, created_at DATETIME)'))
+        db.session.commit()
+
+    result = test_app.test_cli_runner().invoke(args=['init-db'])
+    assert result.exit_code == 0, result.output
+    assert 'stamped at revision 0001' in result.output
+    with test_app.app_context():
+        tables = inspect(db.engine).get_table_names()
+    assert {'cached_results', 'optimization_jobs', 'code_blobs', 'history_search'} <= set(tables)
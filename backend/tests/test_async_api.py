@@ -0,0 +1,163 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from types import SimpleNamespace
+from user.models import db
+from app import create_app
+from api.async_api import async_database_url, create_asgi_app
+from api.upstream import AsyncUpstreamClient
+from bench.fake_openai import AsyncStubClient
+from datetime import timedelta
+from flask_jwt_extended import create_access_token, create_refresh_token
+import asyncio
+import httpx
+import json
+import time
+
+class FakeCompletions:
+    """Async completions that sleep like a slow model and track overlapping calls"""
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+
+    async def create(self, **kwargs):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            code = kwargs['messages'][1]['content'].split(':\n\n', 1)[1]
+            message = SimpleNamespace(content=f"```python\n{code.upper()}\n```")
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        finally:
+            self.active -= 1
+
+@pytest.fixture
+def apps(tmp_path):
+    config = {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "async.db"}',
+        'JWT_SECRET_KEY': 'dev-jwt-secret',
+        'RATE_LIMIT_ENABLED': False,
+    }
+    flask_app = create_app(config)
+    with flask_app.app_context():
+        db.create_all()
+    asgi_app = create_asgi_app(config)
+    yield flask_app, asgi_app
+    with flask_app.app_context():
+        db.drop_all()
+
+def use_completions(asgi_app, completions):
+    asgi_app.state.upstream = AsyncUpstreamClient(AsyncStubClient(completions), max_retries=0)
+
+def get_token(flask_app, username='user1'):
+    client = flask_app.test_client()
+    client.post('/register', json={'username': username, 'password': 'testpass'})
+    res = client.post('/login', json={'username': username, 'password': 'testpass'})
+    return json.loads(res.data)['access_token']
+
+def request(asgi_app, method, url, **kwargs):
+    async def send():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi_app), base_url='http://test') as client:
+            return await client.request(method, url, **kwargs)
+    return asyncio.run(send())
+
+def test_async_database_url():
+    assert async_database_url('sqlite:///x.db').drivername == 'sqlite+aiosqlite'
+    assert async_database_url('postgresql://u:p@h/db').drivername == 'postgresql+asyncpg'
+    assert async_database_url('postgresql+asyncpg://u:p@h/db').drivername == 'postgresql+asyncpg'
+
+def test_optimize_and_read_back_with_flask_tokens(apps):
+    flask_app, asgi_app = apps
+    use_completions(asgi_app, FakeCompletions())
+    headers = {'Authorization': f'Bearer {get_token(flask_app)}'}
+
+    response = request(asgi_app, 'POST', '/optimize', headers=headers, json={'code': 'x = 1', 'language': 'python'})
+    assert response.status_code == 200
+    data = response.json()
+    assert data['optimized_code'] == 'X = 1'
+    assert data['cached'] is False
+
+    response = request(asgi_app, 'POST', '/optimize', headers=headers, json={'code': 'x = 1', 'language': 'python'})
+    assert response.json()['cached'] is True
+
+    history = request(asgi_app, 'GET', '/history', headers=headers).json()
+    assert [entry['original_code'] for entry in history] == ['x = 1', 'x = 1']
+
+    entry = request(asgi_app, 'GET', f'/history/{data["id"]}', headers=headers).json()
+    assert entry['optimized_code'] == 'X = 1'
+
+    # The WSGI app sees the same rows
+    response = flask_app.test_client().get(f'/history/{data["id"]}', headers=headers)
+    assert json.loads(response.data)['optimization_suggestions'] == data['suggestions']
+
+def test_history_pagination(apps):
+    flask_app, asgi_app = apps
+    use_completions(asgi_app, FakeCompletions())
+    headers = {'Authorization': f'Bearer {get_token(flask_app)}'}
+    for i in range(3):
+        request(asgi_app, 'POST', '/optimize', headers=headers, json={'code': f'x = {i}', 'language': 'python'})
+
+    page = request(asgi_app, 'GET', '/history?limit=2', headers=headers).json()
+    assert [item['preview'] for item in page['items']] == ['x = 2', 'x = 1']
+    page = request(asgi_app, 'GET', f'/history?limit=2&cursor={page["next_cursor"]}', headers=headers).json()
+    assert [item['preview'] for item in page['items']] == ['x = 0']
+    assert page['next_cursor'] is None
+
+    assert request(asgi_app, 'GET', '/history?cursor=bogus', headers=headers).status_code == 400
+
+def test_history_is_private(apps):
+    flask_app, asgi_app = apps
+    use_completions(asgi_app, FakeCompletions())
+    owner = {'Authorization': f'Bearer {get_token(flask_app, "user1")}'}
+    other = {'Authorization': f'Bearer {get_token(flask_app, "user2")}'}
+    history_id = request(asgi_app, 'POST', '/optimize', headers=owner, json={'code': 'x = 1', 'language': 'python'}).json()['id']
+    assert request(asgi_app, 'GET', f'/history/{history_id}', headers=other).status_code == 404
+
+def test_rejects_missing_expired_and_refresh_tokens(apps):
+    flask_app, asgi_app = apps
+    get_token(flask_app)
+    assert request(asgi_app, 'GET', '/history').status_code == 401
+    assert request(asgi_app, 'GET', '/history', headers={'Authorization': 'Bearer nonsense'}).status_code == 401
+    with flask_app.app_context():
+        expired = create_access_token(identity='1', expires_delta=timedelta(seconds=-1))
+        refresh = create_refresh_token(identity='1')
+    response = request(asgi_app, 'GET', '/history', headers={'Authorization': f'Bearer {expired}'})
+    assert response.status_code == 401
+    assert response.json()['error'] == 'token_expired'
+    assert request(asgi_app, 'GET', '/history', headers={'Authorization': f'Bearer {refresh}'}).status_code == 401
+
+def test_serves_many_pending_optimizations_concurrently(apps):
+    flask_app, asgi_app = apps
+    completions = FakeCompletions(delay=0.5)
+    use_completions(asgi_app, completions)
+    headers = {'Authorization': f'Bearer {get_token(flask_app)}'}
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi_app), base_url='http://test') as client:
+            return await asyncio.gather(*[
+                client.post('/optimize', headers=headers, json={'code': f'x = {i}', 'language': 'python'})
+                for i in range(200)
+            ])
+
+    start = time.monotonic()
+    responses = asyncio.run(run())
+    elapsed = time.monotonic() - start
+    assert all(response.status_code == 200 for response in responses)
+    assert completions.peak == 200
+    assert elapsed < 5
+
+def test_large_file_is_optimized_in_concurrent_parts(apps):
+    flask_app, asgi_app = apps
+    completions = FakeCompletions(delay=0.05)
+    use_completions(asgi_app, completions)
+    asgi_app.state.flask_app.config.update(CHUNK_THRESHOLD_TOKENS=200, CHUNK_MAX_TOKENS=60)
+    headers = {'Authorization': f'Bearer {get_token(flask_app)}'}
+    source = ''.join(f'def function_{i}(value):\n    return value * {i}\n\n' for i in range(40))
+
+    data = request(asgi_app, 'POST', '/optimize', headers=headers, json={'code': source, 'language': 'python'}).json()
+    assert data['chunks'] > 1 and completions.peak > 1
+    assert data['optimized_code'].replace('\n\n', '') == source.upper().replace('\n\n', '')
@@ -0,0 +1,117 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from types import SimpleNamespace
+from user.models import CodeHistory, db
+from app import create_app
+from api.upstream import UpstreamClient
+from bench.fake_openai import StubClient
+import json
+import threading
+import time
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+class FakeCompletions:
+    """Echoes the submitted code back and tracks how many calls overlap"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.calls = 0
+
+    def create(self, **kwargs):
+        with self.lock:
+            self.calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            code = kwargs['messages'][1]['content'].split('\n\n', 1)[1]
+            if 'boom' in code:
+                raise RuntimeError('upstream error')
+            time.sleep(0.05)
+            message = SimpleNamespace(content=f"```python\n{code.upper()}\n```")
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        finally:
+            with self.lock:
+                self.active -= 1
+
+@pytest.fixture
+def fake_completions(monkeypatch):
+    completions = FakeCompletions()
+    monkeypatch.setitem(app.extensions, 'upstream', UpstreamClient(StubClient(completions), max_retries=0))
+    return completions
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            app.extensions.pop('result_cache', None)
+            app.extensions.pop('rate_limiter', None)
+            yield client
+            app.extensions.pop('result_cache', None)
+            app.extensions.pop('rate_limiter', None)
+            db.session.remove()
+            db.drop_all()
+
+def get_token(client):
+    client.post("/register", json={"username": "user1", "password": "testpass"})
+    res = client.post("/login", json={"username": "user1", "password": "testpass"})
+    return json.loads(res.data)["access_token"]
+
+def test_batch_returns_results_in_input_order(client, fake_completions):
+    token = get_token(client)
+    items = [{'code': f'x{i} = {i}', 'language': 'python'} for i in range(6)]
+    items.insert(2, {'code': 'boom', 'language': 'python'})
+    items.append({'language': 'python'})
+    items.append({'code': 'x0 = 0', 'language': 'python'})
+
+    response = client.post('/optimize/batch',
+        headers={'Authorization': f'Bearer {token}'}, json={'items': items})
+    assert response.status_code == 200
+    results = json.loads(response.data)['results']
+    assert len(results) == len(items)
+    assert results[0]['optimized_code'] == 'X0 = 0'
+    assert results[2] == {'error': 'upstream error'}
+    assert results[3]['optimized_code'] == 'X2 = 2'
+    assert results[7] == {'error': 'Missing code or language'}
+    # Identical snippets in one batch share a single upstream call
+    assert results[8]['optimized_code'] == 'X0 = 0'
+    assert fake_completions.calls == 7
+    assert CodeHistory.query.count() == 7
+    assert {r['id'] for r in results if 'id' in r} == {h.id for h in CodeHistory.query.all()}
+
+def test_batch_respects_concurrency_limit(client, fake_completions):
+    app.config['BATCH_CONCURRENCY'] = 2
+    try:
+        token = get_token(client)
+        items = [{'code': f'y{i} = {i}', 'language': 'python'} for i in range(6)]
+        client.post('/optimize/batch', headers={'Authorization': f'Bearer {token}'}, json={'items': items})
+    finally:
+        app.config['BATCH_CONCURRENCY'] = 8
+    assert fake_completions.peak <= 2
+
+def test_batch_rejects_oversized_requests(client):
+    token = get_token(client)
+    items = [{'code': 'x = 1', 'language': 'python'}] * (app.config['BATCH_MAX_ITEMS'] + 1)
+    response = client.post('/optimize/batch', headers={'Authorization': f'Bearer {token}'}, json={'items': items})
+    assert response.status_code == 400
+
+def test_non_string_code_or_language_is_rejected(client, fake_completions):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    for body in ({'code': 5, 'language': 'python'}, {'code': 'x = 1', 'language': ['python']}, {'code': '', 'language': 'python'}):
+        for path in ('/optimize', '/optimize/stream', '/optimize/jobs', '/optimize/similar'):
+            response = client.post(path, headers=headers, json=body)
+            assert response.status_code == 400, path
+            assert json.loads(response.data) == {'message': 'code and language must be non-empty strings'}
+
+    items = [{'code': 5, 'language': 'python'}, {'code': 'x0 = 0', 'language': 'python'}]
+    results = json.loads(client.post('/optimize/batch', headers=headers, json={'items': items}).data)['results']
+    assert results[0] == {'error': 'code and language must be non-empty strings'}
+    assert results[1]['optimized_code'] == 'X0 = 0'
+    assert fake_completions.calls == 1
@@ -0,0 +1,92 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from user.models import User, CodeBlob, CodeHistory, db
+from user.blobs import blob_hash
+from app import create_app
+import json
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield client
+            app.config['BLOB_SWEEP_GRACE'] = 3600
+            db.session.remove()
+            db.drop_all()
+
+def get_token(client):
+    client.post("/register", json={"username": "user1", "password": "testpass"})
+    res = client.post("/login", json={"username": "user1", "password": "testpass"})
+    return json.loads(res.data)["access_token"]
+
+def add_history(user_id, code, optimized='optimized'):
+    history = CodeHistory(user_id=user_id, language='python', original_code=code,
+                          optimized_code=optimized, optimization_suggestions='suggestions')
+    history.save()
+    return history
+
+def test_identical_bodies_share_one_blob(client):
+    get_token(client)
+    user = User.find_by_username('user1')
+    first = add_history(user.id, 'print(1)')
+    second = add_history(user.id, 'print(1)', optimized='print(1)')
+
+    blob = db.session.get(CodeBlob, blob_hash('print(1)'))
+    assert blob.ref_count == 3
+    assert first.original_code_sha == second.original_code_sha == second.optimized_code_sha
+    assert db.session.get(CodeHistory, second.id).original_code == 'print(1)'
+    assert CodeBlob.query.count() == 3
+
+def test_delete_releases_references_and_sweeper_removes_orphans(client):
+    token = get_token(client)
+    user = User.find_by_username('user1')
+    keep = add_history(user.id, 'shared')
+    drop = add_history(user.id, 'shared', optimized='only here')
+
+    response = client.delete(f'/history/{drop.id}', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    assert db.session.get(CodeBlob, blob_hash('shared')).ref_count == 1
+    assert db.session.get(CodeBlob, blob_hash('only here')).ref_count == 0
+
+    # Orphans survive until the grace period has passed
+    assert 'Removed 0' in app.test_cli_runner().invoke(args=['sweep-blobs']).output
+    app.config['BLOB_SWEEP_GRACE'] = -1
+    assert 'Removed 1' in app.test_cli_runner().invoke(args=['sweep-blobs']).output
+    db.session.expire_all()
+    assert db.session.get(CodeBlob, blob_hash('only here')) is None
+    assert db.session.get(CodeHistory, keep.id).optimized_code == 'optimized'
+
+def test_inline_rows_are_moved_into_blobs(client):
+    get_token(client)
+    user = User.find_by_username('user1')
+    # Simulate a row written before the blob store existed
+    db.session.execute(CodeHistory.__table__.insert().values(
+        user_id=user.id, language='python', original_code='legacy',
+        optimized_code='legacy optimized', optimization_suggestions='legacy suggestions'
+    ))
+    db.session.commit()
+    history = CodeHistory.query.first()
+    assert history.original_code == 'legacy'
+    assert history.original_code_sha is None
+
+    result = app.test_cli_runner().invoke(args=['dedup-history'])
+    assert 'Moved 1 history rows' in result.output
+    db.session.expire_all()
+    history = CodeHistory.query.first()
+    assert history.original_code_sha == blob_hash('legacy')
+    assert history._original_code is None
+    assert history.optimization_suggestions == 'legacy suggestions'
+
+def test_saved_bodies_are_immutable(client):
+    get_token(client)
+    history = add_history(User.find_by_username('user1').id, 'x = 1')
+    with pytest.raises(AttributeError):
+        history.original_code = 'x = 2'
@@ -0,0 +1,151 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from types import SimpleNamespace
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from user.models import CachedResult, CodeHistory, db
+from app import create_app
+from api.upstream import UpstreamClient
+from bench.fake_openai import StubClient
+from api.cache import MemoryCache, ResultCache, SQLCache, normalize_code, make_cache_key
+import json
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+RESPONSE = "1. Code Analysis\n\n4. Optimised Code\n```python\ndef add(a, b):\n    return a + b\n```\n"
+
+class FakeCompletions:
+    """Stand-in for the OpenAI chat completions API that counts calls"""
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        message = SimpleNamespace(content=RESPONSE)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+@pytest.fixture
+def fake_completions(monkeypatch):
+    completions = FakeCompletions()
+    monkeypatch.setitem(app.extensions, 'upstream', UpstreamClient(StubClient(completions), max_retries=0))
+    return completions
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            app.extensions.pop('result_cache', None)
+            app.extensions.pop('rate_limiter', None)
+            yield client
+            app.extensions.pop('result_cache', None)
+            app.extensions.pop('rate_limiter', None)
+            db.session.remove()
+            db.drop_all()
+
+def get_token(client):
+    client.post("/register", json={"username": "user1", "password": "testpass"})
+    res = client.post("/login", json={"username": "user1", "password": "testpass"})
+    return json.loads(res.data)["access_token"]
+
+def test_normalize_ignores_comments_and_whitespace():
+    a = "def add(a, b):  # sum\n\n    return a  +  b\n"
+    b = "def add(a, b):\n    return a + b"
+    assert normalize_code(a, 'python') == normalize_code(b, 'python')
+    assert normalize_code("s = '# not a comment'", 'python') == "s = '# not a comment'"
+    assert normalize_code("int x = 1; /* note */\n// done", 'cpp') == "int x = 1;"
+
+def test_normalize_keeps_python_indentation():
+    nested = "if x:\n    a()\n    b()"
+    dedented = "if x:\n    a()\nb()"
+    assert normalize_code(nested, 'python') != normalize_code(dedented, 'python')
+
+def test_normalize_keeps_string_literals_verbatim():
+    assert make_cache_key('print("a  b")', 'python', 'm', 'p') != make_cache_key('print("a b")', 'python', 'm', 'p')
+    assert make_cache_key('s = """a\n\nb"""', 'python', 'm', 'p') != make_cache_key('s = """a\nb"""', 'python', 'm', 'p')
+    assert make_cache_key("f('x  ')", 'javascript', 'm', 'p') != make_cache_key("f('x ')", 'javascript', 'm', 'p')
+    assert make_cache_key('f(`a\n\n  b`)', 'javascript', 'm', 'p') != make_cache_key('f(`a\n  b`)', 'javascript', 'm', 'p')
+    assert normalize_code('x = f(  "a  b" ,\n\n  1)  # c', 'python') == 'x = f( "a  b" ,\n  1)'
+
+def test_cache_key_depends_on_model_and_prompt():
+    key = make_cache_key("x = 1", "python", "gpt-4.1", "prompt")
+    assert key == make_cache_key("x = 1  # one", "python", "gpt-4.1", "prompt")
+    assert key != make_cache_key("x = 1", "python", "gpt-4.1-mini", "prompt")
+    assert key != make_cache_key("x = 1", "python", "gpt-4.1", "other prompt")
+    assert key != make_cache_key("x = 1", "javascript", "gpt-4.1", "prompt")
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(ttl=60, max_entries=2)
+    cache.set('a', {'v': 1})
+    cache.set('b', {'v': 2})
+    cache.get('a')
+    cache.set('c', {'v': 3})
+    assert cache.get('a') == {'v': 1}
+    assert cache.get('b') is None
+    assert cache.get('c') == {'v': 3}
+
+def test_memory_cache_expires_and_respects_size():
+    cache = MemoryCache(ttl=-1)
+    cache.set('a', {'v': 1})
+    assert cache.get('a') is None
+    cache = MemoryCache(ttl=60, max_bytes=20)
+    cache.set('a', {'v': 'x' * 100})
+    assert cache.get('a') is None
+
+def test_sql_cache_round_trip(client):
+    cache = SQLCache(ttl=60, max_entries=1, trim_every=1)
+    cache.set('a', {'v': 1})
+    assert cache.get('a') == {'v': 1}
+    cache.set('b', {'v': 2})
+    assert cache.get('a') is None
+    assert cache.get('b') == {'v': 2}
+
+def test_sql_cache_upserts_and_trims_periodically(client):
+    cache = SQLCache(ttl=60, max_entries=1, trim_every=3)
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        cache.set('a', {'v': 1})
+        cache.set('a', {'v': 2})  # A second writer of the same key replaces the entry instead of failing
+        assert not any('count(' in statement.lower() for statement in statements)
+        assert cache.get('a') == {'v': 2}
+        cache.set('b', {'v': 3})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert sum('count(' in statement.lower() for statement in statements) == 1
+    assert [entry.key for entry in CachedResult.query] == ['b']
+
+def test_failed_cache_write_does_not_fail_the_request(client, fake_completions, monkeypatch):
+    app.extensions['result_cache'] = ResultCache(SQLCache())
+    def broken_set(key, value):
+        raise OperationalError('INSERT', {}, Exception('database is locked'))
+    monkeypatch.setattr(app.extensions['result_cache'].backend, 'set', broken_set)
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    response = client.post('/optimize', json={'code': 'def add(a, b):\n    return a + b', 'language': 'python'}, headers=headers)
+    assert response.status_code == 200
+    assert json.loads(response.data)['cached'] is False
+
+def test_resubmission_is_served_from_cache(client, fake_completions):
+    token = get_token(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    first = client.post('/optimize', headers=headers,
+        json={'code': 'def add(a, b):\n    return a + b', 'language': 'python'})
+    second = client.post('/optimize', headers=headers,
+        json={'code': 'def add(a, b):  # add\n    return a  +  b', 'language': 'python'})
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert json.loads(first.data)['cached'] is False
+    assert json.loads(second.data)['cached'] is True
+    assert fake_completions.calls == 1
+    # A cache hit still records history
+    assert CodeHistory.query.count() == 2
+
+    stats = json.loads(client.get('/optimize/cache/stats', headers=headers).data)
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
@@ -0,0 +1,242 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from types import SimpleNamespace
+from user.models import CodeHistory, OptimizationUsage, db
+from app import create_app
+from api.chunking import merge_parts, split_sections, split_source
+from api.ratelimit import estimate_tokens
+from api.upstream import UpstreamClient
+from bench.fake_openai import StubClient
+import json
+import threading
+import time
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+PYTHON_SOURCE = '''import os
+
+# Adds numbers
+@cache
+def add(a, b):
+    return a + b
+
+class Shape:
+    """A shape"""
+
+    def area(self):
+        return 0
+
+    def perimeter(self):
+        return 0
+
+def main():
+    print(add(1, 2))
+'''
+
+JAVA_SOURCE = '''import java.util.List;
+
+public class Totals {
+    private int total = 0;
+
+    // Adds a value, even "}" ones
+    public void add(int value) {
+        total += value;
+    }
+
+    @Override
+    public String toString() {
+        if (total > 0) {
+            return "positive";
+        }
+        else {
+            return "zero";
+        }
+    }
+}
+'''
+
+JS_SOURCE = '''const limit = 10;
+
+function format(value) {
+  return `${value}}`;
+}
+
+class Counter {
+  increment() {
+    this.count += 1;
+  }
+}
+'''
+
+CPP_SOURCE = '''#include <vector>
+
+namespace util {
+int twice(int x) {
+    return 2 * x; /* { */
+}
+
+struct Point {
+    int x;
+    int y;
+};
+}
+
+int main() {
+    return util::twice(1);
+}
+'''
+
+def make_file(functions):
+    return ''.join(f'def function_{i}(value):\n    total = value * {i}\n    return total + {i}\n\n' for i in range(functions))
+
+class FakeCompletions:
+    """Upper-cases the submitted code and reports each part under numbered sections"""
+    def __init__(self, delay=0.05, fail_on=None):
+        self.delay = delay
+        self.fail_on = fail_on
+        self.lock = threading.Lock()
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+
+    def create(self, **kwargs):
+        code = kwargs['messages'][1]['content'].split(':\n\n', 1)[1]
+        with self.lock:
+            self.calls.append(code)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(self.delay)
+            if self.fail_on and self.fail_on in code:
+                raise RuntimeError('upstream error')
+            content = f"1. Code Analysis\nLooked at {len(code)} chars\n\n4. Optimised Code\n```python\n{code.upper()}\n```\n\n5. Detailed Explanation\nDone\n"
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+        finally:
+            with self.lock:
+                self.active -= 1
+
+@pytest.fixture
+def fake_completions(monkeypatch):
+    completions = FakeCompletions()
+    monkeypatch.setitem(app.extensions, 'upstream', UpstreamClient(StubClient(completions), max_retries=0))
+    return completions
+
+@pytest.fixture
+def client(monkeypatch):
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
+    monkeypatch.setitem(app.config, 'CHUNK_THRESHOLD_TOKENS', 200)
+    monkeypatch.setitem(app.config, 'CHUNK_MAX_TOKENS', 60)
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            for name in ('result_cache', 'rate_limiter', 'model_router'):
+                app.extensions.pop(name, None)
+            yield client
+            for name in ('result_cache', 'rate_limiter', 'model_router'):
+                app.extensions.pop(name, None)
+            db.session.remove()
+            db.drop_all()
+
+def get_token(client, username="user1"):
+    client.post("/register", json={"username": username, "password": "testpass"})
+    res = client.post("/login", json={"username": username, "password": "testpass"})
+    return json.loads(res.data)["access_token"]
+
+@pytest.mark.parametrize('language, source', [
+    ('python', PYTHON_SOURCE), ('java', JAVA_SOURCE), ('javascript', JS_SOURCE), ('cpp', CPP_SOURCE)
+])
+def test_chunks_join_back_to_the_source(language, source):
+    for max_tokens in (1, 10, 40, 10000):
+        chunks = split_source(source, language, max_tokens, estimate_tokens)
+        assert ''.join(chunk.code for chunk in chunks) == source
+        assert chunks[0].first_line == 1 and chunks[-1].last_line == source.count('\n')
+    assert len(split_source(source, language, 10000, estimate_tokens)) == 1
+
+def test_python_splits_at_definitions_keeping_decorators_and_comments():
+    chunks = [chunk.code for chunk in split_source(PYTHON_SOURCE, 'python', 1, estimate_tokens)]
+    assert chunks[1].startswith('# Adds numbers\n@cache\ndef add')
+    assert chunks[2].startswith('class Shape:')
+    # An oversized class is split between its methods
+    assert chunks[3].startswith('    def area') and chunks[4].startswith('    def perimeter')
+    assert chunks[5].startswith('def main')
+
+def test_brace_languages_split_between_members_only():
+    java = [chunk.code for chunk in split_source(JAVA_SOURCE, 'java', 1, estimate_tokens)]
+    assert any(code.lstrip().startswith('// Adds a value') and code.rstrip().endswith('}') for code in java)
+    # The if/else stays together and the closing brace of the class joins the last method
+    assert any('if (total > 0)' in code and 'return "zero"' in code for code in java)
+    assert java[-1].rstrip().endswith('}\n}')
+    javascript = [chunk.code for chunk in split_source(JS_SOURCE, 'javascript', 1, estimate_tokens)]
+    assert javascript[1].strip().startswith('function format') and javascript[1].strip().endswith('}')
+
+def test_unsupported_or_invalid_code_is_one_chunk():
+    assert len(split_source('fn main() {}\nfn other() {}\n', 'rust', 1, estimate_tokens)) == 1
+    assert len(split_source('def broken(:\n', 'python', 1, estimate_tokens)) == 1
+
+def test_merge_parts_combines_sections_and_code():
+    chunks = split_source(make_file(2), 'python', 1, estimate_tokens)
+    results = [('A', '1. Code Analysis\nfirst\n\n4. Optimised Code\n```\nA\n```\n'), ('B', 'no structure here')]
+    optimized_code, report = merge_parts(chunks, results, 'python')
+    assert optimized_code == 'A\n\nB'
+    sections = split_sections(report)
+    assert '**Lines 1-4**\nfirst' in sections[1] and '**Lines 5-8**\nno structure here' in sections[1]
+    assert sections[4] == '```python\nA\n\nB\n```'
+
+def test_large_file_is_optimized_in_parallel_parts(client, fake_completions):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    source = make_file(12)
+    res = client.post('/optimize', json={'code': source, 'language': 'python'}, headers=headers)
+    assert res.status_code == 200
+    data = json.loads(res.data)
+    assert data['chunks'] == len(fake_completions.calls) > 1
+    assert fake_completions.peak > 1
+    assert data['optimized_code'].replace('\n\n', '') == source.upper().replace('\n\n', '')
+    assert CodeHistory.query.count() == 1
+    assert OptimizationUsage.query.filter_by(history_id=data['id']).count() == data['chunks']
+
+    # Resubmitting with one function changed only sends that part to the model
+    calls = len(fake_completions.calls)
+    changed = source.replace('value * 11', 'value * 99')
+    data = json.loads(client.post('/optimize', json={'code': changed, 'language': 'python'}, headers=headers).data)
+    assert len(fake_completions.calls) == calls + 1 and data['cached'] is False
+    data = json.loads(client.post('/optimize', json={'code': changed, 'language': 'python'}, headers=headers).data)
+    assert len(fake_completions.calls) == calls + 1 and data['cached'] is True
+
+def test_chunked_flag_overrides_threshold(client, fake_completions):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    data = json.loads(client.post('/optimize', json={'code': make_file(12), 'language': 'python', 'chunked': False}, headers=headers).data)
+    assert data['chunks'] == 1
+    data = json.loads(client.post('/optimize', json={'code': make_file(8), 'language': 'python', 'chunked': True}, headers=headers).data)
+    assert data['chunks'] > 1
+    assert client.post('/optimize', json={'code': 'x', 'language': 'python', 'chunked': 'yes'}, headers=headers).status_code == 400
+
+def test_too_many_parts_is_rejected(client, fake_completions, monkeypatch):
+    monkeypatch.setitem(app.config, 'CHUNK_MAX_PARTS', 2)
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    res = client.post('/optimize', json={'code': make_file(12), 'language': 'python'}, headers=headers)
+    assert res.status_code == 413
+    assert fake_completions.calls == []
+
+def test_failed_part_fails_request_but_keeps_other_parts_cached(client, fake_completions):
+    fake_completions.fail_on = 'function_5'
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    source = make_file(12)
+    assert client.post('/optimize', json={'code': source, 'language': 'python'}, headers=headers).status_code == 500
+    assert CodeHistory.query.count() == 0
+    parts = len(fake_completions.calls)
+
+    fake_completions.fail_on = None
+    assert client.post('/optimize', json={'code': source, 'language': 'python'}, headers=headers).status_code == 200
+    assert len(fake_completions.calls) == parts + 1
+
+def test_stream_sends_merged_report_for_large_files(client, fake_completions):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    res = client.post('/optimize/stream', json={'code': make_file(12), 'language': 'python'}, headers=headers)
+    body = res.get_data(as_text=True)
+    assert 'event: delta' in body and 'event: done' in body
+    assert CodeHistory.query.count() == 1
+    assert len(fake_completions.calls) > 1
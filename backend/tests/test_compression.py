@@ -0,0 +1,87 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import zlib
+from sqlalchemy import LargeBinary, select, type_coerce
+from user.models import User, CodeBlob, CodeHistory, db
+from user.compression import compress_text, decompress_text, MIN_COMPRESS_LENGTH, PLAIN_HEADER, ZLIB_HEADER
+from app import create_app
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+CODE = "def add(a, b):\n    return a + b\n" * 40
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield client
+            app.config['HISTORY_COMPRESSION'] = 'none'
+            db.session.remove()
+            db.drop_all()
+
+def stored_original_code(history_id):
+    """Return the stored (possibly compressed) representation of a history entry's original code"""
+    history, blobs = CodeHistory.__table__, CodeBlob.__table__
+    column = type_coerce(blobs.c.content, LargeBinary)
+    query = select(column).join(history, history.c.original_code_sha == blobs.c.sha256).where(history.c.id == history_id)
+    return db.session.execute(query).scalar()
+
+def add_history():
+    user = User(username='user1')
+    user.set_password('testpass')
+    user.save()
+    history = CodeHistory(user_id=user.id, language='python', original_code=CODE,
+                          optimized_code=CODE, optimization_suggestions=CODE)
+    history.save()
+    return history.id
+
+def test_round_trip_and_escaping():
+    assert decompress_text(compress_text(CODE, 'zlib')) == CODE
+    assert len(compress_text(CODE, 'zlib')) < len(CODE) / 3
+    # Short values are not worth compressing
+    assert compress_text('x = 1', 'zlib') == PLAIN_HEADER + b'x = 1'
+    # Plain values that start with a header byte are still read back as text
+    tricky = ZLIB_HEADER.decode('ascii') + 'not compressed'
+    assert decompress_text(compress_text(tricky, 'none')) == tricky
+    assert len(CODE) >= MIN_COMPRESS_LENGTH
+
+def test_compressed_rows_read_back_transparently(client):
+    app.config['HISTORY_COMPRESSION'] = 'zlib'
+    history_id = add_history()
+    db.session.expire_all()
+
+    stored = stored_original_code(history_id)
+    assert stored.startswith(ZLIB_HEADER)
+    # The compressed bytes are stored as they are, with only the header byte added
+    assert len(stored) == len(zlib.compress(CODE.encode('utf-8'), 6)) + 1
+    history = db.session.get(CodeHistory, history_id)
+    assert history.original_code == CODE
+    assert history.preview == CODE[:app.config['HISTORY_PREVIEW_CHARS']]
+
+def test_bodies_are_loaded_only_when_read(client):
+    history_id = add_history()
+    db.session.expire_all()
+    history = db.session.get(CodeHistory, history_id)
+    assert 'optimization_suggestions_blob' not in history.__dict__
+    assert history.optimization_suggestions == CODE
+
+def test_backfill_compresses_existing_rows(client):
+    history_id = add_history()
+    assert stored_original_code(history_id) == PLAIN_HEADER + CODE.encode('utf-8')
+
+    app.config['HISTORY_COMPRESSION'] = 'zlib'
+    result = app.test_cli_runner().invoke(args=['compress-history', '--batch-size', '1'])
+    # All three bodies are identical, so they share a single blob
+    assert 'Re-encoded 1 code blobs' in result.output
+    assert stored_original_code(history_id).startswith(ZLIB_HEADER)
+
+    # Running again finds nothing left to do
+    result = app.test_cli_runner().invoke(args=['compress-history'])
+    assert 'Re-encoded 0 code blobs' in result.output
+    db.session.expire_all()
+    assert db.session.get(CodeHistory, history_id).optimized_code == CODE
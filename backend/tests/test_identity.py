@@ -0,0 +1,107 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from sqlalchemy import event
+from user.models import User, db
+from user.identity import UserCache, get_user_cache
+from app import create_app
+import json
+import time
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+def get_token(client, username="user1"):
+    client.post("/register", json={"username": username, "password": "testpass"})
+    res = client.post("/login", json={"username": username, "password": "testpass"})
+    return json.loads(res.data)["access_token"]
+
+class QueryCounter:
+    """Counts SELECT statements sent to the database"""
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            self.count += 1
+
+def test_profile_lookups_are_cached(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    assert client.get('/profile', headers=headers).status_code == 200
+    counter = QueryCounter()
+    event.listen(db.engine, 'before_cursor_execute', counter)
+    try:
+        for path in ('/profile', '/user', '/profile'):
+            response = client.get(path, headers=headers)
+            assert response.status_code == 200
+            assert json.loads(response.data)['username'] == 'user1'
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', counter)
+    assert counter.count == 0
+
+def test_user_changes_invalidate_the_cache(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    client.get('/profile', headers=headers)
+    user = User.find_by_username('user1')
+    user.username = 'renamed'
+    user.save()
+    assert json.loads(client.get('/profile', headers=headers).data)['username'] == 'renamed'
+
+    db.session.delete(user)
+    db.session.commit()
+    response = client.get('/profile', headers=headers)
+    assert response.status_code == 404
+    assert json.loads(response.data)['message'] == 'User not found'
+
+def test_unchanged_profile_returns_304(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    response = client.get('/profile', headers=headers)
+    etag = response.headers['ETag']
+    assert etag
+
+    response = client.get('/user', headers=dict(headers, **{'If-None-Match': etag}))
+    assert response.status_code == 304
+    assert response.data == b''
+
+    user = User.find_by_username('user1')
+    user.username = 'renamed'
+    user.save()
+    response = client.get('/profile', headers=dict(headers, **{'If-None-Match': etag}))
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+def test_cache_entries_expire():
+    cache = UserCache(ttl=0.01, max_entries=2)
+    cache.set(1, 'a')
+    assert cache.get(1) == 'a'
+    time.sleep(0.02)
+    assert cache.get(1) is None
+
+def test_cache_evicts_least_recently_used():
+    cache = UserCache(ttl=60, max_entries=2)
+    cache.set(1, 'a')
+    cache.set(2, 'b')
+    cache.get(1)
+    cache.set(3, 'c')
+    assert cache.get(2) is None
+    assert cache.get(1) == 'a'
+
+def test_recreating_tables_clears_the_cache(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    client.get('/profile', headers=headers)
+    assert get_user_cache().get(1) is not None
+    db.drop_all()
+    db.create_all()
+    assert get_user_cache().get(1) is None
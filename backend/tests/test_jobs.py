@@ -0,0 +1,154 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from types import SimpleNamespace
+from user.models import OptimizationJob, User, db
+from app import create_app
+from api.upstream import UpstreamClient
+from bench.fake_openai import StubClient
+from api.jobs import LocalJobBackend, QueueFull, get_job_backend, recover_jobs
+import json
+import threading
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+RESPONSE = "4. Optimised Code\n```python\ndef add(a, b):\n    return a + b\n```\n"
+
+class FakeCompletions:
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    def create(self, **kwargs):
+        if self.fail:
+            raise RuntimeError('upstream unavailable')
+        message = SimpleNamespace(content=RESPONSE)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+def use_completions(monkeypatch, completions):
+    monkeypatch.setitem(app.extensions, 'upstream', UpstreamClient(StubClient(completions), max_retries=0))
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
+    app.config['JOB_BACKEND'] = 'inline'
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            app.extensions.pop('result_cache', None)
+            app.extensions.pop('rate_limiter', None)
+            app.extensions.pop('job_backend', None)
+            yield client
+            app.extensions.pop('result_cache', None)
+            app.extensions.pop('rate_limiter', None)
+            app.extensions.pop('job_backend', None)
+            app.config['JOB_BACKEND'] = 'local'
+            db.session.remove()
+            db.drop_all()
+
+def get_token(client):
+    client.post("/register", json={"username": "user1", "password": "testpass"})
+    res = client.post("/login", json={"username": "user1", "password": "testpass"})
+    return json.loads(res.data)["access_token"]
+
+def test_job_runs_and_returns_result(client, monkeypatch):
+    use_completions(monkeypatch, FakeCompletions())
+    token = get_token(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    response = client.post('/optimize/jobs', headers=headers,
+        json={'code': 'def add(a,b): return a+b', 'language': 'python'})
+    assert response.status_code == 202
+    job_id = json.loads(response.data)['id']
+
+    response = client.get(f'/optimize/jobs/{job_id}', headers=headers)
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['status'] == 'succeeded'
+    assert data['result']['optimized_code'] == 'def add(a, b):\n    return a + b'
+
+def test_failed_job_reports_error(client, monkeypatch):
+    use_completions(monkeypatch, FakeCompletions(fail=True))
+    token = get_token(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    response = client.post('/optimize/jobs', headers=headers,
+        json={'code': 'x = 1', 'language': 'python'})
+    job_id = json.loads(response.data)['id']
+
+    data = json.loads(client.get(f'/optimize/jobs/{job_id}', headers=headers).data)
+    assert data['status'] == 'failed'
+    assert data['error'] == 'upstream unavailable'
+
+def test_job_is_private_to_its_owner(client, monkeypatch):
+    use_completions(monkeypatch, FakeCompletions())
+    token = get_token(client)
+    response = client.post('/optimize/jobs', headers={'Authorization': f'Bearer {token}'},
+        json={'code': 'x = 1', 'language': 'python'})
+    job_id = json.loads(response.data)['id']
+
+    client.post("/register", json={"username": "user2", "password": "testpass"})
+    res = client.post("/login", json={"username": "user2", "password": "testpass"})
+    other = json.loads(res.data)["access_token"]
+    response = client.get(f'/optimize/jobs/{job_id}', headers={'Authorization': f'Bearer {other}'})
+    assert response.status_code == 404
+
+def test_pending_jobs_are_recovered(client, monkeypatch):
+    use_completions(monkeypatch, FakeCompletions())
+    user = User(username='user1')
+    user.set_password('testpass')
+    user.save()
+    OptimizationJob(id='a' * 32, user_id=user.id, code='x = 1', language='python').save()
+
+    get_job_backend()
+    assert db.session.get(OptimizationJob, 'a' * 32).status == 'succeeded'
+
+def test_polling_resumes_a_job_queued_before_a_restart(client, monkeypatch):
+    use_completions(monkeypatch, FakeCompletions())
+    token = get_token(client)
+    user = User.find_by_username('user1')
+    OptimizationJob(id='b' * 32, user_id=user.id, code='x = 1', language='python').save()
+
+    # No job has been submitted in this process, so only the poll can resume it
+    response = client.get(f"/optimize/jobs/{'b' * 32}", headers={'Authorization': f'Bearer {token}'})
+    assert json.loads(response.data)['status'] == 'succeeded'
+
+class BoundedBackend:
+    """Job backend that holds submitted jobs until told they finished"""
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.pending = set()
+
+    def submit(self, job_id):
+        if len(self.pending) >= self.capacity:
+            raise QueueFull()
+        self.pending.add(job_id)
+
+def test_recovery_skips_held_jobs_and_retries_overflow(client):
+    user = User(username='user1')
+    user.set_password('testpass')
+    user.save()
+    for letter in 'cde':
+        OptimizationJob(id=letter * 32, user_id=user.id, code='x = 1', language='python').save()
+    backend = BoundedBackend(capacity=2)
+
+    assert recover_jobs(backend) == 2
+    assert recover_jobs(backend) == 0
+    # The held jobs finish and free their slots; the one that overflowed is submitted next time
+    OptimizationJob.query.filter(OptimizationJob.id.in_(backend.pending)).update({'status': 'succeeded'})
+    db.session.commit()
+    backend.pending.clear()
+    assert recover_jobs(backend) == 1
+    assert backend.pending == {'e' * 32}
+
+def test_local_backend_bounds_pending_jobs():
+    release = threading.Event()
+    backend = LocalJobBackend(app, max_workers=1, max_pending=1)
+    backend._run = lambda job_id: release.wait(5)
+    backend.submit('first')
+    with pytest.raises(QueueFull):
+        backend.submit('second')
+    assert backend.pending == {'first'}
+    release.set()
+    backend.executor.shutdown(wait=True)
+    assert backend.pending == set()
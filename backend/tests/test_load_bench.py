@@ -0,0 +1,56 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from types import SimpleNamespace
+from bench.fake_openai import FakeOpenAIServer
+from bench.load_bench import compare, percentile, run
+import json
+import time
+import urllib.error
+import urllib.request
+
+def post_completion(server, **payload):
+    request = urllib.request.Request(
+        server.base_url + '/chat/completions', data=json.dumps(payload).encode('utf-8'), headers={'Content-Type': 'application/json'}
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+def test_fake_server_injects_errors_and_paces_tokens():
+    with FakeOpenAIServer(error_rate=1.0, error_status=429, seed=1) as server:
+        assert post_completion(server)[0] == 429
+        assert server.errors == 1
+
+    with FakeOpenAIServer(content='one two three four', tokens_per_second=40) as server:
+        start = time.monotonic()
+        assert post_completion(server)[0] == 200
+        assert time.monotonic() - start >= 0.1
+        start = time.monotonic()
+        status, body = post_completion(server, stream=True)
+        assert status == 200 and body.count(b'data: ') == 5
+        assert time.monotonic() - start >= 0.1
+
+def test_load_run_reports_every_endpoint():
+    args = SimpleNamespace(
+        concurrency=2, iterations=2, page_size=20, latency=0.0, jitter=0.0, tokens_per_second=None,
+        error_rate=0.0, error_status=500, seed=1, database_url=None, bcrypt_rounds=4, rate_limit=False, target=None
+    )
+    result = run(args)
+    assert list(result['endpoints']) == ['register', 'login', 'optimize', 'history', 'delete']
+    optimize = result['endpoints']['optimize']
+    assert optimize['requests'] == 4 and optimize['errors'] == 0
+    assert optimize['p50'] <= optimize['p95'] <= optimize['p99']
+    assert optimize['queries'] > 0
+    assert result['upstream']['requests'] == 4
+    assert compare(result, result, 0.1) == []
+
+def test_compare_flags_regressions():
+    baseline = {'endpoints': {'history': {'p95': 10.0, 'throughput': 100.0, 'queries': 1.0}}}
+    current = {'endpoints': {'history': {'p95': 13.0, 'throughput': 70.0, 'queries': 3.0}, 'login': {}}}
+    regressions = compare(current, baseline, 0.2)
+    assert len(regressions) == 3 and all(regression.startswith('history') for regression in regressions)
+    assert percentile([3, 1, 2, 4], 0.5) == 2 and percentile([5], 0.99) == 5
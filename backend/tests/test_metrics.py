@@ -0,0 +1,130 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import time
+from types import SimpleNamespace
+from user.models import db
+from user.metrics import Histogram, MetricsRegistry
+from user.profiler import SamplingProfiler
+from app import create_app
+from api.upstream import UpstreamClient
+from bench.fake_openai import StubClient
+import json
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+RESPONSE = "1. Code Analysis\nok\n4. Optimised Code\n```python\nx = 1\n```\n"
+
+@pytest.fixture
+def client(monkeypatch):
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
+    message = SimpleNamespace(content=RESPONSE)
+    completions = SimpleNamespace(create=lambda **kwargs: SimpleNamespace(choices=[SimpleNamespace(message=message)]))
+    monkeypatch.setitem(app.extensions, 'metrics', MetricsRegistry())
+    upstream = UpstreamClient(StubClient(completions), max_retries=0, metrics=app.extensions['metrics'])
+    monkeypatch.setitem(app.extensions, 'upstream', upstream)
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            for name in ('result_cache', 'rate_limiter', 'model_router'):
+                app.extensions.pop(name, None)
+            yield client
+            for name in ('result_cache', 'rate_limiter', 'model_router'):
+                app.extensions.pop(name, None)
+            db.session.remove()
+            db.drop_all()
+
+def get_token(client, username="user1"):
+    client.post("/register", json={"username": username, "password": "testpass"})
+    res = client.post("/login", json={"username": username, "password": "testpass"})
+    return json.loads(res.data)["access_token"]
+
+def server_timing(response):
+    """Parse a Server-Timing header into {name: (milliseconds, description)}"""
+    entries = {}
+    for entry in response.headers['Server-Timing'].split(', '):
+        name, *params = entry.split(';')
+        params = dict(param.split('=', 1) for param in params)
+        entries[name] = (float(params['dur']), params.get('desc'))
+    return entries
+
+def test_optimize_reports_phases_in_server_timing(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    response = client.post('/optimize', json={'code': 'x=1', 'language': 'python'}, headers=headers)
+    assert response.status_code == 200
+    timing = server_timing(response)
+    assert {'auth', 'parse', 'upstream', 'extract', 'commit', 'db', 'total'} <= timing.keys()
+    assert timing['db'][1].endswith('queries"') and int(timing['db'][1].strip('"').split()[0]) > 0
+    assert all(milliseconds <= timing['total'][0] for milliseconds, _ in timing.values())
+
+    login = client.post('/login', json={'username': 'user1', 'password': 'testpass'})
+    assert {'parse', 'password', 'db', 'total'} <= server_timing(login).keys()
+
+def test_metrics_endpoint_exposes_request_sql_and_upstream_metrics(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    client.post('/optimize', json={'code': 'x=1', 'language': 'python'}, headers=headers)
+    client.get('/history?view=summary&limit=5', headers=headers)
+
+    response = client.get('/metrics')
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert 'http_requests_total{method="POST",route="/optimize",status="200"} 1' in text
+    assert 'http_request_phase_duration_seconds_count{route="/history",phase="serialize"} 1' in text
+    assert 'db_queries_per_request_count{route="/optimize"} 1' in text
+    assert 'upstream_request_duration_seconds_count{model="gpt-4.1-mini",outcome="ok"} 1' in text
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('latency_seconds', 'Latency', ['route'], buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value, ('/a"b',))
+    samples = {(name, labels[-1]): value for name, _, labels, value in histogram.samples()}
+    assert [samples[('latency_seconds_bucket', bound)] for bound in ('0.1', '1', '+Inf')] == [2, 3, 4]
+    assert samples[('latency_seconds_count', '/a"b')] == 4
+    assert samples[('latency_seconds_sum', '/a"b')] == pytest.approx(3.65)
+
+def test_profiler_keeps_stacks_of_slow_requests():
+    profiled = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'PROFILER_ENABLED': True,
+        'PROFILER_INTERVAL': 0.001,
+        'PROFILER_MIN_DURATION': 0.05,
+        'PROFILER_TOKEN': 'admin-secret',
+    })
+
+    def slow_view():
+        time.sleep(0.1)
+        return 'done'
+
+    profiled.add_url_rule('/slow', 'slow', slow_view)
+    client = profiled.test_client()
+    client.get('/slow')
+    client.get('/')
+
+    assert client.get('/metrics/profiles').status_code == 401
+    assert client.get('/metrics/profiles', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    headers = {'Authorization': 'Bearer admin-secret'}
+    profiles = json.loads(client.get('/metrics/profiles', headers=headers).data)['profiles']
+    assert [profile['request'] for profile in profiles] == ['GET /slow']
+    assert profiles[0]['samples'] > 10
+    folded = client.get('/metrics/profiles?format=folded', headers=headers).get_data(as_text=True)
+    assert all(line.startswith('GET /slow ') for line in folded.splitlines())
+    assert 'slow_view (test_metrics.py' in folded
+
+def test_profiler_sampler_sleeps_while_idle(monkeypatch):
+    profiler = SamplingProfiler(interval=0.001)
+    samples = []
+    current_frames = sys._current_frames
+    monkeypatch.setattr(sys, '_current_frames', lambda: samples.append(1) or current_frames())
+    profiler.start_request()
+    time.sleep(0.05)
+    profiler.finish_request(0.05, 'GET /slow', 200)
+    assert len(samples) > 5
+
+    time.sleep(0.01)  # Lets a sample already in progress finish
+    idle = len(samples)
+    time.sleep(0.1)
+    assert len(samples) == idle
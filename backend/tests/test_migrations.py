@@ -0,0 +1,73 @@
+import sys
+import os
+import base64
+import zlib
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from flask import Flask
+from flask_migrate import Migrate, downgrade, upgrade
+from sqlalchemy import inspect, text
+from user.models import CodeBlob, CodeHistory, db
+from user.search import include_search_index
+import app  # Registers every model on db.metadata
+
+MIGRATIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'migrations'))
+
+def make_app(path):
+    test_app = Flask(__name__)
+    test_app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(test_app)
+    Migrate(test_app, db, directory=MIGRATIONS_DIR)
+    return test_app
+
+def test_migrations_match_models(tmp_path):
+    test_app = make_app(tmp_path / 'migrations.db')
+    with test_app.app_context():
+        upgrade()
+        with db.engine.connect() as connection:
+            # The full-text index objects live outside the models, as in the app's Migrate configuration
+            diff = compare_metadata(MigrationContext.configure(connection, opts={'include_name': include_search_index}), db.metadata)
+        indexes = {index['name'] for index in inspect(db.engine).get_indexes('code_history')}
+    assert diff == []
+    assert 'ix_code_history_user_id_created_at_id' in indexes
+
+def test_migrations_downgrade_to_base(tmp_path):
+    test_app = make_app(tmp_path / 'migrations.db')
+    with test_app.app_context():
+        upgrade()
+        downgrade(revision='base')
+        assert inspect(db.engine).get_table_names() == ['alembic_version']
+
+def test_binary_bodies_migration_converts_text_rows(tmp_path):
+    test_app = make_app(tmp_path / 'migrations.db')
+    code = 'def add(a, b):\n    return a + b\n' * 40
+    stored = {
+        'plain': 'x = 1',
+        'escaped': 'raw:zlib: not compressed',
+        'zlib': 'zlib:' + base64.b64encode(zlib.compress(code.encode('utf-8'))).decode('ascii'),
+    }
+    with test_app.app_context():
+        upgrade(revision='0014')
+        with db.engine.begin() as connection:
+            connection.execute(text("INSERT INTO users (id, username, password) VALUES (1, 'user1', 'x')"))
+            for sha, content in stored.items():
+                connection.execute(text('INSERT INTO code_blobs (sha256, content, ref_count) VALUES (:sha, :content, 1)'),
+                                   {'sha': sha, 'content': content})
+            connection.execute(text(
+                "INSERT INTO code_history (id, user_id, language, original_code_sha, optimized_code_sha, report_analysis) "
+                "VALUES (1, 1, 'python', 'zlib', 'escaped', :analysis)"
+            ), {'analysis': stored['plain']})
+        upgrade()
+        history = db.session.get(CodeHistory, 1)
+        assert history.original_code == code
+        assert history.optimized_code == 'zlib: not compressed'
+        assert history.report_analysis == 'x = 1'
+        assert db.session.get(CodeBlob, 'plain').content == 'x = 1'
+        db.session.remove()
+
+        downgrade(revision='0014')
+        with db.engine.connect() as connection:
+            assert dict(connection.execute(text('SELECT sha256, content FROM code_blobs')).all()) == stored
+            assert connection.execute(text('SELECT report_analysis FROM code_history')).scalar() == 'x = 1'
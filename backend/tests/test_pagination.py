@@ -0,0 +1,85 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from datetime import datetime, timedelta
+from user.models import User, CodeHistory, db
+from app import create_app
+import json
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+def get_token(client):
+    client.post("/register", json={"username": "user1", "password": "testpass"})
+    res = client.post("/login", json={"username": "user1", "password": "testpass"})
+    return json.loads(res.data)["access_token"]
+
+def add_history(count):
+    user = User.find_by_username('user1')
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        # Pairs of rows share a timestamp so the id tie-breaker is exercised
+        db.session.add(CodeHistory(
+            user_id=user.id,
+            language='python',
+            original_code=f'code {i} ' + 'x' * 500,
+            optimized_code='optimized',
+            optimization_suggestions='suggestions',
+            created_at=start + timedelta(minutes=i // 2)
+        ))
+    db.session.commit()
+
+def test_keyset_pagination_walks_every_row_once(client):
+    token = get_token(client)
+    add_history(7)
+    headers = {'Authorization': f'Bearer {token}'}
+
+    seen = []
+    cursor = None
+    while True:
+        url = '/history?limit=3' + (f'&cursor={cursor}' if cursor else '')
+        page = json.loads(client.get(url, headers=headers).data)
+        seen.extend(item['id'] for item in page['items'])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+
+    expected = [h.id for h in CodeHistory.query.order_by(CodeHistory.created_at.desc(), CodeHistory.id.desc())]
+    assert seen == expected
+
+def test_summary_view_returns_preview_only(client):
+    token = get_token(client)
+    add_history(1)
+    page = json.loads(client.get('/history?view=summary', headers={'Authorization': f'Bearer {token}'}).data)
+    item = page['items'][0]
+    assert set(item) == {'id', 'language', 'created_at', 'preview', *CodeHistory.SUMMARY_FIELDS}
+    assert (item['original_lines'], item['optimized_lines']) == (1, 1)
+    assert item['preview'] == ('code 0 ' + 'x' * 500)[:app.config['HISTORY_PREVIEW_CHARS']]
+
+def test_get_history_entry_returns_full_body(client):
+    token = get_token(client)
+    add_history(1)
+    history_id = CodeHistory.query.first().id
+    response = client.get(f'/history/{history_id}', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    assert json.loads(response.data)['optimization_suggestions'] == 'suggestions'
+    assert client.get('/history/999', headers={'Authorization': f'Bearer {token}'}).status_code == 404
+
+def test_invalid_pagination_parameters(client):
+    token = get_token(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    assert client.get('/history?cursor=bogus', headers=headers).status_code == 400
+    assert client.get('/history?limit=0', headers=headers).status_code == 400
+    assert client.get('/history?view=everything', headers=headers).status_code == 400
@@ -0,0 +1,73 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from user.models import User, db
+from user.passwords import HasherBusy, PasswordHasher, hash_password, hash_rounds
+from app import create_app
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield client
+            app.extensions.pop('password_hasher', None)
+            db.session.remove()
+            db.drop_all()
+
+def test_process_pool_hashes_at_configured_cost():
+    hasher = PasswordHasher(rounds=5, workers=1)
+    try:
+        hashed = hasher.hash('secret')
+        assert hash_rounds(hashed) == 5
+        assert hasher.check(hashed, 'secret')
+        assert not hasher.check(hashed, 'wrong')
+    finally:
+        hasher.shutdown()
+
+def test_needs_rehash_compares_cost():
+    hasher = PasswordHasher(rounds=5, workers=0)
+    assert not hasher.needs_rehash(hash_password('secret', 5))
+    assert hasher.needs_rehash(hash_password('secret', 4))
+
+def test_pool_rejects_work_beyond_max_pending():
+    hasher = PasswordHasher(rounds=4, workers=0, max_pending=1, wait=0.01)
+    hasher.workers = 1
+    hasher._slots.acquire()  # Occupy the only slot
+    with pytest.raises(HasherBusy):
+        hasher.hash('secret')
+    hasher._slots.release()
+
+def test_login_rehashes_when_cost_changes(client):
+    app.extensions['password_hasher'] = PasswordHasher(rounds=4, workers=0)
+    client.post('/register', json={'username': 'user1', 'password': 'testpass'})
+    assert hash_rounds(User.find_by_username('user1').password) == 4
+
+    app.extensions['password_hasher'] = PasswordHasher(rounds=5, workers=0)
+    response = client.post('/login', json={'username': 'user1', 'password': 'testpass'})
+    assert response.status_code == 200
+    assert hash_rounds(User.find_by_username('user1').password) == 5
+
+    # The rehashed password still works and is not rehashed again
+    stored = User.find_by_username('user1').password
+    assert client.post('/login', json={'username': 'user1', 'password': 'testpass'}).status_code == 200
+    assert User.find_by_username('user1').password == stored
+
+def test_login_returns_503_when_hasher_is_saturated(client):
+    hasher = PasswordHasher(rounds=4, workers=0, max_pending=1, wait=0.01)
+    app.extensions['password_hasher'] = hasher
+    client.post('/register', json={'username': 'user1', 'password': 'testpass'})
+    hasher.workers = 1
+    hasher._slots.acquire()
+    try:
+        response = client.post('/login', json={'username': 'user1', 'password': 'testpass'})
+    finally:
+        hasher._slots.release()
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
@@ -0,0 +1,145 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from types import SimpleNamespace
+from user.models import RateLimitBucket, db
+from app import create_app
+from api.ratelimit import InFlightLimit, MemoryBuckets, RateLimited, RateLimiter, SQLBuckets
+from api.upstream import UpstreamClient
+from bench.fake_openai import StubClient
+import json
+import threading
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+RESPONSE = "4. Optimised Code\n```python\nx = 1\n```\n"
+
+class FakeCompletions:
+    def create(self, **kwargs):
+        message = SimpleNamespace(content=RESPONSE)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+@pytest.fixture
+def client(monkeypatch):
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
+    monkeypatch.setitem(app.extensions, 'upstream', UpstreamClient(StubClient(FakeCompletions()), max_retries=0))
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            app.extensions.pop('result_cache', None)
+            app.extensions.pop('rate_limiter', None)
+            yield client
+            app.extensions.pop('result_cache', None)
+            app.extensions.pop('rate_limiter', None)
+            db.session.remove()
+            db.drop_all()
+
+def get_token(client, username="user1"):
+    client.post("/register", json={"username": username, "password": "testpass"})
+    res = client.post("/login", json={"username": username, "password": "testpass"})
+    return json.loads(res.data)["access_token"]
+
+def use_limiter(buckets, **budgets):
+    limiter = RateLimiter(buckets, InFlightLimit(4), **budgets)
+    app.extensions['rate_limiter'] = limiter
+    return limiter
+
+def test_memory_buckets_refill_over_time(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('api.ratelimit.time.monotonic', lambda: now[0])
+    buckets = MemoryBuckets(period=60)
+    assert buckets.consume([('a', 2, 1)]) == 0
+    assert buckets.consume([('a', 2, 1)]) == 0
+    assert buckets.consume([('a', 2, 1)]) == pytest.approx(30)
+    now[0] += 30
+    assert buckets.consume([('a', 2, 1)]) == 0
+
+def test_memory_buckets_charge_all_or_nothing():
+    buckets = MemoryBuckets(period=60)
+    assert buckets.consume([('requests', 10, 1), ('tokens', 100, 100)]) == 0
+    assert buckets.consume([('requests', 10, 1), ('tokens', 100, 50)]) > 0
+    # The rejected request did not spend the request budget
+    assert buckets._buckets['requests'][0] == 9
+
+def test_oversized_request_drains_bucket_instead_of_blocking_forever():
+    buckets = MemoryBuckets(period=60)
+    assert buckets.consume([('tokens', 100, 500)]) == 0
+    assert buckets.consume([('tokens', 100, 1)]) > 0
+
+def test_sql_buckets_are_shared(client):
+    first, second = SQLBuckets(period=60), SQLBuckets(period=60)
+    assert first.consume([('user:1:requests', 2, 1)]) == 0
+    assert second.consume([('user:1:requests', 2, 1)]) == 0
+    assert first.consume([('user:1:requests', 2, 1)]) > 0
+    assert db.session.get(RateLimitBucket, 'user:1:requests').tokens < 1
+
+def test_optimize_returns_429_with_retry_after(client):
+    use_limiter(MemoryBuckets(period=60), user_requests=2)
+    token = get_token(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    for _ in range(2):
+        response = client.post('/optimize', headers=headers, json={'code': 'x=1', 'language': 'python'})
+        assert response.status_code == 200
+    response = client.post('/optimize', headers=headers, json={'code': 'x=1', 'language': 'python'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) == 30
+    assert json.loads(response.data)['retry_after'] == 30
+
+def test_users_have_separate_buckets(client):
+    use_limiter(SQLBuckets(period=60), user_requests=1)
+    first, second = get_token(client, 'user1'), get_token(client, 'user2')
+    for token in (first, second):
+        response = client.post('/optimize', headers={'Authorization': f'Bearer {token}'},
+            json={'code': 'x=1', 'language': 'python'})
+        assert response.status_code == 200
+    response = client.post('/optimize', headers={'Authorization': f'Bearer {first}'},
+        json={'code': 'x=1', 'language': 'python'})
+    assert response.status_code == 429
+
+def test_global_budget_applies_across_users(client):
+    use_limiter(MemoryBuckets(period=60), global_requests=1)
+    first, second = get_token(client, 'user1'), get_token(client, 'user2')
+    assert client.post('/optimize', headers={'Authorization': f'Bearer {first}'},
+        json={'code': 'x=1', 'language': 'python'}).status_code == 200
+    assert client.post('/optimize', headers={'Authorization': f'Bearer {second}'},
+        json={'code': 'x=1', 'language': 'python'}).status_code == 429
+
+def test_token_budget_counts_batch_items(client):
+    use_limiter(MemoryBuckets(period=60), user_requests=0, user_tokens=12000)
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    items = [{'code': f'x = {i}', 'language': 'python'} for i in range(5)]
+    assert client.post('/optimize/batch', headers=headers, json={'items': items}).status_code == 200
+    assert client.post('/optimize/batch', headers=headers, json={'items': items}).status_code == 429
+
+def test_in_flight_limit_rejects_when_no_slot_frees_up():
+    limit = InFlightLimit(1, wait=0.01)
+    limit.acquire()
+    with pytest.raises(RateLimited):
+        limit.acquire()
+    limit.release()
+    with limit:
+        pass
+
+def test_in_flight_limit_bounds_concurrency():
+    limit = InFlightLimit(2, wait=5)
+    lock = threading.Lock()
+    active = [0, 0]  # current, peak
+
+    def work():
+        with limit:
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            threading.Event().wait(0.02)
+            with lock:
+                active[0] -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert active[1] == 2
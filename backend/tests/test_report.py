@@ -0,0 +1,162 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import random
+from types import SimpleNamespace
+from user.models import CodeHistory, db
+from app import create_app
+from api.openai_api import extract_optimized_code
+from api.report import ReportParser, parse_report, report_fields
+from api.upstream import UpstreamClient
+from bench.fake_openai import StubClient
+import json
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+REPORT = '''Here is the report.
+
+## 1. Code Analysis
+Purpose – adds numbers.
+```python
+def add(a,b): return a+b
+```
+1. Optimisation Suggestions are listed below
+
+**2. Optimisation Suggestions**
+- Use a clearer name
+
+3. Changes Made
+- Renamed `add`
+
+4. Optimised Code
+````python
+def add(first, second):
+    return first + second
+```
+still code
+````
+
+5. Detailed Explanation of Optimised Code
+- 1. Code Analysis was short
+'''
+
+# Building blocks of generated reports, chosen to contain the markup the parser cares about
+NOISE = ['text', '1. item', '- bullet', '# note', '**bold**', '`inline`', '~~strike~~', '2. Optimisation Suggestions', '```', '    ```', '~~~', '', ' ']
+
+def random_text(rng, lines):
+    """Build prose that may contain stray headings, numbered lists and fenced snippets"""
+    output = []
+    for _ in range(lines):
+        if rng.random() < 0.1:
+            fence = rng.choice(['```', '~~~~'])
+            # Anything goes inside a block except a line that would close it
+            inside = [line for line in NOISE if not line.strip().startswith(fence)]
+            output += [fence + rng.choice(['', 'python']), *rng.choices(inside, k=rng.randint(0, 3)), fence]
+        else:
+            output.append(rng.choice(NOISE[:-6]))
+    return output
+
+def random_report(rng):
+    """Build a well-formed report and the sections and code a parser should recover from it"""
+    heading_styles = ['{n}. {title}', '## {n}. {title}', '**{n}. {title}**', '   {n}. {title}  (notes)']
+    titles = ['Code Analysis', 'Optimisation Suggestions', 'Changes Made', 'Optimised Code', 'Detailed Explanation of Optimised Code']
+    lines = random_text(rng, rng.randint(0, 2)) if rng.random() < 0.3 else []
+    sections = {}
+    code = '\n'.join(f'x_{i} = {i}  # ```' for i in range(rng.randint(1, 5)))
+    for number, title in enumerate(titles, 1):
+        lines.append(rng.choice(heading_styles).format(n=number, title=title))
+        if number == 4:
+            body = ['````python', *code.split('\n'), '````']
+        else:
+            body = random_text(rng, rng.randint(0, 6))
+        lines += body
+        sections[number] = '\n'.join(body).strip()
+    return '\n'.join(lines) + rng.choice(['', '\n']), sections, code
+
+def feed_in_pieces(rng, text):
+    """Parse text fed in random pieces, as the deltas of a stream arrive"""
+    parser = ReportParser()
+    index = 0
+    while index < len(text):
+        size = rng.choice([1, 2, 3, 7, 50, 1000])
+        parser.feed(text[index:index + size])
+        index += size
+    return parser.close()
+
+def test_parser_splits_sections_and_ignores_snippets_outside_section_four():
+    report = parse_report(REPORT)
+    assert report.structured
+    assert report.code == 'def add(first, second):\n    return first + second\n```\nstill code'
+    assert report.sections[1].startswith('Purpose') and report.sections[1].endswith('listed below')
+    assert report.sections[2] == '- Use a clearer name'
+    assert report.sections[5] == '- 1. Code Analysis was short'
+    assert report_fields(report)['changes'] == '- Renamed `add`'
+
+def test_unstructured_and_truncated_reports():
+    assert parse_report('Try this:\n```\nx = 1\n```\n') == ({1: 'Try this:\n```\nx = 1\n```'}, 'x = 1', False)
+    truncated = parse_report('1. Code Analysis\nok\n4. Optimised Code\n```python\nx = 1\n')
+    assert truncated.code is None
+    assert extract_optimized_code('1. Code Analysis\nok\n4. Optimised Code\n```python\nx = 1\n', 'y = 2') == 'y = 2'
+    assert extract_optimized_code(REPORT, 'y = 2').startswith('def add(first, second)')
+
+def test_fuzz_generated_reports_are_recovered():
+    rng = random.Random(18)
+    for _ in range(500):
+        text, sections, code = random_report(rng)
+        report = feed_in_pieces(rng, text)
+        assert report.sections == sections, text
+        assert report.code == code, text
+
+def test_fuzz_pieces_never_change_the_result():
+    rng = random.Random(1018)
+    alphabet = ['`', '~', '#', '*', '\n', ' ', 'x', '4. Optimised Code', '1. Code Analysis', '5. Detailed Explanation', '```', '\r\n']
+    for _ in range(1000):
+        text = ''.join(rng.choices(alphabet, k=rng.randint(0, 80)))
+        assert feed_in_pieces(rng, text) == parse_report(text), repr(text)
+
+def test_long_unterminated_line_fed_one_character_at_a_time():
+    parser = ReportParser()
+    for _ in range(200000):
+        parser.feed('x')
+    assert len(parser.close().sections[1]) == 200000
+
+@pytest.fixture
+def client(monkeypatch):
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
+    message = SimpleNamespace(content=REPORT)
+    completions = SimpleNamespace(create=lambda **kwargs: SimpleNamespace(choices=[SimpleNamespace(message=message)]))
+    monkeypatch.setitem(app.extensions, 'upstream', UpstreamClient(StubClient(completions), max_retries=0))
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            for name in ('result_cache', 'rate_limiter', 'model_router'):
+                app.extensions.pop(name, None)
+            yield client
+            for name in ('result_cache', 'rate_limiter', 'model_router'):
+                app.extensions.pop(name, None)
+            db.session.remove()
+            db.drop_all()
+
+def get_token(client, username="user1"):
+    client.post("/register", json={"username": username, "password": "testpass"})
+    res = client.post("/login", json={"username": username, "password": "testpass"})
+    return json.loads(res.data)["access_token"]
+
+def test_history_stores_report_sections(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    data = json.loads(client.post('/optimize', json={'code': 'def add(a,b): return a+b', 'language': 'python'}, headers=headers).data)
+    assert data['optimized_code'].startswith('def add(first, second)')
+
+    history = db.session.get(CodeHistory, data['id'])
+    assert history.report_suggestions == '- Use a clearer name'
+    entry = json.loads(client.get(f"/history/{data['id']}", headers=headers).data)
+    assert entry['report'] == report_fields(parse_report(REPORT))
+
+    # Entries written before sections were stored are parsed when read
+    history.report = {}
+    db.session.commit()
+    entry = json.loads(client.get(f"/history/{data['id']}", headers=headers).data)
+    assert entry['report']['explanation'] == '- 1. Code Analysis was short'
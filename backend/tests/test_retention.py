@@ -0,0 +1,114 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from user.models import User, CodeBlob, CodeHistory, CodeSignature, CodeSignatureBand, HistorySearch, db, delete_history_entries, purge_history
+from user.blobs import blob_hash
+from app import create_app
+import json
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+def get_token(client, username="user1"):
+    client.post("/register", json={"username": username, "password": "testpass"})
+    res = client.post("/login", json={"username": username, "password": "testpass"})
+    return json.loads(res.data)["access_token"]
+
+def add_history(username, count, start=datetime(2024, 1, 1), code='print(x)'):
+    user = User.find_by_username(username)
+    entries = [
+        CodeHistory(user_id=user.id, language='python', original_code=f'{code} # {i}', optimized_code='shared',
+                    optimization_suggestions='suggestions', created_at=start + timedelta(days=i))
+        for i in range(count)
+    ]
+    db.session.add_all(entries)
+    db.session.commit()
+    return [entry.id for entry in entries]
+
+def index_rows(history_ids):
+    return sum(model.query.filter(model.history_id.in_(history_ids)).count() for model in (CodeSignature, CodeSignatureBand, HistorySearch))
+
+def test_bulk_delete_by_ids_releases_blobs_and_index_rows(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    get_token(client, 'user2')
+    ids = add_history('user1', 3)
+    other = add_history('user2', 1, code='other')
+    assert index_rows(ids[:2]) > 0
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.delete('/history', json={'ids': ids[:2] + other}, headers=headers)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    assert response.status_code == 200
+    assert json.loads(response.data) == {'deleted': 2}
+    assert sum(statement.startswith('DELETE FROM code_history') for statement in statements) == 1
+    db.session.expire_all()
+    assert sorted(entry.id for entry in CodeHistory.query) == [ids[2]] + other
+    assert index_rows(ids[:2]) == 0 and index_rows(other) > 0
+    assert db.session.get(CodeBlob, blob_hash('print(x) # 0')).ref_count == 0
+    assert db.session.get(CodeBlob, blob_hash('shared')).ref_count == 2
+
+def test_overlapping_deletes_release_blobs_once(client):
+    get_token(client)
+    ids = add_history('user1', 2)
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        assert delete_history_entries(CodeHistory.id.in_(ids)) == 2
+        # A second delete of the same rows, e.g. a purge racing a bulk delete, finds nothing to release
+        assert delete_history_entries(CodeHistory.id.in_(ids)) == 0
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    db.session.commit()
+
+    assert all('RETURNING' in statement for statement in statements if statement.startswith('DELETE FROM code_history'))
+    assert not any(statement.startswith('SELECT') and 'code_history' in statement for statement in statements)
+    assert db.session.get(CodeBlob, blob_hash('shared')).ref_count == 0
+    assert db.session.get(CodeBlob, blob_hash('print(x) # 0')).ref_count == 0
+
+def test_bulk_delete_by_date_range(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    ids = add_history('user1', 5)
+
+    response = client.delete('/history', json={'from': '2024-01-02', 'to': '2024-01-04'}, headers=headers)
+    assert json.loads(response.data) == {'deleted': 2}
+    assert [entry.id for entry in CodeHistory.query.order_by(CodeHistory.id)] == [ids[0], ids[3], ids[4]]
+
+    for body in ({}, {'ids': []}, {'ids': ['1']}, {'ids': [1], 'to': '2024-01-01'}, {'from': 'yesterday'},
+                 {'from': '2024-01-04', 'to': '2024-01-02'}, {'to': None}):
+        assert client.delete('/history', json=body, headers=headers).status_code == 400
+
+def test_purge_keeps_newest_rows_per_user_and_drops_old_entries(client):
+    get_token(client)
+    get_token(client, 'user2')
+    recent = datetime.now() - timedelta(days=2, hours=12)
+    user1 = add_history('user1', 5, start=recent - timedelta(days=30)) + add_history('user1', 3, start=recent)
+    user2 = add_history('user2', 2, start=recent)
+
+    assert purge_history(max_rows=2, batch_size=2) == 6
+    assert sorted(entry.id for entry in CodeHistory.query) == sorted(user1[-2:] + user2)
+    assert index_rows(user1[:-2]) == 0
+
+    assert purge_history(max_age_days=2) == 1
+    assert sorted(entry.id for entry in CodeHistory.query) == sorted(user1[-2:] + user2[1:])
+    assert purge_history() == 0
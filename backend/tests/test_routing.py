@@ -0,0 +1,132 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from types import SimpleNamespace
+from user.models import User, db
+from app import create_app
+from api.routing import InputTooLarge, ModelRouter, count_tokens
+from api.upstream import UpstreamClient
+from bench.fake_openai import StubClient
+import json
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+RESPONSE = "4. Optimised Code\n```python\nx = 1\n```\n"
+
+RULES = [
+    {'tiers': ['pro'], 'model': 'pro-model', 'max_tokens': 8000},
+    {'languages': ['cpp'], 'model': 'cpp-model', 'max_tokens': 3000},
+    {'max_input_tokens': 100, 'model': 'small-model', 'max_tokens': 500},
+    {'model': 'large-model', 'max_tokens': 4000},
+]
+
+class FakeCompletions:
+    """Records the model and budget of every call"""
+    def __init__(self):
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        message = SimpleNamespace(content=RESPONSE)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+@pytest.fixture
+def fake_completions(monkeypatch):
+    completions = FakeCompletions()
+    monkeypatch.setitem(app.extensions, 'upstream', UpstreamClient(StubClient(completions), max_retries=0))
+    return completions
+
+@pytest.fixture
+def client(monkeypatch):
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
+    monkeypatch.setitem(app.config, 'MODEL_ROUTES', RULES)
+    monkeypatch.setitem(app.config, 'ROUTING_MAX_INPUT_TOKENS', 1000)
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            for name in ('result_cache', 'rate_limiter', 'model_router'):
+                app.extensions.pop(name, None)
+            yield client
+            for name in ('result_cache', 'rate_limiter', 'model_router'):
+                app.extensions.pop(name, None)
+            db.session.remove()
+            db.drop_all()
+
+def get_token(client, username="user1"):
+    client.post("/register", json={"username": username, "password": "testpass"})
+    res = client.post("/login", json={"username": username, "password": "testpass"})
+    return json.loads(res.data)["access_token"]
+
+def test_rules_match_in_order():
+    router = ModelRouter(RULES, 'system prompt', max_input_tokens=0)
+    small, large = 'x = 1', 'x = 1\n' * 200
+    assert router.route(small, 'python').model == 'small-model'
+    assert router.route(large, 'python').model == 'large-model'
+    assert router.route(small, 'cpp').model == 'cpp-model'
+    assert router.route(small, 'cpp', tier='pro').model == 'pro-model'
+
+def test_completion_budget_scales_with_input():
+    router = ModelRouter([{'model': 'm', 'max_tokens': 4000}], 'system prompt', report_tokens=300, max_input_tokens=0)
+    small = router.route('x = 1', 'python')
+    assert small.max_tokens == 300 + 2 * count_tokens('x = 1')
+    assert small.prompt_tokens == count_tokens('system prompt') + count_tokens('x = 1')
+    assert router.route('x = 1\n' * 2000, 'python').max_tokens == 4000
+
+def test_oversized_input_is_rejected():
+    router = ModelRouter(RULES, 'system prompt', max_input_tokens=50)
+    with pytest.raises(InputTooLarge) as info:
+        router.route('x = 1\n' * 100, 'python')
+    assert info.value.max_input_tokens == 50 and info.value.input_tokens > 50
+
+def test_input_beyond_context_window_is_rejected():
+    router = ModelRouter([{'model': 'm', 'max_tokens': 500}], 'system prompt', context_windows={'m': 1000}, max_input_tokens=0)
+    router.route('x = 1\n' * 50, 'python')
+    with pytest.raises(InputTooLarge):
+        router.route('x = 1\n' * 500, 'python')
+
+def test_optimize_uses_routed_model_and_budget(client, fake_completions):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    client.post('/optimize', json={'code': 'x = 1', 'language': 'python'}, headers=headers)
+    client.post('/optimize', json={'code': 'x = 1\n' * 200, 'language': 'python'}, headers=headers)
+    large_budget = app.config['ROUTING_REPORT_TOKENS'] + 2 * count_tokens('x = 1\n' * 200)
+    assert [(call['model'], call['max_tokens']) for call in fake_completions.calls] == [('small-model', 500), ('large-model', large_budget)]
+
+def test_optimize_rejects_oversized_code_before_calling_model(client, fake_completions):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    res = client.post('/optimize', json={'code': 'x = 1\n' * 2000, 'language': 'python'}, headers=headers)
+    assert res.status_code == 413
+    assert json.loads(res.data)['max_input_tokens'] == 1000
+    assert client.post('/optimize/stream', json={'code': 'x = 1\n' * 2000, 'language': 'python'}, headers=headers).status_code == 413
+    assert client.post('/optimize/jobs', json={'code': 'x = 1\n' * 2000, 'language': 'python'}, headers=headers).status_code == 413
+    assert fake_completions.calls == []
+
+def test_batch_reports_oversized_items_individually(client, fake_completions):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    items = [{'code': 'x = 1', 'language': 'python'}, {'code': 'x = 1\n' * 2000, 'language': 'python'}]
+    results = json.loads(client.post('/optimize/batch', json={'items': items}, headers=headers).data)['results']
+    assert 'id' in results[0]
+    assert 'too large' in results[1]['error']
+    assert len(fake_completions.calls) == 1
+
+def test_user_tier_selects_route(client, fake_completions):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    user = User.find_by_username('user1')
+    user.tier = 'pro'
+    db.session.commit()
+    client.post('/optimize', json={'code': 'x = 1', 'language': 'python'}, headers=headers)
+    assert fake_completions.calls[0]['model'] == 'pro-model'
+
+def test_unrouted_language_is_rejected_before_streaming(client, fake_completions, monkeypatch):
+    monkeypatch.setitem(app.config, 'MODEL_ROUTES', [{'languages': ['python'], 'model': 'python-model', 'max_tokens': 500}])
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    body = {'code': 'int x = 1;', 'language': 'cpp'}
+    for path in ('/optimize', '/optimize/stream', '/optimize/jobs'):
+        response = client.post(path, json=body, headers=headers)
+        assert response.status_code == 400, path
+        assert 'No model route' in json.loads(response.data)['message']
+    results = json.loads(client.post('/optimize/batch', json={'items': [body]}, headers=headers).data)['results']
+    assert 'No model route' in results[0]['error']
+    assert fake_completions.calls == []
@@ -0,0 +1,130 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from types import SimpleNamespace
+from sqlalchemy import event
+from user.models import HistorySearch, clear_search_index, db, index_unindexed_history
+from user.search import SearchUnavailable, search_history, snippet
+from app import create_app
+from api.upstream import UpstreamClient
+from bench.fake_openai import StubClient
+import json
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+class FakeCompletions:
+    """Reports on the submitted code, mentioning the name it defines"""
+    def create(self, **kwargs):
+        code = kwargs['messages'][1]['content'].split(':\n\n', 1)[1]
+        content = f"1. Code Analysis\nThe {code.split()[1]} helper is slow.\n\n4. Optimised Code\n```python\n{code}\n```\n"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+@pytest.fixture
+def client(monkeypatch):
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
+    monkeypatch.setitem(app.extensions, 'upstream', UpstreamClient(StubClient(FakeCompletions()), max_retries=0))
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            for name in ('result_cache', 'rate_limiter', 'model_router'):
+                app.extensions.pop(name, None)
+            yield client
+            for name in ('result_cache', 'rate_limiter', 'model_router'):
+                app.extensions.pop(name, None)
+            db.session.remove()
+            db.drop_all()
+
+def get_token(client, username="user1"):
+    client.post("/register", json={"username": username, "password": "testpass"})
+    res = client.post("/login", json={"username": username, "password": "testpass"})
+    return json.loads(res.data)["access_token"]
+
+def optimize(client, headers, code):
+    return json.loads(client.post('/optimize', json={'code': code, 'language': 'python'}, headers=headers).data)['id']
+
+def search(client, headers, query, **params):
+    return client.get('/history/search', query_string=dict(q=query, **params), headers=headers)
+
+def test_search_ranks_matches_with_highlighted_snippets(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    parse_id = optimize(client, headers, 'def parse_rows(rows):\n    return parse_rows(rows[1:]) if rows else "<"')
+    render_id = optimize(client, headers, 'def render_page(page, parse_rows=None):\n    title = page.title\n    body = page.body\n    return title + body')
+    optimize(client, headers, 'def tally(values):\n    return sum(values)')
+
+    res = search(client, headers, 'parse_rows')
+    assert res.status_code == 200
+    items = json.loads(res.data)['items']
+    assert [item['id'] for item in items] == [parse_id, render_id]
+    assert items[0]['score'] >= items[-1]['score']
+    assert '<mark>parse_rows</mark>' in items[0]['snippets']['code']
+    assert '&quot;&lt;&quot;' in items[0]['snippets']['code']
+    assert items[0]['preview'].startswith('def parse_rows')
+
+    # Every word must match, in any order
+    assert [item['id'] for item in json.loads(search(client, headers, 'helper render_page').data)['items']] == [render_id]
+    assert json.loads(search(client, headers, 'render_page tally').data)['items'] == []
+    # Operators are searched as words
+    assert search(client, headers, 'parse_rows AND OR NEAR(').status_code == 200
+
+def test_search_is_per_user_and_follows_deletes(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    other = {'Authorization': f'Bearer {get_token(client, "user2")}'}
+    history_id = optimize(client, headers, 'def tally(values):\n    return sum(values)')
+    assert json.loads(search(client, other, 'tally').data)['items'] == []
+
+    client.delete(f'/history/{history_id}', headers=headers)
+    assert json.loads(search(client, headers, 'tally').data)['items'] == []
+    assert db.session.get(HistorySearch, history_id) is None
+
+def test_search_stores_no_text_and_reads_only_the_page_bodies(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    optimize(client, headers, 'def tally(values):\n    return sum(values)')
+    optimize(client, headers, 'def tally_twice(values):\n    return 2 * tally(values)')
+    assert [column.name for column in HistorySearch.__table__.columns] == ['history_id', 'user_id']
+
+    statements = []
+    record = lambda conn, cursor, statement, parameters, *args: statements.append((statement, parameters))
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        items = json.loads(search(client, headers, 'tally', limit=1).data)['items']
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert '<mark>tally</mark>' in items[0]['snippets']['code']
+    # One lookup of the returned entry's code and report, whichever entry matched
+    blob_reads = [parameters for statement, parameters in statements if 'code_blobs' in statement]
+    assert len(blob_reads) == 1 and len(blob_reads[0]) == 2
+
+def test_snippet_marks_terms_in_a_window_of_words():
+    body = ' '.join(f'w{i}' for i in range(40)) + ' Tally(x) ÉTÉ'
+    assert snippet('return tally(values)', ['TALLY']) == 'return \x02tally\x03(values)'
+    assert snippet(body, ['tally', 'ete']).startswith('…w27 ')
+    assert snippet(body, ['tally', 'ete']).endswith('\x02Tally\x03(x) \x02ÉTÉ\x03')
+    assert snippet(body, ['w3']) == 'w0 w1 w2 \x02w3\x03 ' + ' '.join(f'w{i}' for i in range(4, 16)) + '…'
+    assert snippet(body, ['absent']) is None and snippet(None, ['w3']) is None
+
+def test_search_pages_and_validates(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    ids = [optimize(client, headers, f'def tally_{i}(values):\n    return tally(values) + {i}') for i in range(3)]
+    first = json.loads(search(client, headers, 'tally', limit=2).data)['items']
+    rest = json.loads(search(client, headers, 'tally', limit=2, offset=2).data)['items']
+    assert sorted(item['id'] for item in first + rest) == sorted(ids)
+    assert search(client, headers, '  !? ').status_code == 400
+    assert search(client, headers, 'tally', limit=0).status_code == 400
+    assert search(client, headers, 'tally', offset=-1).status_code == 400
+
+def test_backfill_indexes_older_entries(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    optimize(client, headers, 'def tally(values):\n    return sum(values)')
+    clear_search_index()
+    db.session.commit()
+    assert json.loads(search(client, headers, 'tally').data)['items'] == []
+    assert index_unindexed_history() == 1
+    assert len(json.loads(search(client, headers, 'tally').data)['items']) == 1
+
+def test_search_is_unavailable_without_a_full_text_index():
+    connection = SimpleNamespace(dialect=SimpleNamespace(name='mysql'))
+    with pytest.raises(SearchUnavailable):
+        search_history(connection, 1, ['tally'], 20, 0, load_texts=None)
@@ -0,0 +1,129 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from types import SimpleNamespace
+from user.models import CodeHistory, CodeSignature, CodeSignatureBand, OptimizationUsage, db, index_unindexed_history
+from user.similarity import BANDS, estimate_similarity, signature
+from app import create_app
+from api.upstream import UpstreamClient
+from bench.fake_openai import StubClient
+import json
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+RESPONSE = "4. Optimised Code\n```python\nx = 1\n```\n"
+
+def make_file(functions):
+    return ''.join(f'def function_{i}(value):\n    total = value * {i}\n    return total + {i}\n\n' for i in range(functions))
+
+def other_file(classes):
+    return ''.join(f'class Shape{i}:\n    def area(self):\n        return self.width ** {i} - len(self.points)\n\n' for i in range(classes))
+
+class FakeCompletions:
+    """Counts model calls"""
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=RESPONSE))])
+
+@pytest.fixture
+def fake_completions(monkeypatch):
+    completions = FakeCompletions()
+    monkeypatch.setitem(app.extensions, 'upstream', UpstreamClient(StubClient(completions), max_retries=0))
+    return completions
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            for name in ('result_cache', 'rate_limiter', 'model_router'):
+                app.extensions.pop(name, None)
+            yield client
+            for name in ('result_cache', 'rate_limiter', 'model_router'):
+                app.extensions.pop(name, None)
+            db.session.remove()
+            db.drop_all()
+
+def get_token(client, username="user1"):
+    client.post("/register", json={"username": username, "password": "testpass"})
+    res = client.post("/login", json={"username": username, "password": "testpass"})
+    return json.loads(res.data)["access_token"]
+
+def similar(client, headers, code, **options):
+    return client.post('/optimize/similar', json=dict(code=code, language='python', **options), headers=headers)
+
+def test_signatures_estimate_token_similarity():
+    source = make_file(15)
+    edited = source.replace('value * 7', 'value * 70')
+    assert estimate_similarity(signature(source, 'python'), signature(source, 'python')) == 1.0
+    assert estimate_similarity(signature(source, 'python'), signature(edited, 'python')) >= 0.8
+    assert estimate_similarity(signature(source, 'python'), signature(other_file(15), 'python')) < 0.5
+    # Comments and whitespace are not tokens
+    commented = source.replace('    return', '    # Add the index\n    return  ')
+    assert estimate_similarity(signature(source, 'python'), signature(commented, 'python')) == 1.0
+    assert signature('# only a comment', 'python') is None
+
+def test_index_follows_inserts_and_deletes(client, fake_completions):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    other = {'Authorization': f'Bearer {get_token(client, "user2")}'}
+    history_id = json.loads(client.post('/optimize', json={'code': make_file(15), 'language': 'python'}, headers=headers).data)['id']
+    client.post('/optimize', json={'code': other_file(15), 'language': 'python'}, headers=headers)
+    assert CodeSignatureBand.query.filter_by(history_id=history_id).count() == BANDS
+
+    edited = make_file(15).replace('value * 7', 'value * 70')
+    items = json.loads(similar(client, headers, edited).data)['items']
+    assert [item['id'] for item in items] == [history_id]
+    assert 0.8 <= items[0]['similarity'] < 1 and items[0]['preview']
+    # Other users' history and other languages never match
+    assert json.loads(similar(client, other, edited).data)['items'] == []
+    assert json.loads(client.post('/optimize/similar', json={'code': edited, 'language': 'java'}, headers=headers).data)['items'] == []
+
+    client.delete(f'/history/{history_id}', headers=headers)
+    assert json.loads(similar(client, headers, edited).data)['items'] == []
+    assert CodeSignature.query.filter_by(history_id=history_id).count() == 0
+    assert CodeSignatureBand.query.filter_by(history_id=history_id).count() == 0
+    assert fake_completions.calls == 2
+
+def test_reuse_similar_answers_without_calling_model(client, fake_completions):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    history_id = json.loads(client.post('/optimize', json={'code': make_file(15), 'language': 'python'}, headers=headers).data)['id']
+    edited = make_file(15).replace('value * 7', 'value * 70')
+
+    data = json.loads(client.post('/optimize', json={'code': edited, 'language': 'python', 'reuse_similar': True}, headers=headers).data)
+    assert data['id'] == history_id and data['cached'] is True and data['similarity'] >= 0.8
+    assert data['optimized_code'] == 'x = 1'
+    assert fake_completions.calls == 1
+    assert OptimizationUsage.query.filter_by(history_id=history_id, cached=True).count() == 1
+
+    # Without the flag the edited code is optimized as usual
+    data = json.loads(client.post('/optimize', json={'code': edited, 'language': 'python'}, headers=headers).data)
+    assert data['id'] != history_id and 'similarity' not in data
+    assert fake_completions.calls == 2
+
+def test_backfill_indexes_older_entries(client, fake_completions):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    client.post('/optimize', json={'code': make_file(15), 'language': 'python'}, headers=headers)
+    client.post('/optimize', json={'code': other_file(15), 'language': 'python'}, headers=headers)
+    CodeSignatureBand.query.delete()
+    CodeSignature.query.delete()
+    db.session.commit()
+    assert json.loads(similar(client, headers, make_file(15)).data)['items'] == []
+
+    assert index_unindexed_history(batch_size=1) == 2
+    assert index_unindexed_history() == 0
+    assert len(json.loads(similar(client, headers, make_file(15)).data)['items']) == 1
+
+def test_similar_validates_options(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    assert client.post('/optimize/similar', json={'code': 'x = 1'}, headers=headers).status_code == 400
+    assert similar(client, headers, 'x = 1', threshold=1.5).status_code == 400
+    assert similar(client, headers, 'x = 1', limit=0).status_code == 400
+    assert similar(client, headers, 'x = 1', threshold=0.5, limit=100).status_code == 200
+    assert client.post('/optimize', json={'code': 'x = 1', 'language': 'python', 'reuse_similar': 'yes'}, headers=headers).status_code == 400
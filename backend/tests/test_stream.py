@@ -0,0 +1,120 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from types import SimpleNamespace
+from user.models import CodeHistory, db
+from app import create_app
+from api.upstream import UpstreamClient
+from bench.fake_openai import StubClient
+import json
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+PARTS = ["1. Code Analysis\n", "4. Optimised Code\n```python\n", "def add(a, b):\n    return a + b\n", "```\n"]
+
+class FakeStream:
+    """Iterable of completion chunks that records whether it was closed"""
+    def __init__(self, parts):
+        self.parts = parts
+        self.closed = False
+
+    def __iter__(self):
+        for part in self.parts:
+            delta = SimpleNamespace(content=part)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+    def close(self):
+        self.closed = True
+
+class FakeCompletions:
+    def __init__(self):
+        self.streams = []
+
+    def create(self, **kwargs):
+        assert kwargs['stream'] is True
+        stream = FakeStream(PARTS)
+        self.streams.append(stream)
+        return stream
+
+@pytest.fixture
+def fake_completions(monkeypatch):
+    completions = FakeCompletions()
+    monkeypatch.setitem(app.extensions, 'upstream', UpstreamClient(StubClient(completions), max_retries=0))
+    return completions
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            app.extensions.pop('result_cache', None)
+            app.extensions.pop('rate_limiter', None)
+            yield client
+            app.extensions.pop('result_cache', None)
+            app.extensions.pop('rate_limiter', None)
+            db.session.remove()
+            db.drop_all()
+
+def get_token(client):
+    client.post("/register", json={"username": "user1", "password": "testpass"})
+    res = client.post("/login", json={"username": "user1", "password": "testpass"})
+    return json.loads(res.data)["access_token"]
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+def test_stream_relays_deltas_and_saves_history(client, fake_completions):
+    token = get_token(client)
+    response = client.post('/optimize/stream',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'code': 'def add(a,b): return a+b', 'language': 'python'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+
+    events = parse_events(response.get_data(as_text=True))
+    deltas = [payload['content'] for event, payload in events if event == 'delta']
+    assert deltas == PARTS
+    event, done = events[-1]
+    assert event == 'done'
+    assert done['optimized_code'] == 'def add(a, b):\n    return a + b'
+
+    history = db.session.get(CodeHistory, done['id'])
+    assert history.optimization_suggestions == ''.join(PARTS)
+    assert fake_completions.streams[0].closed
+
+def test_stream_client_disconnect_closes_upstream(client, fake_completions):
+    token = get_token(client)
+    response = client.post('/optimize/stream',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'code': 'def add(a,b): return a+b', 'language': 'python'},
+        buffered=False)
+    body = iter(response.response)
+    next(body)
+    response.close()
+
+    assert fake_completions.streams[0].closed
+    assert CodeHistory.query.count() == 0
+
+def test_stream_repeat_is_served_from_cache(client, fake_completions):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    body = {'code': 'def add(a,b): return a+b', 'language': 'python'}
+    # The stream only runs, and fills the cache, as the body is read
+    client.post('/optimize/stream', headers=headers, json=body).get_data()
+    response = client.post('/optimize/stream', headers=headers, json=body)
+
+    events = parse_events(response.get_data(as_text=True))
+    event, done = events[-1]
+    assert event == 'done' and done['cached'] is True
+    assert [payload['content'] for event, payload in events if event == 'delta'] == [''.join(PARTS)]
+    assert len(fake_completions.streams) == 1
+    history = db.session.get(CodeHistory, done['id'])
+    assert history.optimized_code == 'def add(a, b):\n    return a + b'
+    assert [usage.cached for usage in history.usage] == [True]
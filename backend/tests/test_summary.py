@@ -0,0 +1,105 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from types import SimpleNamespace
+from sqlalchemy import event
+from user.models import CodeHistory, db, summarize_unsummarized_history
+from user.summary import summarize_analysis, summarize_history
+from app import create_app
+from api.openai_api import serialize_report
+from api.upstream import UpstreamClient
+from bench.fake_openai import StubClient
+import json
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+REPORT = '''1. Code Analysis
+- **Purpose**: Sums the squares of a list. It loops by index.
+- **Issues**:
+  1. Indexes the list instead of iterating
+     - `range(len(values))` is unidiomatic
+  2. Shadows the built-in `sum`
+- **Complexity**: O(n)
+
+2. Optimisation Suggestions
+- Iterate directly
+
+4. Optimised Code
+```python
+def sum_squares(values):
+    return sum(value * value for value in values)
+```
+'''
+
+CODE = 'def sum_squares(values):\n    sum = 0\n    for i in range(len(values)):\n        sum += values[i] ** 2\n    return sum\n'
+
+def test_summarize_analysis_variants():
+    assert summarize_analysis(REPORT.split('\n\n2.')[0]) == ('Sums the squares of a list.', 2)
+    assert summarize_analysis('• Purpose – prints a greeting\n• Issues – None\n• Complexity – O(1)') == ('prints a greeting', 0)
+    assert summarize_analysis('Purpose:\n  Sorts a list.\nIssues: uses bubble sort') == ('Sorts a list.', 1)
+    assert summarize_analysis('The function computes a factorial. It recurses.') == ('The function computes a factorial.', None)
+    assert summarize_analysis(None) == (None, None)
+    assert len(summarize_analysis('Purpose: ' + 'x' * 400)[0]) == 255
+
+def test_summarize_history_counts_lines_and_size():
+    summary = summarize_history('a = 1\nb = 2\n', 'a, b = 1, 2', None)
+    assert summary == {'purpose': None, 'issue_count': None, 'original_lines': 2, 'optimized_lines': 1, 'size_delta': -1}
+
+@pytest.fixture
+def client(monkeypatch):
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
+    message = SimpleNamespace(content=REPORT)
+    completions = SimpleNamespace(create=lambda **kwargs: SimpleNamespace(choices=[SimpleNamespace(message=message)]))
+    monkeypatch.setitem(app.extensions, 'upstream', UpstreamClient(StubClient(completions), max_retries=0))
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            for name in ('result_cache', 'rate_limiter', 'model_router'):
+                app.extensions.pop(name, None)
+            yield client
+            for name in ('result_cache', 'rate_limiter', 'model_router'):
+                app.extensions.pop(name, None)
+            db.session.remove()
+            db.drop_all()
+
+def get_token(client, username="user1"):
+    client.post("/register", json={"username": username, "password": "testpass"})
+    res = client.post("/login", json={"username": username, "password": "testpass"})
+    return json.loads(res.data)["access_token"]
+
+def test_summary_listing_reads_only_the_projection(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    client.post('/optimize', json={'code': CODE, 'language': 'python'}, headers=headers)
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        data = json.loads(client.get('/history?view=summary&limit=10', headers=headers).data)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    item = data['items'][0]
+    assert item['purpose'] == 'Sums the squares of a list.'
+    assert item['issue_count'] == 2
+    assert (item['original_lines'], item['optimized_lines']) == (5, 2)
+    assert item['size_delta'] == len('def sum_squares(values):\n    return sum(value * value for value in values)') - len(CODE)
+    assert not any('code_blobs' in statement or 'report_analysis' in statement for statement in statements)
+
+def test_backfill_summarizes_older_entries(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    history_id = json.loads(client.post('/optimize', json={'code': CODE, 'language': 'python'}, headers=headers).data)['id']
+    # Entries written before summaries and report sections were stored
+    history = db.session.get(CodeHistory, history_id)
+    history.report = {}
+    for name in CodeHistory.SUMMARY_FIELDS:
+        setattr(history, name, None)
+    db.session.commit()
+
+    assert summarize_unsummarized_history(batch_size=1, analysis_of=lambda entry: serialize_report(entry)['analysis']) == 1
+    entry = json.loads(client.get(f'/history/{history_id}', headers=headers).data)
+    assert (entry['purpose'], entry['issue_count'], entry['original_lines']) == ('Sums the squares of a list.', 2, 5)
+    assert summarize_unsummarized_history() == 0
@@ -0,0 +1,115 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import gzip
+from datetime import datetime, timedelta
+from user.models import User, CodeHistory, db
+from api.report import parse_report, report_fields
+from app import create_app
+import json
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+REPORT = "1. Code Analysis\n- **Purpose**: Adds numbers.\n- **Issues**: None\n\n4. Optimised Code\n```python\nx = 1 + 2\n```\n"
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield client
+            app.config['HISTORY_IMPORT_BATCH_SIZE'] = 500
+            db.session.remove()
+            db.drop_all()
+
+def get_token(client, username="user1"):
+    client.post("/register", json={"username": username, "password": "testpass"})
+    res = client.post("/login", json={"username": username, "password": "testpass"})
+    return json.loads(res.data)["access_token"]
+
+def add_history(username, count):
+    user = User.find_by_username(username)
+    db.session.add_all([
+        CodeHistory(user_id=user.id, language='python', original_code=f'x = 1\n# "{i}", ünïcode\n',
+                    optimized_code='x = 1\n', optimization_suggestions=REPORT, report=report_fields(parse_report(REPORT)),
+                    created_at=datetime(2024, 1, 1) + timedelta(hours=i))
+        for i in range(count)
+    ])
+    db.session.commit()
+
+def test_export_streams_ndjson_and_gzip_csv(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    get_token(client, 'user2')
+    add_history('user1', 3)
+    add_history('user2', 1)
+
+    response = client.get('/history/export', headers=headers)
+    assert response.is_streamed and response.mimetype == 'application/x-ndjson'
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [record['original_code'] for record in records] == [f'x = 1\n# "{i}", ünïcode\n' for i in range(3)]
+    assert records[0]['created_at'] == '2024-01-01T00:00:00' and records[0]['purpose'] == 'Adds numbers.'
+
+    response = client.get('/history/export?format=csv', headers=headers)
+    assert response.mimetype == 'application/gzip'
+    assert 'history.csv.gz' in response.headers['Content-Disposition']
+    text = gzip.decompress(response.get_data()).decode('utf-8')
+    assert text.startswith('id,language,created_at,original_code,optimized_code,optimization_suggestions,purpose')
+    assert text.count('ünïcode') == 3
+
+    assert client.get('/history/export?format=xml', headers=headers).status_code == 400
+
+def test_import_round_trips_both_formats_in_batches(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    add_history('user1', 3)
+    ndjson = client.get('/history/export', headers=headers).get_data()
+    csv_gz = client.get('/history/export?format=csv', headers=headers).get_data()
+    app.config['HISTORY_IMPORT_BATCH_SIZE'] = 2
+
+    other = {'Authorization': f'Bearer {get_token(client, "user2")}'}
+    response = client.post('/history/import', data=ndjson, content_type='application/x-ndjson', headers=other)
+    assert json.loads(response.data) == {'imported': 3, 'skipped': 0, 'errors': []}
+    response = client.post('/history/import', data=csv_gz, content_type='application/gzip', headers=other)
+    assert json.loads(response.data)['imported'] == 3
+
+    user2 = User.find_by_username('user2')
+    imported = CodeHistory.query.filter_by(user_id=user2.id).order_by(CodeHistory.id).all()
+    assert len(imported) == 6
+    assert imported[4].original_code == 'x = 1\n# "1", ünïcode\n'
+    assert imported[4].created_at == datetime(2024, 1, 1, 1)
+    assert (imported[4].purpose, imported[4].issue_count) == ('Adds numbers.', 0)
+
+def test_import_skips_invalid_records_and_rejects_unknown_types(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    lines = [
+        json.dumps({'language': 'python', 'original_code': 'print(1)'}),
+        'not json',
+        json.dumps({'language': 'python'}),
+        '',
+        json.dumps({'language': 'python', 'original_code': 'print(2)', 'created_at': 'yesterday'}),
+    ]
+    body = gzip.compress('\n'.join(lines).encode('utf-8'))
+    response = client.post('/history/import', data=body, content_type='application/x-ndjson',
+                           headers={**headers, 'Content-Encoding': 'gzip'})
+    data = json.loads(response.data)
+    assert (data['imported'], data['skipped']) == (1, 3)
+    assert [error['line'] for error in data['errors']] == [2, 3, 5]
+
+    assert client.post('/history/import', data='{}', content_type='application/json', headers=headers).status_code == 415
+    response = client.post('/history/import', data=b'\x1f\x8bbroken', content_type='application/gzip', headers=headers)
+    assert response.status_code == 400
+
+def test_csv_round_trips_entries_larger_than_the_csv_field_limit(client):
+    headers = {'Authorization': f'Bearer {get_token(client)}'}
+    code = 'total = total + 1\n' * 10000  # 180,000 characters, above the csv module's 131,072 default
+    record = json.dumps({'language': 'python', 'original_code': code})
+    assert client.post('/history/import', data=record, content_type='application/x-ndjson', headers=headers).status_code == 200
+    csv_gz = client.get('/history/export?format=csv', headers=headers).get_data()
+
+    other = {'Authorization': f'Bearer {get_token(client, "user2")}'}
+    response = client.post('/history/import', data=csv_gz, content_type='application/gzip', headers=other)
+    assert response.status_code == 200 and json.loads(response.data)['imported'] == 1
+    assert CodeHistory.query.filter_by(user_id=User.find_by_username('user2').id).one().original_code == code
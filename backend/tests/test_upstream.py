@@ -0,0 +1,148 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from user.models import db
+from app import create_app
+from api.upstream import CircuitBreaker, UpstreamUnavailable, create_upstream
+from bench.fake_openai import FakeOpenAIServer
+import json
+import openai
+import time
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+CONTENT = "4. Optimised Code\n```python\nx = 1\n```\n"
+
+@pytest.fixture
+def server():
+    with FakeOpenAIServer(content=CONTENT) as server:
+        yield server
+
+def make_upstream(server, **overrides):
+    config = {
+        'OPENAI_API_KEY': 'test',
+        'OPENAI_BASE_URL': server.base_url,
+        'UPSTREAM_BACKOFF_BASE': 0.01,
+        'UPSTREAM_BACKOFF_MAX': 0.05,
+        'UPSTREAM_DEADLINE': 5,
+    }
+    config.update(overrides)
+    return create_upstream(config)
+
+def complete(upstream, **kwargs):
+    return upstream.create_completion(model='gpt-4.1', messages=[{'role': 'user', 'content': 'x'}], **kwargs)
+
+def test_successful_completion(server):
+    response = complete(make_upstream(server))
+    assert response.choices[0].message.content == CONTENT
+    assert len(server.requests) == 1
+
+def test_rate_limit_honors_retry_after(server):
+    server.script(429, headers={'Retry-After': '0.2'})
+    upstream = make_upstream(server)
+    start = time.monotonic()
+    response = complete(upstream)
+    assert time.monotonic() - start >= 0.2
+    assert response.choices[0].message.content == CONTENT
+    assert len(server.requests) == 2
+    assert upstream.breaker.failures == 0
+
+def test_server_errors_are_retried(server):
+    server.script(500)
+    server.script(503)
+    response = complete(make_upstream(server))
+    assert response.choices[0].message.content == CONTENT
+    assert len(server.requests) == 3
+
+def test_client_errors_are_not_retried(server):
+    server.script(400, body={'error': {'message': 'bad request'}})
+    with pytest.raises(openai.BadRequestError):
+        complete(make_upstream(server))
+    assert len(server.requests) == 1
+
+def test_retries_are_bounded(server):
+    for _ in range(5):
+        server.script(500)
+    with pytest.raises(UpstreamUnavailable):
+        complete(make_upstream(server, UPSTREAM_MAX_RETRIES=2))
+    assert len(server.requests) == 3
+
+def test_breaker_opens_and_fails_fast(server):
+    for _ in range(3):
+        server.script(500)
+    upstream = make_upstream(server, UPSTREAM_MAX_RETRIES=0, UPSTREAM_BREAKER_THRESHOLD=2, UPSTREAM_BREAKER_RESET=60)
+    for _ in range(2):
+        with pytest.raises(UpstreamUnavailable):
+            complete(upstream)
+    assert upstream.breaker.state == 'open'
+    with pytest.raises(UpstreamUnavailable) as error:
+        complete(upstream)
+    assert error.value.retry_after > 0
+    assert len(server.requests) == 2
+
+def test_breaker_half_open_trial_closes_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    time.sleep(0.06)
+    assert breaker.state == 'half-open'
+    breaker.before_call()
+    # Only one trial is let through while half-open
+    with pytest.raises(UpstreamUnavailable):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+
+def test_client_error_during_half_open_closes_circuit(server):
+    server.script(500)
+    server.script(400, body={'error': {'message': 'bad request'}})
+    upstream = make_upstream(server, UPSTREAM_MAX_RETRIES=0, UPSTREAM_BREAKER_THRESHOLD=1, UPSTREAM_BREAKER_RESET=0.05)
+    with pytest.raises(UpstreamUnavailable):
+        complete(upstream)
+    time.sleep(0.06)
+    assert upstream.breaker.state == 'half-open'
+    with pytest.raises(openai.BadRequestError):
+        complete(upstream)
+    assert upstream.breaker.state == 'closed'
+    assert complete(upstream).choices[0].message.content == CONTENT
+
+def test_deadline_bounds_slow_upstream(server):
+    server.latency = 0.5
+    upstream = make_upstream(server, UPSTREAM_DEADLINE=0.2, UPSTREAM_MAX_RETRIES=5)
+    start = time.monotonic()
+    with pytest.raises(UpstreamUnavailable):
+        complete(upstream)
+    assert time.monotonic() - start < 0.5
+
+def test_streaming_through_fake_server(server):
+    chunks = complete(make_upstream(server), stream=True)
+    text = ''.join(chunk.choices[0].delta.content or '' for chunk in chunks)
+    assert text == CONTENT
+
+def test_optimize_returns_503_when_upstream_is_down(server):
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
+    for _ in range(5):
+        server.script(429, headers={'Retry-After': '0.01'})
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            app.extensions.pop('result_cache', None)
+            app.extensions.pop('rate_limiter', None)
+            app.extensions['upstream'] = make_upstream(server, UPSTREAM_MAX_RETRIES=1)
+            try:
+                client.post("/register", json={"username": "user1", "password": "testpass"})
+                res = client.post("/login", json={"username": "user1", "password": "testpass"})
+                token = json.loads(res.data)["access_token"]
+                response = client.post('/optimize', headers={'Authorization': f'Bearer {token}'},
+                    json={'code': 'x=1', 'language': 'python'})
+                assert response.status_code == 503
+                assert response.headers['Retry-After'] == '1'
+            finally:
+                app.extensions.pop('upstream', None)
+                app.extensions.pop('result_cache', None)
+                app.extensions.pop('rate_limiter', None)
+                db.session.remove()
+                db.drop_all()
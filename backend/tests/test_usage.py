@@ -0,0 +1,131 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from user.models import CodeHistory, OptimizationUsage, UsageRollup, db
+from app import create_app
+from api.upstream import UpstreamClient
+from bench.fake_openai import StubClient
+import json
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+RESPONSE = "4. Optimised Code\n```python\nx = 1\n```\n"
+
+class FakeCompletions:
+    """Reports fixed token counts, or none when usage is disabled"""
+    def __init__(self, usage=True):
+        self.usage = usage
+
+    def create(self, **kwargs):
+        message = SimpleNamespace(content=RESPONSE)
+        usage = SimpleNamespace(prompt_tokens=120, completion_tokens=30) if self.usage else None
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+@pytest.fixture
+def client(monkeypatch):
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'dev-jwt-secret'
+    monkeypatch.setitem(app.extensions, 'upstream', UpstreamClient(StubClient(FakeCompletions()), max_retries=0))
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            app.extensions.pop('result_cache', None)
+            app.extensions.pop('rate_limiter', None)
+            yield client
+            app.extensions.pop('result_cache', None)
+            app.extensions.pop('rate_limiter', None)
+            db.session.remove()
+            db.drop_all()
+
+def get_token(client, username="user1"):
+    client.post("/register", json={"username": username, "password": "testpass"})
+    res = client.post("/login", json={"username": username, "password": "testpass"})
+    return json.loads(res.data)["access_token"]
+
+def optimize(client, token, code, language='python'):
+    return client.post('/optimize', json={'code': code, 'language': language}, headers={'Authorization': f'Bearer {token}'})
+
+def test_optimize_records_usage_for_history(client):
+    token = get_token(client)
+    history_id = json.loads(optimize(client, token, 'x=1').data)['id']
+    optimize(client, token, 'x=1')  # Served from the result cache
+
+    usage = OptimizationUsage.query.order_by(OptimizationUsage.id).all()
+    assert [row.cached for row in usage] == [False, True]
+    assert usage[0].history_id == history_id
+    assert (usage[0].prompt_tokens, usage[0].completion_tokens) == (120, 30)
+    assert usage[0].latency_ms is not None and usage[0].model == 'gpt-4.1-mini'
+    assert (usage[1].prompt_tokens, usage[1].completion_tokens, usage[1].latency_ms) == (0, 0, None)
+
+def test_rollups_are_maintained_incrementally(client):
+    token = get_token(client)
+    optimize(client, token, 'x=1')
+    optimize(client, token, 'x=1')
+    optimize(client, token, 'y=2')
+    optimize(client, token, 'let z = 3', language='javascript')
+
+    rollups = {rollup.language: rollup for rollup in UsageRollup.query.all()}
+    assert rollups['python'].requests == 3 and rollups['python'].cached_requests == 1
+    assert rollups['python'].prompt_tokens == 240 and rollups['python'].completion_tokens == 60
+    assert rollups['javascript'].requests == 1
+    assert all(rollup.day == date.today() for rollup in rollups.values())
+
+def test_usage_survives_history_deletion(client):
+    token = get_token(client)
+    history_id = json.loads(optimize(client, token, 'x=1').data)['id']
+    client.delete(f'/history/{history_id}', headers={'Authorization': f'Bearer {token}'})
+    assert db.session.get(CodeHistory, history_id) is None
+    assert UsageRollup.query.one().prompt_tokens == 120
+
+def test_missing_usage_is_estimated(client, monkeypatch):
+    monkeypatch.setitem(app.extensions, 'upstream', UpstreamClient(StubClient(FakeCompletions(usage=False)), max_retries=0))
+    token = get_token(client)
+    optimize(client, token, 'x=1')
+    usage = OptimizationUsage.query.one()
+    assert usage.prompt_tokens > 0 and usage.completion_tokens > 0
+
+def test_batch_counts_repeated_snippets_as_cache_hits(client):
+    token = get_token(client)
+    items = [{'code': 'x=1', 'language': 'python'}, {'code': 'x=1', 'language': 'python'}]
+    client.post('/optimize/batch', json={'items': items}, headers={'Authorization': f'Bearer {token}'})
+    rollup = UsageRollup.query.one()
+    assert (rollup.requests, rollup.cached_requests, rollup.prompt_tokens) == (2, 1, 120)
+
+def test_usage_endpoint_reports_own_rollups(client):
+    token = get_token(client)
+    other = get_token(client, 'user2')
+    optimize(client, token, 'x=1')
+    optimize(client, token, 'x=1')
+    optimize(client, other, 'y=2')
+
+    res = client.get('/usage', headers={'Authorization': f'Bearer {token}'})
+    assert res.status_code == 200
+    data = json.loads(res.data)
+    assert data['to'] == date.today().isoformat()
+    assert len(data['items']) == 1
+    item = data['items'][0]
+    assert (item['requests'], item['cached_requests'], item['total_tokens']) == (2, 1, 150)
+    assert item['avg_latency_ms'] is not None
+    assert data['totals'] == {'requests': 2, 'cached_requests': 1, 'prompt_tokens': 120, 'completion_tokens': 30, 'total_tokens': 150}
+
+def test_usage_endpoint_filters_by_day(client):
+    token = get_token(client)
+    user_id = json.loads(client.get('/profile', headers={'Authorization': f'Bearer {token}'}).data)['id']
+    yesterday = datetime.now() - timedelta(days=1)
+    db.session.add(OptimizationUsage(user_id=user_id, model='gpt-4.1-mini', language='python', prompt_tokens=5, completion_tokens=5, latency_ms=10, created_at=yesterday))
+    db.session.commit()
+    optimize(client, token, 'x=1')
+
+    headers = {'Authorization': f'Bearer {token}'}
+    day = yesterday.date().isoformat()
+    data = json.loads(client.get(f'/usage?from={day}&to={day}', headers=headers).data)
+    assert [item['day'] for item in data['items']] == [day]
+    assert data['totals']['total_tokens'] == 10
+
+    assert client.get('/usage?from=yesterday', headers=headers).status_code == 400
+    assert client.get(f'/usage?from={date.today()}&to={day}', headers=headers).status_code == 400
+    assert client.get('/usage?from=2000-01-01', headers=headers).status_code == 400
@@ -0,0 +1,91 @@
+# Import required modules
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, delete, exists, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+import hashlib
+
+def blob_hash(text):
+    """Return the content address of a text body"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def upsert_blob(connection, blobs, text):
+    """Insert a blob or add a reference to the existing copy, returning its hash"""
+    sha = blob_hash(text)
+    now = datetime.now()
+    values = {'sha256': sha, 'content': text, 'ref_count': 1, 'created_at': now, 'updated_at': now}
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        statement = insert(blobs).values(**values).on_conflict_do_update(
+            index_elements=[blobs.c.sha256],
+            set_={'ref_count': blobs.c.ref_count + 1, 'updated_at': now}
+        )
+        connection.execute(statement)
+    else:
+        # Portable fallback for databases without INSERT ... ON CONFLICT
+        result = connection.execute(
+            update(blobs).where(blobs.c.sha256 == sha).values(ref_count=blobs.c.ref_count + 1, updated_at=now)
+        )
+        if not result.rowcount:
+            connection.execute(blobs.insert().values(**values))
+    return sha
+
+def release_blobs(connection, blobs, shas):
+    """Drop one reference for every hash given; orphaned blobs are removed by the sweeper"""
+    counts = Counter(sha for sha in shas if sha)
+    if not counts:
+        return
+    # One executemany round trip however many entries released the blobs
+    connection.execute(
+        update(blobs)
+        .where(blobs.c.sha256 == bindparam('released_sha'))
+        .values(ref_count=blobs.c.ref_count - bindparam('released'), updated_at=datetime.now()),
+        [{'released_sha': sha, 'released': count} for sha, count in counts.items()]
+    )
+
+def sweep_orphan_blobs(session, blobs, reference_columns, grace_seconds=3600, batch_size=500):
+    """Delete unreferenced blobs in batches, returning the number removed"""
+    # The grace period keeps blobs that a concurrent writer may be about to reference again
+    cutoff = datetime.now() - timedelta(seconds=grace_seconds)
+    referenced = or_(*[exists().where(column == blobs.c.sha256) for column in reference_columns])
+    removed = 0
+    while True:
+        shas = session.execute(
+            select(blobs.c.sha256)
+            .where(blobs.c.ref_count <= 0, blobs.c.updated_at < cutoff, ~referenced)
+            .limit(batch_size)
+        ).scalars().all()
+        if not shas:
+            return removed
+        result = session.execute(delete(blobs).where(blobs.c.sha256.in_(shas), blobs.c.ref_count <= 0))
+        session.commit()
+        removed += result.rowcount
+
+def move_inline_bodies(session, history, blobs, fields, batch_size=500):
+    """Move bodies stored inline on older history rows into the blob store, returning the rows moved"""
+    pk = history.c.id
+    inline = [history.c[name] for name in fields]
+    last_id = 0
+    moved = 0
+    while True:
+        rows = session.execute(
+            select(pk, *inline)
+            .where(pk > last_id, or_(*[column.isnot(None) for column in inline]))
+            .order_by(pk)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return moved
+        connection = session.connection()
+        for row in rows:
+            values = {}
+            for name, text in zip(fields, row[1:]):
+                if text is not None:
+                    values[name + '_sha'] = upsert_blob(connection, blobs, text)
+                    values[name] = None
+            connection.execute(update(history).where(pk == row[0]).values(**values))
+        # Commit each batch so locks are held only briefly
+        session.commit()
+        moved += len(rows)
+        last_id = rows[-1][0]
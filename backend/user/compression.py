@@ -0,0 +1,106 @@
+# Import required modules
+from flask import current_app, has_app_context
+from sqlalchemy import LargeBinary, bindparam, select, type_coerce, update
+from sqlalchemy.types import TypeDecorator
+import zlib
+
+try:
+    import zstandard  # Optional, only needed when HISTORY_COMPRESSION is 'zstd'
+except ImportError:
+    zstandard = None
+
+# One-byte headers identifying how a stored value is encoded; the rest of the value is the payload
+PLAIN_HEADER = b'\x00'  # UTF-8 text
+ZLIB_HEADER = b'\x01'
+ZSTD_HEADER = b'\x02'
+
+# Values shorter than this are stored as-is because compression would not pay off
+MIN_COMPRESS_LENGTH = 256
+
+def get_codec():
+    """Return the configured compression codec ('none', 'zlib' or 'zstd')"""
+    if has_app_context():
+        return current_app.config.get('HISTORY_COMPRESSION', 'none')
+    return 'none'
+
+def compress_text(value, codec):
+    """Encode text for storage using the given codec"""
+    data = value.encode('utf-8')
+    if codec != 'none' and len(value) >= MIN_COMPRESS_LENGTH:
+        if codec == 'zlib':
+            return ZLIB_HEADER + zlib.compress(data, 6)
+        if codec == 'zstd':
+            if zstandard is None:
+                raise RuntimeError('HISTORY_COMPRESSION is zstd but the zstandard package is not installed')
+            return ZSTD_HEADER + zstandard.ZstdCompressor(level=6).compress(data)
+        raise ValueError(f'Unknown compression codec: {codec}')
+    return PLAIN_HEADER + data
+
+def decompress_text(value):
+    """Decode a stored value produced by compress_text"""
+    value = bytes(value)  # Some drivers return bytea as a memoryview
+    header, payload = value[:1], value[1:]
+    if header == ZLIB_HEADER:
+        return zlib.decompress(payload).decode('utf-8')
+    if header == ZSTD_HEADER:
+        if zstandard is None:
+            raise RuntimeError('Stored value is zstd compressed but the zstandard package is not installed')
+        return zstandard.ZstdDecompressor().decompress(payload).decode('utf-8')
+    if header == PLAIN_HEADER:
+        return payload.decode('utf-8')
+    raise ValueError(f'Unknown stored value header: {header!r}')
+
+def is_encoded_with(value, codec):
+    """Check whether a stored value is already encoded the way codec would encode it"""
+    return bytes(value) == compress_text(decompress_text(value), codec)
+
+class CompressedText(TypeDecorator):
+    """Binary column holding text that is transparently compressed when HISTORY_COMPRESSION is enabled
+
+    The header byte of each value names its codec so compressed and plain rows can coexist,
+    which lets existing tables be compressed gradually by the backfill command.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_text(value, get_codec())
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decompress_text(value)
+
+def backfill_compression(session, table, columns, batch_size=500):
+    """Re-encode existing rows with the configured codec in batches, returning the number of rows rewritten"""
+    codec = get_codec()
+    pk = table.primary_key.columns[0]
+    # Read the stored representation directly, bypassing CompressedText decoding
+    stored = [type_coerce(table.c[name], LargeBinary) for name in columns]
+    statement = update(table).where(pk == bindparam('row_id')).values({name: bindparam(name) for name in columns})
+    last_key = None
+    rewritten = 0
+    while True:
+        query = select(pk, *stored).order_by(pk).limit(batch_size)
+        if last_key is not None:
+            query = query.where(pk > last_key)
+        rows = session.execute(query).all()
+        if not rows:
+            return rewritten
+        updates = []
+        for row in rows:
+            values = dict(zip(columns, row[1:]))
+            if all(value is None or is_encoded_with(value, codec) for value in values.values()):
+                continue
+            # Plain values are re-encoded by CompressedText when the update is bound
+            params = {name: None if value is None else decompress_text(value) for name, value in values.items()}
+            params['row_id'] = row[0]
+            updates.append(params)
+        if updates:
+            session.execute(statement, updates)
+            rewritten += len(updates)
+        # Commit each batch so locks are held only briefly
+        session.commit()
+        last_key = rows[-1][0]
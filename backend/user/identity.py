@@ -0,0 +1,95 @@
+# Import required modules
+from collections import OrderedDict, namedtuple
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from .models import User, db
+import threading
+import time
+
+# Immutable copy of the user fields that request handlers need, safe to share between sessions and threads
+UserSnapshot = namedtuple('UserSnapshot', ['id', 'username', 'created_at', 'tier'])
+
+class UserCache:
+    """Process-wide LRU cache of user snapshots with a short TTL"""
+
+    def __init__(self, ttl=30, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # user id -> (expires_at, snapshot)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Return the cached snapshot for user_id, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, snapshot = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return snapshot
+
+    def set(self, user_id, snapshot):
+        """Store a snapshot, evicting the least recently used entries beyond max_entries"""
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, snapshot)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        """Forget the cached snapshot of one user"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        """Forget every cached snapshot"""
+        with self._lock:
+            self._entries.clear()
+
+def get_user_cache():
+    """Return the user cache for the current application, creating it on first use"""
+    cache = current_app.extensions.get('user_cache')
+    if cache is None:
+        cache = UserCache(
+            ttl=current_app.config.get('USER_CACHE_TTL', 30),
+            max_entries=current_app.config.get('USER_CACHE_MAX_ENTRIES', 10000)
+        )
+        current_app.extensions['user_cache'] = cache
+    return cache
+
+def load_user(identity):
+    """Resolve a JWT identity to a UserSnapshot, or None if the user does not exist
+
+    flask_jwt_extended keeps the result for the rest of the request, so this
+    runs at most once per request; the process cache spares the database
+    lookup across requests.
+    """
+    try:
+        user_id = int(identity)
+    except (TypeError, ValueError):
+        return None
+    cache = get_user_cache()
+    snapshot = cache.get(user_id)
+    if snapshot is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        snapshot = UserSnapshot(user.id, user.username, user.created_at, user.tier)
+        cache.set(user_id, snapshot)
+    return snapshot
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_cached_user(mapper, connection, target):
+    """Drop a changed or deleted user from this process's cache; other processes catch up within the TTL"""
+    if has_app_context() and 'user_cache' in current_app.extensions:
+        current_app.extensions['user_cache'].invalidate(target.id)
+
+@event.listens_for(User.__table__, 'after_create')
+def clear_cached_users(target, connection, **kw):
+    """A newly created users table reuses ids, so no cached snapshot is valid any more"""
+    if has_app_context() and 'user_cache' in current_app.extensions:
+        current_app.extensions['user_cache'].clear()
@@ -0,0 +1,24 @@
+# Import required modules
+from user.models import db
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+def start_periodic_task(app, name, interval, task):
+    """Run task inside an application context every interval seconds on a daemon thread"""
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            with app.app_context():
+                try:
+                    task()
+                except Exception:
+                    logger.exception('Periodic task %s failed', name)
+                finally:
+                    db.session.remove()
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return stop
@@ -0,0 +1,234 @@
+# Import required modules
+from contextlib import contextmanager
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import bisect
+import threading
+import time
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Upper bounds of the SQL statements per request histogram buckets
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+def format_value(value):
+    """Format a sample value the way Prometheus expects"""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def format_labels(names, values):
+    """Format label pairs as {name="value",...}, escaping the values"""
+    if not names:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+class Counter:
+    """Monotonic counter with one value per combination of label values"""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}  # label values -> count
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        """Yield the (name, label names, label values, value) samples of the counter"""
+        with self._lock:
+            values = dict(self.values)
+        for labels, value in sorted(values.items()):
+            yield self.name, self.labels, labels, value
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, with one series per combination of label values"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [count per bucket plus +Inf, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        """Yield the cumulative bucket, sum and count samples of every series"""
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self.series.items()}
+        names = self.labels + ('le',)
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', names, labels + (format_value(bound),), cumulative
+            yield f'{self.name}_sum', self.labels, labels, total
+            yield f'{self.name}_count', self.labels, labels, cumulative
+
+class MetricsRegistry:
+    """Request, SQL and upstream metrics of one process, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self.requests = Counter('http_requests_total', 'Requests handled', ['method', 'route', 'status'])
+        self.request_duration = Histogram('http_request_duration_seconds', 'Time to handle a request', ['method', 'route'])
+        self.phase_duration = Histogram('http_request_phase_duration_seconds', 'Time spent in each phase of a request', ['route', 'phase'])
+        self.queries = Histogram('db_queries_per_request', 'SQL statements run by a request', ['route'], QUERY_COUNT_BUCKETS)
+        self.query_duration = Histogram('db_query_duration_seconds', 'Time to run one SQL statement of a request', ['route'])
+        self.upstream_duration = Histogram('upstream_request_duration_seconds', 'Time of one model API attempt', ['model', 'outcome'])
+
+    def metrics(self):
+        return [
+            self.requests, self.request_duration, self.phase_duration,
+            self.queries, self.query_duration, self.upstream_duration,
+        ]
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, label_names, label_values, value in metric.samples():
+                lines.append(f'{name}{format_labels(label_names, label_values)} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+def get_metrics():
+    """Return the metrics registry for the current application, creating it on first use"""
+    metrics = current_app.extensions.get('metrics')
+    if metrics is None:
+        metrics = MetricsRegistry()
+        current_app.extensions['metrics'] = metrics
+    return metrics
+
+class RequestTimer:
+    """Phase timings and SQL statement durations of the request being handled"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last_checkpoint = self.started
+        self.phases = {}  # phase -> seconds, in the order the phases were first recorded
+        self.query_durations = []
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def checkpoint(self, phase):
+        """Attribute the time since the request started, or since the previous checkpoint, to a phase"""
+        now = time.perf_counter()
+        self.add(phase, now - self.last_checkpoint)
+        self.last_checkpoint = now
+
+def current_timer():
+    """Return the timer of the request being handled on this thread, or None outside instrumented requests"""
+    return g.get('request_timer') if has_request_context() else None
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to a phase of the current request; a no-op outside requests"""
+    timer = current_timer()
+    if timer is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(phase, time.perf_counter() - started)
+
+def checkpoint(phase):
+    """Attribute the time since the request started, or since the previous checkpoint, to a phase"""
+    timer = current_timer()
+    if timer is not None:
+        timer.checkpoint(phase)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    """Note when a statement run by an instrumented request starts"""
+    if current_timer() is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    """Record the duration of a statement run by an instrumented request"""
+    started = conn.info.get('query_started')
+    timer = current_timer()
+    if started and timer is not None:
+        timer.query_durations.append(time.perf_counter() - started.pop())
+
+@event.listens_for(Engine, 'handle_error')
+def discard_query_timer(exception_context):
+    """Forget the start time of a statement that failed"""
+    connection = exception_context.connection
+    started = connection.info.get('query_started') if connection is not None else None
+    if started:
+        started.pop()
+
+def format_server_timing(timer, total):
+    """Build a Server-Timing header value from a request's phases, its SQL statements and its total time"""
+    entries = [f'{phase};dur={seconds * 1000:.1f}' for phase, seconds in timer.phases.items()]
+    if timer.query_durations:
+        entries.append(f'db;dur={sum(timer.query_durations) * 1000:.1f};desc="{len(timer.query_durations)} queries"')
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+def start_request_timer():
+    """Start timing the request, and sampling its stack when the profiler is enabled"""
+    g.request_timer = RequestTimer()
+    profiler = current_app.extensions.get('profiler')
+    if profiler is not None:
+        profiler.start_request()
+
+def record_request_metrics(response):
+    """Record the request's metrics and report its phases in the Server-Timing header
+
+    Streamed responses are timed up to the start of the stream.
+    """
+    timer = current_timer()
+    if timer is None:
+        return response
+    total = time.perf_counter() - timer.started
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics = get_metrics()
+    metrics.requests.inc((request.method, route, str(response.status_code)))
+    metrics.request_duration.observe(total, (request.method, route))
+    for phase, seconds in timer.phases.items():
+        metrics.phase_duration.observe(seconds, (route, phase))
+    metrics.queries.observe(len(timer.query_durations), (route,))
+    for seconds in timer.query_durations:
+        metrics.query_duration.observe(seconds, (route,))
+    profiler = current_app.extensions.get('profiler')
+    if profiler is not None:
+        profiler.finish_request(total, f'{request.method} {route}', response.status_code)
+    response.headers['Server-Timing'] = format_server_timing(timer, total)
+    return response
+
+def metrics_endpoint():
+    """Expose this process's metrics to Prometheus"""
+    return Response(get_metrics().render(), mimetype='text/plain; version=0.0.4')
+
+def init_metrics(app):
+    """Instrument every request of an application and serve its metrics at /metrics"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    app.before_request(start_request_timer)
+    app.after_request(record_request_metrics)
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
@@ -1,12 +1,26 @@
 # Import required modules
 from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
-from datetime import datetime
+from flask import current_app, has_app_context
+from sqlalchemy import delete, event, exists, func, inspect, select
+from sqlalchemy.orm import selectinload, undefer_group
+from datetime import datetime, timedelta
+from .compression import CompressedText
+from .blobs import release_blobs, upsert_blob
+from .usage import add_to_rollup
+from .similarity import index_code, similar_history_ids, unindex_history
+from .search import clear_text_index, create_search_index, drop_search_index, index_text, unindex_text
+from .summary import PURPOSE_MAX_LENGTH, summarize_history
+from .passwords import get_password_hasher
 
-# Initialize Bcrypt for password hashing and SQLAlchemy for database operations
-bcrypt = Bcrypt()
+# Initialize SQLAlchemy for database operations
 db = SQLAlchemy()
 
+# Maximum length of the stored history preview
+PREVIEW_MAX_LENGTH = 255
+
+# Deleted entries whose index rows are removed per statement, keeping IN lists short
+DELETE_BATCH_SIZE = 500
+
 class User(db.Model):
     """User model for storing user information and authentication"""
     __tablename__ = 'users'
@@ -16,6 +30,7 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)  # Unique username
     password = db.Column(db.String(255), nullable=False)  # Hashed password
     created_at = db.Column(db.DateTime, default=datetime.now)  # Account creation timestamp
+    tier = db.Column(db.String(20), nullable=False, default='standard', server_default='standard')  # Service tier used by model routing
 
     def save(self):
         """Save the user object to the database"""
@@ -24,17 +39,51 @@ class User(db.Model):
 
     def set_password(self, password):
         """Hash and set the user's password"""
-        self.password = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password = get_password_hasher().hash(password)
 
     def check_password(self, password):
         """Verify if the provided password matches the stored hash"""
-        return bcrypt.check_password_hash(self.password, password)
+        return get_password_hasher().check(self.password, password)
+
+    def password_needs_rehash(self):
+        """Check whether the stored hash uses a different bcrypt cost than configured"""
+        return get_password_hasher().needs_rehash(self.password)
 
     @classmethod
     def find_by_username(cls, username):
         """Find a user by their username"""
         return cls.query.filter_by(username=username).first()
 
+class CodeBlob(db.Model):
+    """Model for storing each distinct code or suggestion text once, shared by history entries"""
+    __tablename__ = 'code_blobs'
+
+    # Code blob table columns
+    sha256 = db.Column(db.String(64), primary_key=True)  # Content address of the text
+    content = db.Column(CompressedText, nullable=False)  # Text body, optionally compressed
+    ref_count = db.Column(db.Integer, nullable=False, default=0)  # Number of history fields pointing here
+    created_at = db.Column(db.DateTime, default=datetime.now)  # Time the blob was first stored
+    updated_at = db.Column(db.DateTime, default=datetime.now)  # Time the reference count last changed
+
+def body_property(name):
+    """Expose a history body stored in the blob store, or inline for older rows, as a text attribute"""
+    def getter(self):
+        bodies = self.__dict__.get('_pending_bodies', {})
+        if name in bodies:
+            return bodies[name]
+        inline = getattr(self, '_' + name)
+        if inline is not None:
+            return inline
+        blob = getattr(self, name + '_blob')
+        return blob.content if blob is not None else None
+
+    def setter(self, value):
+        if inspect(self).persistent:
+            raise AttributeError('History bodies cannot be changed once saved')
+        self.__dict__.setdefault('_pending_bodies', {})[name] = value
+
+    return property(getter, setter)
+
 class CodeHistory(db.Model):
     """Model for storing code optimization history"""
     __tablename__ = 'code_history'
@@ -42,15 +91,89 @@ class CodeHistory(db.Model):
     # Code history table columns
     id = db.Column(db.Integer, primary_key=True)  # Primary key
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # Foreign key to User
-    original_code = db.Column(db.Text, nullable=False)  # Original code submitted
-    optimized_code = db.Column(db.Text, nullable=False)  # Optimized code generated
-    optimization_suggestions = db.Column(db.Text, nullable=False)  # Suggestions for optimization
+    # Bodies live in code_blobs; the inline columns only hold rows written before the blob store existed
+    _original_code = db.deferred(db.Column('original_code', CompressedText), group='body')  # Original code submitted
+    _optimized_code = db.deferred(db.Column('optimized_code', CompressedText), group='body')  # Optimized code generated
+    _optimization_suggestions = db.deferred(db.Column('optimization_suggestions', CompressedText), group='body')  # Suggestions for optimization
+    original_code_sha = db.Column(db.String(64), db.ForeignKey('code_blobs.sha256'), index=True)  # Blob holding original_code
+    optimized_code_sha = db.Column(db.String(64), db.ForeignKey('code_blobs.sha256'), index=True)  # Blob holding optimized_code
+    optimization_suggestions_sha = db.Column(db.String(64), db.ForeignKey('code_blobs.sha256'), index=True)  # Blob holding optimization_suggestions
     language = db.Column(db.String(50), nullable=False)  # Programming language used
     created_at = db.Column(db.DateTime, default=datetime.now)  # Timestamp of optimization using local time
+    preview = db.Column(db.String(PREVIEW_MAX_LENGTH))  # Uncompressed excerpt of original_code for listings
+    # Prose sections of optimization_suggestions, split out when the entry is written; None for older rows
+    report_analysis = db.deferred(db.Column(CompressedText), group='body')  # Code Analysis section
+    report_suggestions = db.deferred(db.Column(CompressedText), group='body')  # Optimisation Suggestions section
+    report_changes = db.deferred(db.Column(CompressedText), group='body')  # Changes Made section
+    report_explanation = db.deferred(db.Column(CompressedText), group='body')  # Detailed Explanation section
+    # Listing summary computed when the entry is written, so listings never read the bodies; None for older rows
+    purpose = db.Column(db.String(PURPOSE_MAX_LENGTH))  # Purpose sentence of the Code Analysis section
+    issue_count = db.Column(db.Integer)  # Issues listed in the Code Analysis section
+    original_lines = db.Column(db.Integer)  # Lines of original_code
+    optimized_lines = db.Column(db.Integer)  # Lines of optimized_code
+    size_delta = db.Column(db.Integer)  # Characters in optimized_code minus those in original_code
+
+    # Index serving per-user history listings, newest first, with id as the keyset tie-breaker
+    __table_args__ = (
+        db.Index('ix_code_history_user_id_created_at_id', user_id, created_at.desc(), id),
+    )
 
     # Relationship with User model
     user = db.relationship('User', backref=db.backref('history', lazy=True))
 
+    # Relationships with the shared blobs, loaded only when a body is read
+    original_code_blob = db.relationship('CodeBlob', foreign_keys=[original_code_sha])
+    optimized_code_blob = db.relationship('CodeBlob', foreign_keys=[optimized_code_sha])
+    optimization_suggestions_blob = db.relationship('CodeBlob', foreign_keys=[optimization_suggestions_sha])
+
+    # Token accounting of the model calls behind this entry; rows outlive the entry so spend is never lost
+    usage = db.relationship('OptimizationUsage', backref='history', passive_deletes=True)
+
+    # Text bodies, read from the blob store or the legacy inline columns
+    original_code = body_property('original_code')
+    optimized_code = body_property('optimized_code')
+    optimization_suggestions = body_property('optimization_suggestions')
+
+    BODY_FIELDS = ('original_code', 'optimized_code', 'optimization_suggestions')
+    REPORT_FIELDS = ('analysis', 'suggestions', 'changes', 'explanation')
+    SUMMARY_FIELDS = ('purpose', 'issue_count', 'original_lines', 'optimized_lines', 'size_delta')
+
+    @property
+    def report(self):
+        """Prose sections of the report keyed by field name"""
+        return {name: getattr(self, 'report_' + name) for name in self.REPORT_FIELDS}
+
+    @report.setter
+    def report(self, sections):
+        for name in self.REPORT_FIELDS:
+            setattr(self, 'report_' + name, sections.get(name))
+
+    def summarize(self, analysis=None):
+        """Compute the listing summary from the bodies and the Code Analysis section (report_analysis by default)"""
+        summary = summarize_history(self.original_code, self.optimized_code, analysis or self.report_analysis)
+        for name in self.SUMMARY_FIELDS:
+            setattr(self, name, summary[name])
+
+    @classmethod
+    def body_options(cls):
+        """Loader options that fetch every body up front for queries serializing many rows"""
+        return [
+            undefer_group('body'),
+            selectinload(cls.original_code_blob),
+            selectinload(cls.optimized_code_blob),
+            selectinload(cls.optimization_suggestions_blob),
+        ]
+
+    @classmethod
+    def find_similar(cls, user_id, language, code, threshold, limit=5, max_candidates=200):
+        """Return (entry, similarity) pairs for the user's entries whose code is at least threshold similar to code"""
+        matches = similar_history_ids(
+            db.session.connection(), CodeSignature.__table__, CodeSignatureBand.__table__,
+            user_id, language, code, threshold, limit, max_candidates
+        )
+        entries = {entry.id: entry for entry in cls.query.filter(cls.id.in_([history_id for history_id, _ in matches]))}
+        return [(entries[history_id], similarity) for history_id, similarity in matches if history_id in entries]
+
     def save(self):
         """Save the code history entry to the database"""
         db.session.add(self)
@@ -60,3 +183,310 @@ class CodeHistory(db.Model):
         """Delete the code history entry from the database"""
         db.session.delete(self)
         db.session.commit()
+
+@event.listens_for(CodeHistory, 'before_insert')
+def prepare_history_insert(mapper, connection, target):
+    """Move new bodies into the blob store and record a short plain-text preview and the listing summary"""
+    bodies = target.__dict__.get('_pending_bodies', {})
+    for name in CodeHistory.BODY_FIELDS:
+        if bodies.get(name) is not None:
+            setattr(target, name + '_sha', upsert_blob(connection, CodeBlob.__table__, bodies[name]))
+    if target.preview is None and target.original_code is not None:
+        length = current_app.config.get('HISTORY_PREVIEW_CHARS', 120) if has_app_context() else 120
+        target.preview = target.original_code[:min(length, PREVIEW_MAX_LENGTH)]
+    if target.original_lines is None:
+        target.summarize()
+
+@event.listens_for(CodeHistory, 'before_delete')
+def release_history_blobs(mapper, connection, target):
+    """Drop the references a deleted history entry held on its blobs"""
+    release_blobs(connection, CodeBlob.__table__, [getattr(target, name + '_sha') for name in CodeHistory.BODY_FIELDS])
+
+@event.listens_for(CodeHistory, 'after_insert')
+def index_history(mapper, connection, target):
+    """Add a new history entry to the near-duplicate and full-text search indexes"""
+    add_to_indexes(connection, target)
+
+@event.listens_for(CodeHistory, 'before_delete')
+def unindex_history_entry(mapper, connection, target):
+    """Remove a deleted history entry from the near-duplicate and full-text search indexes"""
+    unindex_history(connection, CodeSignature.__table__, CodeSignatureBand.__table__, [target.id])
+    unindex_text(connection, HistorySearch.__table__, [target.id], load_search_texts)
+
+def add_to_indexes(connection, entry, similarity=True, search=True):
+    """Index the code of a history entry for near-duplicate search and its code and report for full-text search"""
+    if similarity and entry.original_code is not None:
+        index_code(connection, CodeSignature.__table__, CodeSignatureBand.__table__, entry.id, entry.user_id, entry.language, entry.original_code)
+    if search:
+        index_text(connection, HistorySearch.__table__, entry.id, entry.user_id, entry.original_code, entry.optimization_suggestions)
+
+def searchable_texts(connection, rows):
+    """Map history ids to their (code, suggestions) from (id, inline code, inline suggestions, code sha, suggestions sha) rows"""
+    blobs = CodeBlob.__table__
+    shas = {sha for row in rows for sha in row[3:] if sha is not None}
+    contents = dict(connection.execute(select(blobs.c.sha256, blobs.c.content).where(blobs.c.sha256.in_(shas))).all()) if shas else {}
+    return {
+        row[0]: (row[1] if row[1] is not None else contents.get(row[3]), row[2] if row[2] is not None else contents.get(row[4]))
+        for row in rows
+    }
+
+def search_text_columns(history):
+    """Columns of code_history that searchable_texts reads, inline bodies first as the body properties prefer them"""
+    return [history.c.id, history.c.original_code, history.c.optimization_suggestions,
+            history.c.original_code_sha, history.c.optimization_suggestions_sha]
+
+def load_search_texts(connection, history_ids):
+    """Read the code and report of history entries, as they were indexed for full-text search"""
+    history = CodeHistory.__table__
+    rows = connection.execute(select(*search_text_columns(history)).where(history.c.id.in_(history_ids))).all()
+    return searchable_texts(connection, rows)
+
+class CodeSignature(db.Model):
+    """Model for the MinHash signature of each history entry's code, used to find near-duplicate submissions"""
+    __tablename__ = 'code_signatures'
+
+    # Code signature table columns
+    history_id = db.Column(db.Integer, db.ForeignKey('code_history.id', ondelete='CASCADE'), primary_key=True)  # Indexed history entry
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # Owner of the history entry
+    language = db.Column(db.String(50), nullable=False)  # Programming language used
+    signature = db.Column(db.LargeBinary, nullable=False)  # Packed MinHash values of the code's token shingles
+
+class CodeSignatureBand(db.Model):
+    """Model for the locality-sensitive hash buckets a history entry's signature falls into"""
+    __tablename__ = 'code_signature_bands'
+
+    # Code signature band table columns
+    history_id = db.Column(db.Integer, db.ForeignKey('code_history.id', ondelete='CASCADE'), primary_key=True)  # Indexed history entry
+    band_key = db.Column(db.BigInteger, primary_key=True)  # Hash of one band of the signature and the language
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # Owner of the history entry
+
+    # Index serving bucket lookups within one user's history
+    __table_args__ = (
+        db.Index('ix_code_signature_bands_user_id_band_key', user_id, band_key),
+    )
+
+class HistorySearch(db.Model):
+    """Model for the history entries in the full-text index; the text itself stays in the blob store"""
+    __tablename__ = 'history_search'
+
+    # History search table columns; the full-text index itself is created by create_search_index
+    history_id = db.Column(db.Integer, db.ForeignKey('code_history.id', ondelete='CASCADE'), primary_key=True)  # Indexed history entry
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)  # Owner of the history entry
+
+@event.listens_for(HistorySearch.__table__, 'after_create')
+def create_history_search_index(target, connection, **kw):
+    """Create the full-text index with the table, e.g. in db.create_all()"""
+    create_search_index(connection)
+
+@event.listens_for(HistorySearch.__table__, 'before_drop')
+def drop_history_search_index(target, connection, **kw):
+    """Drop the full-text index along with the table"""
+    drop_search_index(connection)
+
+def clear_search_index():
+    """Empty the full-text index so index_unindexed_history rebuilds it"""
+    clear_text_index(db.session.connection(), HistorySearch.__table__)
+
+def index_unindexed_history(batch_size=500):
+    """Add history entries written before the near-duplicate or search index existed to them, returning the number indexed"""
+    missing_signature = ~exists().where(CodeSignature.history_id == CodeHistory.id)
+    missing_text = ~exists().where(HistorySearch.history_id == CodeHistory.id)
+    indexed = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.session.query(CodeHistory, missing_signature, missing_text)
+            .options(*CodeHistory.body_options())
+            .filter(CodeHistory.id > last_id, missing_signature | missing_text)
+            .order_by(CodeHistory.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return indexed
+        connection = db.session.connection()
+        for entry, similarity, search in rows:
+            add_to_indexes(connection, entry, similarity, search)
+        db.session.commit()
+        indexed += len(rows)
+        last_id = rows[-1][0].id
+
+def summarize_unsummarized_history(batch_size=500, analysis_of=None):
+    """Compute the listing summary of history entries written before it was stored, returning the number summarized
+
+    analysis_of(entry) may supply the Code Analysis section of entries
+    saved before report sections were stored.
+    """
+    summarized = 0
+    last_id = 0
+    while True:
+        entries = (
+            CodeHistory.query
+            .options(*CodeHistory.body_options())
+            .filter(CodeHistory.id > last_id, CodeHistory.original_lines.is_(None))
+            .order_by(CodeHistory.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not entries:
+            return summarized
+        for entry in entries:
+            entry.summarize(analysis_of(entry) if analysis_of else None)
+        db.session.commit()
+        summarized += len(entries)
+        last_id = entries[-1].id
+
+def delete_history_entries(*criteria):
+    """Delete the history entries matching criteria with set-based statements, returning the number deleted
+
+    Bulk deletes bypass the before_delete listeners, so the blob references
+    and index rows of the entries are released here. Only rows this statement
+    actually deleted are released, so overlapping deletes never release a
+    blob twice. The caller commits.
+    """
+    history = CodeHistory.__table__
+    shas = [history.c[name + '_sha'] for name in CodeHistory.BODY_FIELDS]
+    # The searchable text comes back too, as SQLite needs it to drop the entries from the full-text index
+    columns = search_text_columns(history) + shas
+    connection = db.session.connection()
+    if connection.dialect.delete_returning:
+        # The delete takes the write locks and reports the rows it removed in one statement
+        rows = connection.execute(delete(history).where(*criteria).returning(*columns)).all()
+    else:
+        # Lock the rows first so a concurrent delete waits and then finds them gone
+        rows = connection.execute(select(*columns).where(*criteria).with_for_update()).all()
+        if rows:
+            connection.execute(delete(history).where(history.c.id.in_([row[0] for row in rows])))
+
+    def load_returned_texts(connection, history_ids):
+        """Read the searchable text of deleted entries from the returned rows, as the entries are gone"""
+        wanted = set(history_ids)
+        return searchable_texts(connection, [row for row in rows if row[0] in wanted])
+
+    for start in range(0, len(rows), DELETE_BATCH_SIZE):
+        batch = rows[start:start + DELETE_BATCH_SIZE]
+        ids = [row[0] for row in batch]
+        release_blobs(connection, CodeBlob.__table__, [sha for row in batch for sha in row[-len(shas):]])
+        unindex_history(connection, CodeSignature.__table__, CodeSignatureBand.__table__, ids)
+        unindex_text(connection, HistorySearch.__table__, ids, load_returned_texts)
+    return len(rows)
+
+def purge_history(max_rows=0, max_age_days=0, batch_size=500):
+    """Delete each user's entries beyond the newest max_rows or older than max_age_days, returning the number deleted
+
+    A limit of 0 disables it. Entries are deleted in batches of batch_size,
+    each in its own transaction, so locks are held only briefly.
+    """
+    rules = []
+    if max_age_days > 0:
+        cutoff = datetime.now() - timedelta(days=max_age_days)
+        rules.append(select(CodeHistory.id).where(CodeHistory.created_at < cutoff))
+    if max_rows > 0:
+        position = func.row_number().over(
+            partition_by=CodeHistory.user_id,
+            order_by=(CodeHistory.created_at.desc(), CodeHistory.id.desc())
+        )
+        ranked = select(CodeHistory.id, position.label('position')).subquery()
+        rules.append(select(ranked.c.id).where(ranked.c.position > max_rows))
+    purged = 0
+    for rule in rules:
+        while True:
+            ids = db.session.execute(rule.limit(batch_size)).scalars().all()
+            if not ids:
+                break
+            purged += delete_history_entries(CodeHistory.id.in_(ids))
+            db.session.commit()
+    return purged
+
+class OptimizationUsage(db.Model):
+    """Model for recording the tokens and latency of each optimization"""
+    __tablename__ = 'optimization_usage'
+
+    # Optimization usage table columns
+    id = db.Column(db.Integer, primary_key=True)  # Primary key
+    history_id = db.Column(db.Integer, db.ForeignKey('code_history.id', ondelete='SET NULL'), index=True)  # History entry the call produced
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # Foreign key to User
+    model = db.Column(db.String(50), nullable=False)  # Model that produced the result
+    language = db.Column(db.String(50), nullable=False)  # Programming language used
+    cached = db.Column(db.Boolean, nullable=False, default=False)  # Whether the result came from the result cache
+    prompt_tokens = db.Column(db.Integer, nullable=False, default=0)  # Tokens sent to the model
+    completion_tokens = db.Column(db.Integer, nullable=False, default=0)  # Tokens generated by the model
+    latency_ms = db.Column(db.Integer)  # Duration of the upstream call, None for cache hits
+    created_at = db.Column(db.DateTime, default=datetime.now)  # Time the optimization finished
+
+class UsageRollup(db.Model):
+    """Model for per-user daily usage totals, kept up to date as usage rows are inserted"""
+    __tablename__ = 'usage_daily'
+
+    # Usage rollup table columns
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)  # Foreign key to User
+    day = db.Column(db.Date, primary_key=True)  # Local date of the optimizations
+    model = db.Column(db.String(50), primary_key=True)  # Model that produced the results
+    language = db.Column(db.String(50), primary_key=True)  # Programming language used
+    requests = db.Column(db.Integer, nullable=False, default=0)  # Optimizations, including cache hits
+    cached_requests = db.Column(db.Integer, nullable=False, default=0)  # Optimizations served from the result cache
+    prompt_tokens = db.Column(db.BigInteger, nullable=False, default=0)  # Tokens sent to the model
+    completion_tokens = db.Column(db.BigInteger, nullable=False, default=0)  # Tokens generated by the model
+    latency_ms = db.Column(db.BigInteger, nullable=False, default=0)  # Summed duration of the upstream calls
+
+    ROLLUP_FIELDS = ('requests', 'cached_requests', 'prompt_tokens', 'completion_tokens', 'latency_ms')
+
+@event.listens_for(OptimizationUsage, 'after_insert')
+def roll_up_usage(mapper, connection, target):
+    """Add a new usage row to its daily rollup in the same transaction"""
+    key = {
+        'user_id': target.user_id,
+        'day': (target.created_at or datetime.now()).date(),
+        'model': target.model,
+        'language': target.language,
+    }
+    add_to_rollup(connection, UsageRollup.__table__, key, {
+        'requests': 1,
+        'cached_requests': int(bool(target.cached)),
+        'prompt_tokens': target.prompt_tokens or 0,
+        'completion_tokens': target.completion_tokens or 0,
+        'latency_ms': target.latency_ms or 0,
+    })
+
+class CachedResult(db.Model):
+    """Model for sharing cached optimization results between processes"""
+    __tablename__ = 'cached_results'
+
+    # Cached result table columns
+    key = db.Column(db.String(64), primary_key=True)  # Content-addressed cache key
+    value = db.Column(db.Text, nullable=False)  # JSON encoded optimization result
+    created_at = db.Column(db.DateTime, default=datetime.now)  # Time the result was cached
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # Time after which the entry is stale
+
+class OptimizationJob(db.Model):
+    """Model for tracking queued code optimization requests"""
+    __tablename__ = 'optimization_jobs'
+
+    # Optimization job table columns
+    id = db.Column(db.String(32), primary_key=True)  # Random job identifier returned to the client
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)  # Foreign key to User
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, succeeded or failed
+    code = db.Column(db.Text, nullable=False)  # Code submitted for optimization
+    language = db.Column(db.String(50), nullable=False)  # Programming language used
+    history_id = db.Column(db.Integer, db.ForeignKey('code_history.id', ondelete='SET NULL'))  # Resulting history entry
+    cached = db.Column(db.Boolean, nullable=False, default=False)  # Whether the result came from the result cache
+    error = db.Column(db.Text)  # Error message for failed jobs
+    created_at = db.Column(db.DateTime, default=datetime.now)  # Time the job was queued
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)  # Time of the last status change
+
+    # Relationship with CodeHistory model
+    history = db.relationship('CodeHistory')
+
+    def save(self):
+        """Save the job to the database"""
+        db.session.add(self)
+        db.session.commit()
+
+class RateLimitBucket(db.Model):
+    """Model for token buckets shared between processes by the SQL rate limiter"""
+    __tablename__ = 'rate_limit_buckets'
+
+    # Rate limit bucket table columns
+    key = db.Column(db.String(100), primary_key=True)  # Bucket name, e.g. user:42:requests
+    tokens = db.Column(db.Float, nullable=False)  # Budget left at the time of the last update
+    updated_at = db.Column(db.Float, nullable=False)  # Unix time of the last update, used to refill the bucket
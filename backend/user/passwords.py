@@ -0,0 +1,95 @@
+# Import required modules
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app
+import bcrypt
+import multiprocessing
+import threading
+
+class HasherBusy(Exception):
+    """Raised when too many password hashes are already waiting for the process pool"""
+
+def hash_password(password, rounds):
+    """Hash a password with bcrypt at the given cost"""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def verify_password(password, hashed):
+    """Check a password against a bcrypt hash"""
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+def hash_rounds(hashed):
+    """Return the cost factor a bcrypt hash was created with, e.g. 12 for $2b$12$..."""
+    try:
+        return int(hashed.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+class PasswordHasher:
+    """Runs bcrypt at the configured cost, in a bounded process pool when workers > 0"""
+
+    def __init__(self, rounds=12, workers=2, max_pending=64, wait=5.0):
+        self.rounds = rounds
+        self.workers = workers
+        self.wait = wait
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def hash(self, password):
+        """Hash a password at the configured cost"""
+        return self._run(hash_password, password, self.rounds)
+
+    def check(self, hashed, password):
+        """Check a password against a stored hash"""
+        return self._run(verify_password, password, hashed)
+
+    def needs_rehash(self, hashed):
+        """Check whether a stored hash was created with a different cost than the configured one"""
+        return hash_rounds(hashed) != self.rounds
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def _run(self, function, *args):
+        if not self.workers:
+            return function(*args)
+        if not self._slots.acquire(timeout=self.wait):
+            raise HasherBusy('Too many password checks in progress, try again later')
+        try:
+            try:
+                return self._get_executor().submit(function, *args).result()
+            except BrokenProcessPool:
+                # A worker died (e.g. killed by the OOM killer); start a fresh pool and try once more
+                self._reset_executor()
+                return self._get_executor().submit(function, *args).result()
+        finally:
+            self._slots.release()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Spawned workers do not inherit the locks of this multi-threaded process
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _reset_executor(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+def get_password_hasher():
+    """Return the password hasher for the current application, creating it on first use"""
+    hasher = current_app.extensions.get('password_hasher')
+    if hasher is None:
+        hasher = PasswordHasher(
+            rounds=current_app.config.get('BCRYPT_LOG_ROUNDS', 12),
+            workers=current_app.config.get('BCRYPT_WORKERS', 2),
+            max_pending=current_app.config.get('BCRYPT_MAX_PENDING', 64),
+            wait=current_app.config.get('BCRYPT_QUEUE_WAIT', 5)
+        )
+        current_app.extensions['password_hasher'] = hasher
+    return hasher
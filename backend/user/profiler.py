@@ -0,0 +1,117 @@
+# Import required modules
+from collections import Counter
+from datetime import datetime, timezone
+from flask import current_app, jsonify, request, Response
+import heapq
+import hmac
+import itertools
+import os
+import sys
+import threading
+import time
+
+def collapse_stack(frame):
+    """Format a stack as one line of collapsed frames, outermost first, as flamegraph tools read them"""
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(frames))
+
+class SamplingProfiler:
+    """Statistical profiler keeping the stack samples of the slowest requests
+
+    A background thread wakes every interval seconds while requests are in
+    flight and records the stack of every thread handling one; it sleeps on
+    an event while the process is idle. Requests slower than
+    min_duration keep their samples as collapsed stacks, and only the
+    max_profiles slowest are kept, so the cost does not grow with traffic.
+    """
+
+    def __init__(self, interval=0.005, min_duration=0.5, max_profiles=20):
+        self.interval = interval
+        self.min_duration = min_duration
+        self.max_profiles = max_profiles
+        self._active = {}  # thread id -> Counter of collapsed stacks of the request it is handling
+        self._slowest = []  # Min-heap of (duration, sequence, profile)
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._busy = threading.Event()  # Set while _active is not empty
+        self._thread = None
+
+    def start_request(self):
+        """Start sampling the calling thread, starting the sampler thread on first use"""
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+            self._busy.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample_forever, name='request-profiler', daemon=True)
+                self._thread.start()
+
+    def finish_request(self, duration, name, status):
+        """Stop sampling the calling thread, keeping its profile if it is among the slowest requests"""
+        with self._lock:
+            stacks = self._active.pop(threading.get_ident(), None)
+            if not self._active:
+                self._busy.clear()
+            if not stacks or duration < self.min_duration:
+                return
+            profile = {
+                'request': name,
+                'status': status,
+                'duration_ms': round(duration * 1000, 1),
+                'finished_at': datetime.now(timezone.utc).isoformat(),
+                'samples': sum(stacks.values()),
+                'stacks': stacks,
+            }
+            entry = (duration, next(self._sequence), profile)
+            if len(self._slowest) < self.max_profiles:
+                heapq.heappush(self._slowest, entry)
+            elif duration > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def _sample_forever(self):
+        while True:
+            self._busy.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, stacks in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[collapse_stack(frame)] += 1
+
+    def profiles(self):
+        """Return the kept profiles, slowest first"""
+        with self._lock:
+            return [profile for _, _, profile in sorted(self._slowest, key=lambda entry: (-entry[0], entry[1]))]
+
+def folded_stacks(profile):
+    """Format a profile as collapsed stack lines, rooted at a frame naming the request"""
+    root = f'{profile["request"]} {profile["duration_ms"]:.0f}ms'
+    return ''.join(f'{root};{stack} {count}\n' for stack, count in sorted(profile['stacks'].items()))
+
+def profiles_endpoint():
+    """List the slowest profiled requests, or all their stacks in the collapsed format with ?format=folded"""
+    # Stacks reveal the code and timings of other users' requests, so only holders of the admin token may read them
+    token = current_app.config.get('PROFILER_TOKEN')
+    if not token:
+        return jsonify({'message': 'Set PROFILER_TOKEN to read profiles'}), 403
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'message': 'Missing or invalid profiler token'}), 401
+    profiles = current_app.extensions['profiler'].profiles()
+    if request.args.get('format') == 'folded':
+        return Response(''.join(folded_stacks(profile) for profile in profiles), mimetype='text/plain')
+    return jsonify({'profiles': [dict(profile, stacks=folded_stacks(profile)) for profile in profiles]})
+
+def init_profiler(app):
+    """Sample the stacks of an application's requests and serve the slowest at /metrics/profiles, when enabled"""
+    if not (app.config.get('PROFILER_ENABLED', False) and app.config.get('METRICS_ENABLED', True)):
+        return
+    app.extensions['profiler'] = SamplingProfiler(
+        interval=app.config.get('PROFILER_INTERVAL', 0.005),
+        min_duration=app.config.get('PROFILER_MIN_DURATION', 0.5),
+        max_profiles=app.config.get('PROFILER_MAX_PROFILES', 20)
+    )
+    app.add_url_rule('/metrics/profiles', 'profiles', profiles_endpoint)
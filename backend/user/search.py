@@ -0,0 +1,229 @@
+# Import required modules
+from collections import namedtuple
+from sqlalchemy import ARRAY, DateTime, Float, Integer, Text, bindparam, delete, select, text
+import html
+import re
+import unicodedata
+
+# Full-text index objects created by migrations 0010 and 0012 outside the ORM metadata: the tsvector column and its
+# GIN index on PostgreSQL, and the FTS5 table (plus the shadow tables FTS5 keeps its data in) on SQLite
+SEARCH_VECTOR_COLUMN = 'document'
+SEARCH_VECTOR_INDEX = 'ix_history_search_document'
+FTS_TABLE = 'history_search_fts'
+
+# Text search configuration; 'simple' neither stems nor drops stop words, which suits identifiers in code
+TEXT_SEARCH_CONFIG = 'simple'
+
+# Markers placed around matched terms in snippets, replaced by <mark> tags once the snippet is escaped
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+# Words of context around the matches in each snippet
+SNIPPET_WORDS = 16
+
+# Words the user searches for; everything else in the query is ignored
+QUERY_TERM = re.compile(r'\w+')
+
+def include_search_index(name, type_, parent_names):
+    """Hide the full-text index objects from autogenerate, which cannot express them"""
+    if type_ == 'table':
+        return not name.startswith(FTS_TABLE)
+    if type_ == 'column':
+        return not (parent_names.get('table_name') == 'history_search' and name == SEARCH_VECTOR_COLUMN)
+    if type_ == 'index':
+        return name != SEARCH_VECTOR_INDEX
+    return True
+
+def query_terms(query):
+    """Split a search query into the terms every result must contain"""
+    return QUERY_TERM.findall(query or '')
+
+def index_text(connection, documents, history_id, user_id, code, suggestions):
+    """Add a history entry's code and report to the full-text index; only the index is stored, never the text"""
+    code, suggestions = code or '', suggestions or ''
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text(POSTGRESQL_INDEX_ENTRY), {
+            'history_id': history_id, 'user_id': user_id, 'code': code, 'suggestions': suggestions
+        })
+        return
+    connection.execute(documents.insert().values(history_id=history_id, user_id=user_id))
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(f'INSERT INTO {FTS_TABLE}(rowid, code, suggestions) VALUES (:history_id, :code, :suggestions)'), {
+            'history_id': history_id, 'code': code, 'suggestions': suggestions
+        })
+
+def unindex_text(connection, documents, history_ids, load_texts):
+    """Remove history entries from the search index
+
+    A contentless FTS5 table can only forget a row given the text it was
+    indexed with, so on SQLite load_texts(connection, ids) must return the
+    {id: (code, suggestions)} of the entries, read before their blobs go.
+    """
+    if connection.dialect.name == 'sqlite':
+        # Entries never indexed, e.g. ones older than the index, must not be subtracted from it
+        indexed = connection.execute(select(documents.c.history_id).where(documents.c.history_id.in_(history_ids))).scalars().all()
+        if indexed:
+            connection.execute(text(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, code, suggestions) VALUES ('delete', :history_id, :code, :suggestions)"
+            ), [
+                {'history_id': history_id, 'code': code or '', 'suggestions': suggestions or ''}
+                for history_id, (code, suggestions) in load_texts(connection, indexed).items()
+            ])
+    connection.execute(delete(documents).where(documents.c.history_id.in_(history_ids)))
+
+def clear_text_index(connection, documents):
+    """Remove every entry from the search index, e.g. before rebuilding it"""
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')"))
+    connection.execute(delete(documents))
+
+# Stores the weighted tsvector of an entry, code weighted above the report
+POSTGRESQL_INDEX_ENTRY = f'''
+INSERT INTO history_search (history_id, user_id, {SEARCH_VECTOR_COLUMN})
+VALUES (:history_id, :user_id,
+        setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', :code), 'A') || setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', :suggestions), 'B'))
+'''
+
+POSTGRESQL_SEARCH = f'''
+SELECT h.id, h.language, h.created_at, h.preview, ts_rank_cd(s.{SEARCH_VECTOR_COLUMN}, q.query) AS score
+FROM history_search s
+JOIN code_history h ON h.id = s.history_id,
+     plainto_tsquery('{TEXT_SEARCH_CONFIG}', :query) AS q(query)
+WHERE s.user_id = :user_id AND s.{SEARCH_VECTOR_COLUMN} @@ q.query
+ORDER BY score DESC, h.id DESC
+LIMIT :limit OFFSET :offset
+'''
+
+# Headlines of the returned page only, from the bodies read out of the blob store
+POSTGRESQL_HEADLINES = f'''
+SELECT t.id,
+       ts_headline('{TEXT_SEARCH_CONFIG}', t.code, q.query, :headline_options) AS code_snippet,
+       ts_headline('{TEXT_SEARCH_CONFIG}', t.suggestions, q.query, :headline_options) AS suggestions_snippet
+FROM unnest(:ids, :codes, :suggestions) AS t(id, code, suggestions),
+     plainto_tsquery('{TEXT_SEARCH_CONFIG}', :query) AS q(query)
+'''
+
+# bm25() is lower for better matches; code counts twice as much as the report
+SQLITE_SEARCH = f'''
+SELECT h.id, h.language, h.created_at, h.preview, -bm25({FTS_TABLE}, 2.0, 1.0) AS score
+FROM {FTS_TABLE}
+JOIN history_search s ON s.history_id = {FTS_TABLE}.rowid
+JOIN code_history h ON h.id = s.history_id
+WHERE {FTS_TABLE} MATCH :query AND s.user_id = :user_id
+ORDER BY score DESC, h.id DESC
+LIMIT :limit OFFSET :offset
+'''
+
+class SearchUnavailable(Exception):
+    """Raised when the database has no full-text index to search"""
+
+# One ranked search result with the highlighted snippets of its code and report
+SearchResult = namedtuple('SearchResult', 'id language created_at preview score code_snippet suggestions_snippet')
+
+def search_history(connection, user_id, terms, limit, offset, load_texts):
+    """Rank a user's history entries containing every term, returning SearchResult rows with highlighted snippets
+
+    The index holds no text, so the snippets are cut from the bodies of the
+    returned page, read with load_texts(connection, ids).
+    """
+    params = {'user_id': user_id, 'limit': limit, 'offset': offset}
+    if connection.dialect.name == 'postgresql':
+        statement = text(POSTGRESQL_SEARCH)
+        params['query'] = ' '.join(terms)
+    elif connection.dialect.name == 'sqlite':
+        statement = text(SQLITE_SEARCH)
+        # Quoted terms keep FTS5 from reading words such as AND or NEAR as operators
+        params['query'] = ' '.join(f'"{term}"' for term in terms)
+    else:
+        raise SearchUnavailable(f'Full-text search is not supported on {connection.dialect.name}')
+    rows = connection.execute(statement.columns(created_at=DateTime, score=Float), params).all()
+    if not rows:
+        return []
+
+    texts = load_texts(connection, [row.id for row in rows])
+    if connection.dialect.name == 'postgresql':
+        ids = list(texts)
+        statement = text(POSTGRESQL_HEADLINES).bindparams(
+            bindparam('ids', type_=ARRAY(Integer)), bindparam('codes', type_=ARRAY(Text)), bindparam('suggestions', type_=ARRAY(Text))
+        )
+        snippets = {row.id: (row.code_snippet, row.suggestions_snippet) for row in connection.execute(statement, {
+            'ids': ids,
+            'codes': [texts[history_id][0] or '' for history_id in ids],
+            'suggestions': [texts[history_id][1] or '' for history_id in ids],
+            'query': params['query'],
+            'headline_options': f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords={SNIPPET_WORDS}, MinWords=5, MaxFragments=2',
+        })}
+    else:
+        snippets = {
+            history_id: (snippet(code, terms), snippet(suggestions, terms))
+            for history_id, (code, suggestions) in texts.items()
+        }
+    return [SearchResult(*row, *snippets.get(row.id, (None, None))) for row in rows]
+
+def fold(word):
+    """Compare words as the FTS5 unicode61 tokenizer does, ignoring case and diacritics"""
+    decomposed = unicodedata.normalize('NFKD', word.casefold())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+def snippet(body, terms):
+    """Cut the SNIPPET_WORDS words of a body that contain the most terms, marking each match
+
+    Mirrors FTS5's snippet(), which needs the indexed text and so is not
+    available on a contentless table.
+    """
+    if not body:
+        return None
+    words = list(QUERY_TERM.finditer(body))
+    wanted = {fold(term) for term in terms}
+    matches = {i for i, word in enumerate(words) if fold(word.group()) in wanted}
+    if not matches:
+        return None
+
+    def window(match):
+        # A few words before the match give it context, as in FTS5's snippets
+        start = max(0, min(match - SNIPPET_WORDS // 4, len(words) - SNIPPET_WORDS))
+        return start, min(len(words), start + SNIPPET_WORDS)
+
+    def coverage(match):
+        start, end = window(match)
+        return len({fold(words[i].group()) for i in matches if start <= i < end})
+
+    start, end = window(max(matches, key=coverage))
+    parts = ['' if start == 0 else '…']
+    position = 0 if start == 0 else words[start].start()
+    for i in range(start, end):
+        if i in matches:
+            parts += [body[position:words[i].start()], HIGHLIGHT_START, words[i].group(), HIGHLIGHT_END]
+            position = words[i].end()
+    parts.append(body[position:] if end == len(words) else body[position:words[end - 1].end()] + '…')
+    return ''.join(parts)
+
+def highlight(snippet):
+    """Escape a snippet for HTML and wrap the matched terms in <mark> tags"""
+    if not snippet or HIGHLIGHT_START not in snippet:
+        return None
+    return html.escape(snippet).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+
+# DDL of the SQLite full-text index: a contentless FTS5 table, which keeps the index but not the text
+SQLITE_INDEX_DDL = [
+    f'''CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        code, suggestions, content='', tokenize="unicode61 tokenchars '_'"
+    )''',
+]
+
+# DDL of the PostgreSQL full-text index: a tsvector column filled by index_text and a GIN index over it
+POSTGRESQL_INDEX_DDL = [
+    f'ALTER TABLE history_search ADD COLUMN {SEARCH_VECTOR_COLUMN} tsvector NOT NULL',
+    f'CREATE INDEX {SEARCH_VECTOR_INDEX} ON history_search USING gin ({SEARCH_VECTOR_COLUMN})',
+]
+
+def create_search_index(connection):
+    """Create the full-text index over history_search for the connection's database"""
+    statements = {'postgresql': POSTGRESQL_INDEX_DDL, 'sqlite': SQLITE_INDEX_DDL}.get(connection.dialect.name, [])
+    for statement in statements:
+        connection.execute(text(statement))
+
+def drop_search_index(connection):
+    """Drop the full-text index over history_search"""
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(f'DROP TABLE IF EXISTS {FTS_TABLE}'))
@@ -0,0 +1,128 @@
+# Import required modules
+from sqlalchemy import delete, select
+import hashlib
+import re
+import struct
+
+# Tokens per shingle; one edited token changes at most this many shingles
+SHINGLE_SIZE = 5
+
+# MinHash slots per signature, split into BANDS bands of SIGNATURE_SIZE // BANDS slots for LSH lookups.
+# 16 bands of 8 find most pairs above ~0.7 Jaccard similarity; changing either needs 'flask index-history --rebuild'
+SIGNATURE_SIZE = 128
+BANDS = 16
+ROWS_PER_BAND = SIGNATURE_SIZE // BANDS
+
+# Comments, which are dropped, and the tokens kept, by language family
+STRING_LITERALS = r'"(?:\\.|[^"\\\n])*"' + r"|'(?:\\.|[^'\\\n])*'"
+PYTHON_TOKENS = re.compile(r'(#[^\n]*)|(""".*?(?:"""|\Z)' + r"|'''.*?(?:'''|\Z)|" + STRING_LITERALS + r'|\w+|\S)', re.DOTALL)
+C_STYLE_TOKENS = re.compile(r'(//[^\n]*|/\*.*?(?:\*/|\Z))|(' + STRING_LITERALS + r'|`(?:\\.|[^`\\])*`|\w+|\S)', re.DOTALL)
+
+# Odd multiplier spreading a borrowed slot value by its distance (rotation densification)
+DENSIFY_STEP = 0x9E3779B1
+
+def tokenize(code, language):
+    """Split code into tokens, ignoring comments and whitespace"""
+    pattern = PYTHON_TOKENS if (language or '').lower() == 'python' else C_STYLE_TOKENS
+    return [match.group(2) for match in pattern.finditer(code) if match.group(2)]
+
+def shingle_hashes(code, language):
+    """Return the 64-bit hashes of the distinct runs of SHINGLE_SIZE consecutive tokens"""
+    tokens = tokenize(code, language)
+    if not tokens:
+        return set()
+    width = min(SHINGLE_SIZE, len(tokens))
+    return {
+        int.from_bytes(hashlib.blake2b('\x00'.join(tokens[i:i + width]).encode('utf-8'), digest_size=8).digest(), 'little')
+        for i in range(len(tokens) - width + 1)
+    }
+
+def minhash(hashes):
+    """Build a MinHash signature with one permutation hashing, in one pass over the shingles
+
+    Each shingle lands in one of SIGNATURE_SIZE slots and every slot keeps
+    its smallest value. Slots no shingle landed in borrow the value of the
+    next filled slot, so short snippets still get a full signature.
+    """
+    if not hashes:
+        return None
+    slots = [None] * SIGNATURE_SIZE
+    for value in hashes:
+        slot = value % SIGNATURE_SIZE
+        value = (value // SIGNATURE_SIZE) & 0xFFFFFFFF
+        if slots[slot] is None or value < slots[slot]:
+            slots[slot] = value
+    values = list(slots)
+    for slot in range(SIGNATURE_SIZE):
+        distance = 1
+        while slots[slot] is None and slots[(slot + distance) % SIGNATURE_SIZE] is None:
+            distance += 1
+        if slots[slot] is None:
+            values[slot] = (slots[(slot + distance) % SIGNATURE_SIZE] + distance * DENSIFY_STEP) & 0xFFFFFFFF
+    return values
+
+def signature(code, language):
+    """Return the MinHash signature of code, or None if it has no tokens"""
+    return minhash(shingle_hashes(code, language))
+
+def pack_signature(values):
+    """Encode a signature for storage"""
+    return struct.pack(f'<{SIGNATURE_SIZE}I', *values)
+
+def unpack_signature(data):
+    """Decode a stored signature"""
+    return struct.unpack(f'<{SIGNATURE_SIZE}I', data)
+
+def band_keys(values, language):
+    """Hash every band of a signature, with the language, into a signed 64-bit lookup key"""
+    keys = []
+    for band in range(BANDS):
+        rows = values[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        material = struct.pack(f'<H{ROWS_PER_BAND}I', band, *rows) + (language or '').lower().encode('utf-8')
+        keys.append(int.from_bytes(hashlib.blake2b(material, digest_size=8).digest(), 'little', signed=True))
+    return keys
+
+def estimate_similarity(first, second):
+    """Estimate the Jaccard similarity of two shingle sets from their signatures"""
+    return sum(a == b for a, b in zip(first, second)) / SIGNATURE_SIZE
+
+def index_code(connection, signatures, bands, history_id, user_id, language, code):
+    """Add a history entry's code to the similarity index"""
+    values = signature(code, language)
+    if values is None:
+        return
+    connection.execute(signatures.insert().values(
+        history_id=history_id, user_id=user_id, language=language, signature=pack_signature(values)
+    ))
+    connection.execute(bands.insert(), [
+        {'history_id': history_id, 'user_id': user_id, 'band_key': key} for key in band_keys(values, language)
+    ])
+
+def unindex_history(connection, signatures, bands, history_ids):
+    """Remove history entries from the similarity index"""
+    connection.execute(delete(bands).where(bands.c.history_id.in_(history_ids)))
+    connection.execute(delete(signatures).where(signatures.c.history_id.in_(history_ids)))
+
+def similar_history_ids(connection, signatures, bands, user_id, language, code, threshold, limit=5, max_candidates=200):
+    """Find a user's history entries whose code is at least threshold similar to code
+
+    Only entries sharing a band with the code are compared, so the cost
+    depends on the number of near matches rather than the size of the
+    history. Returns (history_id, similarity) pairs, most similar first.
+    """
+    values = signature(code, language)
+    if values is None:
+        return []
+    candidates = (
+        select(bands.c.history_id)
+        .where(bands.c.user_id == user_id, bands.c.band_key.in_(band_keys(values, language)))
+        .distinct()
+        .limit(max_candidates)
+    )
+    rows = connection.execute(
+        select(signatures.c.history_id, signatures.c.signature).where(signatures.c.history_id.in_(candidates))
+    ).all()
+    matches = [(history_id, estimate_similarity(values, unpack_signature(data))) for history_id, data in rows]
+    matches = [match for match in matches if match[1] >= threshold]
+    matches.sort(key=lambda match: (-match[1], -match[0]))
+    return matches[:limit]
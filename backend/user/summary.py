@@ -0,0 +1,85 @@
+# Import required modules
+import re
+
+# Maximum length of the stored purpose sentence
+PURPOSE_MAX_LENGTH = 255
+
+# Labelled items of the Code Analysis section, e.g. '• Purpose – adds numbers' or '- **Issues**:'
+ANALYSIS_LABEL = re.compile(
+    r'\s*(?:[-*•]\s+)?(?:\*\*|__)?\s*(Purpose|Issues|Complexity)\s*(?:\*\*|__)?\s*[:–—-]?\s*(?:\*\*|__)?\s*(.*)',
+    re.IGNORECASE
+)
+
+# Bullet or numbered list item, capturing its indentation
+LIST_ITEM = re.compile(r'(\s*)(?:[-*•]|\d+[.)])\s+\S')
+
+# Inline answers meaning the code has no issues
+NO_ISSUES = re.compile(r'(?:none|no\b|n/a|nothing)', re.IGNORECASE)
+
+# End of the first sentence: a full stop, question or exclamation mark followed by whitespace
+SENTENCE_END = re.compile(r'(?<=[.!?])\s')
+
+def plain_text(text):
+    """Strip list markers and emphasis from a line of Markdown"""
+    text = re.sub(r'^\s*(?:[-*•]|\d+[.)])\s+', '', text)
+    return re.sub(r'\*\*|__|`', '', text).strip()
+
+def first_sentence(text):
+    """Return the first sentence of a line, cut to PURPOSE_MAX_LENGTH"""
+    sentence = SENTENCE_END.split(plain_text(text), 1)[0]
+    if len(sentence) > PURPOSE_MAX_LENGTH:
+        sentence = sentence[:PURPOSE_MAX_LENGTH - 1].rstrip() + '…'
+    return sentence or None
+
+def count_issues(text, lines):
+    """Count the items of the Issues list: the list items at its outermost level, or one for an inline issue"""
+    indents = [len(match.group(1)) for match in map(LIST_ITEM.match, lines) if match]
+    if indents:
+        return indents.count(min(indents))
+    if not text or NO_ISSUES.match(plain_text(text)):
+        return 0
+    return 1
+
+def summarize_analysis(analysis):
+    """Return the purpose sentence and the number of issues named in a Code Analysis section
+
+    The purpose falls back to the first line of the section when it has no
+    Purpose item; the issue count is None when the section lists no Issues.
+    """
+    if not analysis:
+        return None, None
+    purpose = None
+    issues = None  # (inline text, following lines) of the Issues item
+    current = None
+    for line in analysis.splitlines():
+        label = ANALYSIS_LABEL.fullmatch(line)
+        if label:
+            current = label.group(1).lower()
+            if current == 'purpose' and purpose is None:
+                purpose = label.group(2)
+            elif current == 'issues' and issues is None:
+                issues = (label.group(2), [])
+            continue
+        if current == 'purpose' and not purpose and line.strip():
+            purpose = line
+        elif current == 'issues' and issues is not None:
+            issues[1].append(line)
+    if purpose is None:
+        purpose = next((line for line in analysis.splitlines() if plain_text(line)), '')
+    issue_count = count_issues(*issues) if issues is not None else None
+    return first_sentence(purpose), issue_count
+
+def count_lines(text):
+    """Count the lines of a text, 0 for an empty one"""
+    return len(text.splitlines()) if text else 0
+
+def summarize_history(original_code, optimized_code, analysis):
+    """Build the summary fields of a history entry shown in listings"""
+    purpose, issue_count = summarize_analysis(analysis)
+    return {
+        'purpose': purpose,
+        'issue_count': issue_count,
+        'original_lines': count_lines(original_code),
+        'optimized_lines': count_lines(optimized_code),
+        'size_delta': len(optimized_code or '') - len(original_code or ''),
+    }
@@ -0,0 +1,22 @@
+# Import required modules
+from sqlalchemy import and_, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+def add_to_rollup(connection, rollups, key, counts):
+    """Add counts to the rollup row identified by key, creating the row on first use"""
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        statement = insert(rollups).values(**key, **counts).on_conflict_do_update(
+            index_elements=[rollups.c[name] for name in key],
+            set_={name: rollups.c[name] + value for name, value in counts.items()}
+        )
+        connection.execute(statement)
+    else:
+        # Portable fallback for databases without INSERT ... ON CONFLICT
+        match = and_(*[rollups.c[name] == value for name, value in key.items()])
+        result = connection.execute(
+            update(rollups).where(match).values({name: rollups.c[name] + value for name, value in counts.items()})
+        )
+        if not result.rowcount:
+            connection.execute(rollups.insert().values(**key, **counts))
@@ -1,7 +1,9 @@
 # Import required modules
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, jwt_required, get_current_user
+from .metrics import timed
 from .models import User, db
+from .passwords import HasherBusy
 from datetime import timedelta
 import sqlalchemy.exc
 
@@ -12,7 +14,8 @@ auth_bp = Blueprint('auth', __name__)
 def register():
     """Register a new user"""
     try:
-        data = request.get_json()
+        with timed('parse'):
+            data = request.get_json()
         
         # Validate request data
         if not data or 'username' not in data or 'password' not in data:
@@ -32,10 +35,12 @@ def register():
         
         # Create and save new user
         user = User(username=data['username'])
-        user.set_password(data['password'])
+        with timed('password'):
+            user.set_password(data['password'])
         
         try:
-            user.save()
+            with timed('commit'):
+                user.save()
         except sqlalchemy.exc.IntegrityError:
             db.session.rollback()
             return jsonify({'message': 'Username already exists'}), 400
@@ -45,6 +50,8 @@ def register():
         
         return jsonify({'message': 'User created successfully'}), 201
         
+    except HasherBusy as e:
+        return jsonify({'message': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'message': f'Server error: {str(e)}'}), 500
 
@@ -52,7 +59,8 @@ def register():
 def login():
     """Authenticate user and return JWT token"""
     try:
-        data = request.get_json()
+        with timed('parse'):
+            data = request.get_json()
         
         # Validate request data
         if not data or 'username' not in data or 'password' not in data:
@@ -61,9 +69,19 @@ def login():
         # Find user and verify password
         user = User.find_by_username(data['username'])
         
-        if not user or not user.check_password(data['password']):
+        with timed('password'):
+            valid = user is not None and user.check_password(data['password'])
+        if not valid:
             return jsonify({'message': 'Invalid username or password'}), 401
         
+        # Upgrade hashes created with a different cost while the plain password is at hand
+        if user.password_needs_rehash():
+            try:
+                user.set_password(data['password'])
+                user.save()
+            except Exception:
+                db.session.rollback()  # The login still succeeds; the rehash is retried next time
+        
         try:
             # Create and return JWT token with extended expiration
             access_token = create_access_token(
@@ -83,33 +101,29 @@ def login():
         except Exception as e:
             return jsonify({'message': f'Token generation error: {str(e)}'}), 500
             
+    except HasherBusy as e:
+        return jsonify({'message': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'message': f'Server error: {str(e)}'}), 500
 
 @auth_bp.route('/profile', methods=['GET'])
+@auth_bp.route('/user', methods=['GET'])
 @jwt_required()
 def profile():
     """Get current user's profile information"""
     try:
-        current_user_id = int(get_jwt_identity())
-        user = db.session.get(User, current_user_id)
-        
-        if not user:
-            return jsonify({'message': 'User not found'}), 404
+        # Resolved from the token by the user lookup loader, usually without touching the database
+        user = get_current_user()
         
-        return jsonify({
+        response = jsonify({
             'id': user.id,
             'username': user.username,
             'created_at': user.created_at.isoformat()
-        }), 200
+        })
+        # Let clients revalidate with If-None-Match and get an empty 304 when nothing changed
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.add_etag()
+        return response.make_conditional(request)
         
-    except ValueError:
-        return jsonify({'message': 'Invalid user ID'}), 400
     except Exception as e:
         return jsonify({'message': f'Server error: {str(e)}'}), 500
-
-@auth_bp.route('/user', methods=['GET'])
-@jwt_required()
-def get_user_info():
-    """Alias for profile endpoint"""
-    return profile()
@@ -0,0 +1,12 @@
+# Production entry point, served by several worker processes:
+#
+#     gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Each worker builds its own application, database pool and upstream client.
+from app import create_app
+from api.jobs import start_job_recovery
+
+app = create_app()
+
+# Resume jobs left queued by restarted workers or a full queue without waiting for a job request
+start_job_recovery(app)
@@ -1,13 +1,16 @@
 import React from 'react';
-import { List, IconButton, Paper } from '@mui/material';
+import { Button, List, IconButton, Paper } from '@mui/material';
 import DeleteIcon from '@mui/icons-material/Delete';
 import KeyboardArrowDownIcon from '@mui/icons-material/KeyboardArrowDown';
 import KeyboardArrowUpIcon from '@mui/icons-material/KeyboardArrowUp';
+import { codeService } from '../services/api';
 
 // History component for displaying code optimization history
-const History = ({ history, onDelete }) => {
+const History = ({ history, onDelete, onLoadMore }) => {
   // State for tracking which history item is expanded
   const [expandedId, setExpandedId] = React.useState(null);
+  // Full entries fetched when an item is first expanded, keyed by id
+  const [details, setDetails] = React.useState({});
 
   // Format date string to a readable format
   const formatDate = (dateString) => {
@@ -31,9 +34,30 @@ const History = ({ history, onDelete }) => {
       .trim();
   };
 
-  // Toggle expansion state of a history item
-  const handleExpand = (id) => {
+  // Describe the stored summary of an entry, e.g. "3 issues · 12 → 9 lines · -140 chars"
+  const formatSummary = (item) => {
+    const parts = [];
+    if (item.issue_count !== null && item.issue_count !== undefined) {
+      parts.push(`${item.issue_count} ${item.issue_count === 1 ? 'issue' : 'issues'}`);
+    }
+    if (item.original_lines !== null && item.original_lines !== undefined) {
+      parts.push(`${item.original_lines} → ${item.optimized_lines} lines`);
+      parts.push(`${item.size_delta > 0 ? '+' : ''}${item.size_delta} chars`);
+    }
+    return parts.join(' · ');
+  };
+
+  // Toggle expansion state of a history item, fetching its full entry the first time
+  const handleExpand = async (id) => {
     setExpandedId(expandedId === id ? null : id);
+    if (expandedId !== id && !details[id]) {
+      try {
+        const response = await codeService.getHistoryEntry(id);
+        setDetails((loaded) => ({ ...loaded, [id]: response.data }));
+      } catch (error) {
+        console.error('Error loading history entry:', error);
+      }
+    }
   };
 
   return (
@@ -121,6 +145,17 @@ const History = ({ history, onDelete }) => {
                   }
                 </div>
               </div>
+              {/* Purpose and summary of the optimization */}
+              {item.purpose && (
+                <div style={{ color: '#1a2a3a', fontSize: '14px', fontWeight: 500, marginBottom: '4px' }}>
+                  {item.purpose}
+                </div>
+              )}
+              {formatSummary(item) && (
+                <div style={{ color: '#666', fontSize: '12px', marginBottom: '8px' }}>
+                  {formatSummary(item)}
+                </div>
+              )}
               {/* Code preview */}
               <div style={{
                 fontFamily: "'Fira Code', monospace",
@@ -131,12 +166,17 @@ const History = ({ history, onDelete }) => {
                 borderRadius: '4px',
                 whiteSpace: 'pre-wrap'
               }}>
-                {cleanText(item.original_code)}
+                {cleanText(item.preview || '')}
               </div>
             </div>
 
             {/* Expanded content section */}
-            {expandedId === item.id && (
+            {expandedId === item.id && !details[item.id] && (
+              <div style={{ padding: '16px', backgroundColor: '#fff', color: '#666', fontSize: '13px' }}>
+                Loading...
+              </div>
+            )}
+            {expandedId === item.id && details[item.id] && (
               <div style={{ padding: '16px', backgroundColor: '#fff' }}>
                 <div style={{ display: 'flex', flexDirection: 'column', gap: '20px' }}>
                   {/* Original code section */}
@@ -164,7 +204,7 @@ const History = ({ history, onDelete }) => {
                         lineHeight: 1.5,
                         color: '#0066cc'
                       }}>
-                        {cleanText(item.original_code)}
+                        {cleanText(details[item.id].original_code)}
                       </pre>
                     </Paper>
                   </div>
@@ -194,7 +234,7 @@ const History = ({ history, onDelete }) => {
                         color: '#1a2a3a',
                         whiteSpace: 'pre-wrap'
                       }}>
-                        {cleanText(item.optimization_suggestions)}
+                        {cleanText(details[item.id].optimization_suggestions)}
                       </pre>
                     </Paper>
                   </div>
@@ -223,7 +263,7 @@ const History = ({ history, onDelete }) => {
                         lineHeight: 1.5,
                         color: '#0066cc'
                       }}>
-                        {cleanText(item.optimized_code)}
+                        {cleanText(details[item.id].optimized_code)}
                       </pre>
                     </Paper>
                   </div>
@@ -233,6 +273,12 @@ const History = ({ history, onDelete }) => {
           </Paper>
         ))}
       </List>
+      {/* Next page of older entries */}
+      {onLoadMore && (
+        <Button onClick={onLoadMore} size="small" sx={{ mt: 1 }}>
+          Load more
+        </Button>
+      )}
     </div>
   );
 };
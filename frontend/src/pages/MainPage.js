@@ -10,6 +10,7 @@ const MainPage = () => {
   const [language, setLanguage] = useState("python");
   const [suggestions, setSuggestions] = useState("");
   const [history, setHistory] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [isLoading, setIsLoading] = useState(false);
 
   useEffect(() => {
@@ -19,7 +20,19 @@ const MainPage = () => {
   const loadHistory = async () => {
     try {
       const response = await codeService.getHistory();
-      setHistory(response.data);
+      setHistory(response.data.items);
+      setNextCursor(response.data.next_cursor);
+    } catch (error) {
+      console.error('Error loading history:', error);
+    }
+  };
+
+  // Append the next page of history summaries
+  const loadMoreHistory = async () => {
+    try {
+      const response = await codeService.getHistory(nextCursor);
+      setHistory([...history, ...response.data.items]);
+      setNextCursor(response.data.next_cursor);
     } catch (error) {
       console.error('Error loading history:', error);
     }
@@ -75,6 +88,7 @@ const MainPage = () => {
         <History 
           history={history}
           onDelete={handleDeleteHistory}
+          onLoadMore={nextCursor ? loadMoreHistory : null}
         />
       </div>
     </div>
@@ -101,9 +101,14 @@ export const codeService = {
     return api.post('/optimize', { code, language });
   },
   
-  // Get optimization history
-  getHistory: () => {
-    return api.get('/history');
+  // Get a page of optimization history summaries, newest first
+  getHistory: (cursor) => {
+    return api.get('/history', { params: { view: 'summary', limit: 20, cursor } });
+  },
+  
+  // Get one history entry with its full code and suggestions
+  getHistoryEntry: (id) => {
+    return api.get(`/history/${id}`);
   },
   
   // Delete history item